@@ -3,12 +3,17 @@ from logging.config import fileConfig
 from sqlalchemy import engine_from_config, pool
 from alembic import context
 
+from postamoo import models  # noqa: F401 (registers the tables)
 from postamoo.database import Base
+from postamoo.config import DATABASE_URL
 
 # This is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
+# The application's own setting wins over the placeholder in `alembic.ini`.
+config.set_main_option('sqlalchemy.url', DATABASE_URL)
+
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
@@ -0,0 +1,92 @@
+"""Baseline schema
+
+Revision ID: 0001
+Revises:
+Create date: 2026-10-17 23:12:19.210349
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy
+from alembic import op
+
+# Revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The schema `create_all` used to build before migrations existed, so
+    # such databases can be stamped at this revision and upgraded.
+    op.create_table(
+        'user_profiles',
+        sqlalchemy.Column('id', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.Column(
+            'username', sqlalchemy.String(length=35), nullable=False
+        ),
+        sqlalchemy.Column(
+            'display_name', sqlalchemy.String(length=50), nullable=False
+        ),
+        sqlalchemy.Column(
+            'avatar', sqlalchemy.String(length=35), nullable=True
+        ),
+        sqlalchemy.Column('bio', sqlalchemy.String(length=300), nullable=True),
+        sqlalchemy.Column(
+            'location', sqlalchemy.String(length=200), nullable=True
+        ),
+        sqlalchemy.PrimaryKeyConstraint('id'),
+        sqlalchemy.UniqueConstraint('username'),
+    )
+    op.create_index(
+        op.f('ix_user_profiles_id'), 'user_profiles', ['id'], unique=False
+    )
+    op.create_table(
+        'posts',
+        sqlalchemy.Column('id', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.Column(
+            'title', sqlalchemy.String(length=100), nullable=False
+        ),
+        sqlalchemy.Column('text_content', sqlalchemy.Text(), nullable=True),
+        sqlalchemy.Column(
+            'media_files',
+            sqlalchemy.ARRAY(sqlalchemy.String(length=40)),
+            nullable=True,
+        ),
+        sqlalchemy.Column('created_at', sqlalchemy.DateTime(), nullable=True),
+        sqlalchemy.Column('author_id', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.ForeignKeyConstraint(
+            ['author_id'],
+            ['user_profiles.id'],
+        ),
+        sqlalchemy.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_posts_id'), 'posts', ['id'], unique=False)
+    op.create_table(
+        'comments',
+        sqlalchemy.Column('id', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.Column('content', sqlalchemy.Text(), nullable=False),
+        sqlalchemy.Column('created_at', sqlalchemy.DateTime(), nullable=True),
+        sqlalchemy.Column('post_id', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.Column('author_id', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.ForeignKeyConstraint(
+            ['author_id'],
+            ['user_profiles.id'],
+        ),
+        sqlalchemy.ForeignKeyConstraint(
+            ['post_id'],
+            ['posts.id'],
+        ),
+        sqlalchemy.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_comments_id'), 'comments', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_comments_id'), table_name='comments')
+    op.drop_table('comments')
+    op.drop_index(op.f('ix_posts_id'), table_name='posts')
+    op.drop_table('posts')
+    op.drop_index(op.f('ix_user_profiles_id'), table_name='user_profiles')
+    op.drop_table('user_profiles')
@@ -0,0 +1,108 @@
+"""Convert timestamps and add media tables
+
+Revision ID: 0002
+Revises: 0001
+Create date: 2026-10-18 09:12:40.318772
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy
+from alembic import op
+
+# Revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The naive timestamps were always written in UTC. With the session in
+    # UTC, Postgres converts them to timestamptz without rewriting either
+    # table.
+    op.execute("SET LOCAL timezone = 'UTC'")
+    for table_name in ('posts', 'comments'):
+        op.alter_column(
+            table_name,
+            'created_at',
+            type_=sqlalchemy.DateTime(timezone=True),
+            existing_type=sqlalchemy.DateTime(),
+            existing_nullable=True,
+        )
+    # Content-addressed names are sharded paths of a SHA-256 digest. Unlike
+    # the timestamps, widening an array's element type rewrites `posts`
+    # under an exclusive lock, so this needs a maintenance window on large
+    # tables.
+    op.alter_column(
+        'posts',
+        'media_files',
+        type_=sqlalchemy.ARRAY(sqlalchemy.String(length=100)),
+        existing_type=sqlalchemy.ARRAY(sqlalchemy.String(length=40)),
+        existing_nullable=True,
+    )
+    op.create_table(
+        'media_blobs',
+        sqlalchemy.Column(
+            'filename', sqlalchemy.String(length=100), nullable=False
+        ),
+        sqlalchemy.Column('ref_count', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.PrimaryKeyConstraint('filename'),
+    )
+    # Existing posts get no rows here: their files predate metadata
+    # extraction and variants, and are served from `media_files` alone.
+    op.create_table(
+        'media',
+        sqlalchemy.Column('id', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.Column('post_id', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.Column('position', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.Column(
+            'filename', sqlalchemy.String(length=100), nullable=False
+        ),
+        sqlalchemy.Column(
+            'mime_type', sqlalchemy.String(length=100), nullable=False
+        ),
+        sqlalchemy.Column(
+            'byte_size', sqlalchemy.BigInteger(), nullable=False
+        ),
+        sqlalchemy.Column('width', sqlalchemy.Integer(), nullable=True),
+        sqlalchemy.Column('height', sqlalchemy.Integer(), nullable=True),
+        sqlalchemy.Column('duration', sqlalchemy.Float(), nullable=True),
+        sqlalchemy.Column(
+            'placeholder', sqlalchemy.String(length=100), nullable=True
+        ),
+        sqlalchemy.ForeignKeyConstraint(
+            ['post_id'], ['posts.id'], ondelete='CASCADE'
+        ),
+        sqlalchemy.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_media_id'), 'media', ['id'], unique=False)
+    op.create_index(
+        'ix_media_post_id_position',
+        'media',
+        ['post_id', 'position'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_media_post_id_position', table_name='media')
+    op.drop_index(op.f('ix_media_id'), table_name='media')
+    op.drop_table('media')
+    op.drop_table('media_blobs')
+    op.alter_column(
+        'posts',
+        'media_files',
+        type_=sqlalchemy.ARRAY(sqlalchemy.String(length=40)),
+        existing_type=sqlalchemy.ARRAY(sqlalchemy.String(length=100)),
+        existing_nullable=True,
+    )
+    op.execute("SET LOCAL timezone = 'UTC'")
+    for table_name in ('posts', 'comments'):
+        op.alter_column(
+            table_name,
+            'created_at',
+            type_=sqlalchemy.DateTime(),
+            existing_type=sqlalchemy.DateTime(timezone=True),
+            existing_nullable=True,
+        )
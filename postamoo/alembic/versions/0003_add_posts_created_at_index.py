@@ -0,0 +1,39 @@
+"""Add posts created_at index
+
+Revision ID: 0003
+Revises: 0002
+Create date: 2026-10-18 09:14:05.861203
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# Revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Backs the keyset pagination of the post list; built concurrently so
+    # posting keeps working while it scans the table.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_posts_created_at_id',
+            'posts',
+            ['created_at', 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_posts_created_at_id',
+            table_name='posts',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,58 @@
+"""Add access pattern indexes
+
+Revision ID: 0004
+Revises: 0003
+Create date: 2026-10-17 23:20:41.518203
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy
+from alembic import op
+
+
+# Revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently so writes to busy tables are not blocked, which
+    # has to happen outside the migration transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_comments_post_id_created_at',
+            'comments',
+            ['post_id', 'created_at', 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            'ix_posts_author_id_created_at',
+            'posts',
+            [
+                'author_id',
+                sqlalchemy.text('created_at DESC'),
+                sqlalchemy.text('id DESC'),
+            ],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_posts_author_id_created_at',
+            table_name='posts',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            'ix_comments_post_id_created_at',
+            table_name='comments',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,60 @@
+"""Add post comment count
+
+Revision ID: 0005
+Revises: 0004
+Create date: 2026-10-18 09:16:52.407915
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy
+from alembic import op
+
+# Revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    # A constant default is only recorded in the catalog, so this does not
+    # touch existing rows.
+    op.add_column(
+        'posts',
+        sqlalchemy.Column(
+            'comment_count',
+            sqlalchemy.Integer(),
+            server_default='0',
+            nullable=False,
+        ),
+    )
+    # Backfilled a range of posts per transaction, so row locks are held
+    # briefly; the counts come from ix_comments_post_id_created_at. Comments
+    # written by the old code meanwhile are caught by running
+    # `postamoo reconcile-comment-counts` once the new code is deployed.
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        max_post_id = connection.scalar(
+            sqlalchemy.text('SELECT max(id) FROM posts')
+        )
+        for start_id in range(0, max_post_id or 0, BACKFILL_BATCH_SIZE):
+            connection.execute(
+                sqlalchemy.text(
+                    'UPDATE posts SET comment_count = counts.comment_count '
+                    'FROM (SELECT post_id, count(*) AS comment_count '
+                    'FROM comments WHERE post_id > :start_id '
+                    'AND post_id <= :end_id GROUP BY post_id) AS counts '
+                    'WHERE posts.id = counts.post_id'
+                ),
+                {
+                    'start_id': start_id,
+                    'end_id': start_id + BACKFILL_BATCH_SIZE,
+                },
+            )
+
+
+def downgrade() -> None:
+    op.drop_column('posts', 'comment_count')
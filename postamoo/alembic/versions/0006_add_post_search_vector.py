@@ -0,0 +1,57 @@
+"""Add post search vector
+
+Revision ID: 0006
+Revises: 0005
+Create date: 2026-10-17 23:14:12.762061
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# Revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A stored generated column rewrites the table once; afterwards
+    # Postgres keeps it in sync on every insert and update.
+    op.add_column(
+        'posts',
+        sqlalchemy.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sqlalchemy.Computed(
+                "setweight(to_tsvector('simple', coalesce(title, '')), 'A') "
+                "|| setweight(to_tsvector('simple', "
+                "coalesce(text_content, '')), 'B')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_posts_search_vector',
+            'posts',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_posts_search_vector',
+            table_name='posts',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column('posts', 'search_vector')
@@ -0,0 +1,87 @@
+"""Add jobs and cascade post deletes
+
+Revision ID: 0007
+Revises: 0006
+Create date: 2026-10-17 23:23:03.754502
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# Revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'jobs',
+        sqlalchemy.Column('id', sqlalchemy.BigInteger(), nullable=False),
+        sqlalchemy.Column(
+            'kind', sqlalchemy.String(length=50), nullable=False
+        ),
+        sqlalchemy.Column('payload', postgresql.JSONB(), nullable=False),
+        sqlalchemy.Column(
+            'run_at',
+            sqlalchemy.DateTime(timezone=True),
+            server_default=sqlalchemy.text('now()'),
+            nullable=True,
+        ),
+        sqlalchemy.Column('attempts', sqlalchemy.Integer(), nullable=False),
+        sqlalchemy.Column('last_error', sqlalchemy.Text(), nullable=True),
+        sqlalchemy.Column(
+            'created_at',
+            sqlalchemy.DateTime(timezone=True),
+            server_default=sqlalchemy.text('now()'),
+            nullable=False,
+        ),
+        sqlalchemy.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_jobs_run_at_id',
+        'jobs',
+        ['run_at', 'id'],
+        postgresql_where=sqlalchemy.text('run_at IS NOT NULL'),
+    )
+    # Swapping the constraint takes an exclusive lock, but NOT VALID keeps
+    # it brief: existing comments are only scanned by the VALIDATE, which
+    # runs after that lock is released and does not block writes.
+    op.drop_constraint('comments_post_id_fkey', 'comments', type_='foreignkey')
+    op.execute(
+        'ALTER TABLE comments ADD CONSTRAINT comments_post_id_fkey '
+        'FOREIGN KEY (post_id) REFERENCES posts (id) ON DELETE CASCADE '
+        'NOT VALID'
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            'ALTER TABLE comments VALIDATE CONSTRAINT comments_post_id_fkey'
+        )
+        op.create_index(
+            'ix_posts_media_files',
+            'posts',
+            ['media_files'],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_posts_media_files',
+            table_name='posts',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_constraint('comments_post_id_fkey', 'comments', type_='foreignkey')
+    op.create_foreign_key(
+        'comments_post_id_fkey', 'comments', 'posts', ['post_id'], ['id']
+    )
+    op.drop_index('ix_jobs_run_at_id', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,35 @@
+"""Add media variants ready
+
+Revision ID: 0008
+Revises: 0007
+Create date: 2026-10-18 11:02:37.514826
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy
+from alembic import op
+
+# Revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing media keeps linking its originals: whether its variants
+    # were ever written was only known from the files.
+    op.add_column(
+        'media',
+        sqlalchemy.Column(
+            'variants_ready',
+            sqlalchemy.Boolean(),
+            server_default='false',
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('media', 'variants_ready')
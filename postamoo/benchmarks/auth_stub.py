@@ -0,0 +1,84 @@
+import secrets
+from typing import Optional
+
+from fastapi import (
+    FastAPI,
+    Response,
+    Body,
+    Form,
+    Cookie,
+    UploadFile,
+    File,
+    HTTPException,
+    status,
+)
+
+
+def create_auth_stub() -> FastAPI:
+    # Just enough of Shenase for Postamoo's own calls; run it standalone
+    # with `uvicorn --factory postamoo.benchmarks.auth_stub:create_auth_stub`.
+    app = FastAPI(title='Shenase stub')
+    app.state.passwords = {}
+    app.state.sessions = {}
+
+    @app.post('/login/')
+    async def login(
+        response: Response,
+        username: str = Body(...),
+        password: str = Body(...),
+    ):
+        if app.state.passwords.get(username) != password:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Incorrect username or password.',
+            )
+        access_token = secrets.token_urlsafe(32)
+        app.state.sessions[access_token] = username
+        response.set_cookie(
+            key='access_token', value=access_token, httponly=True
+        )
+        return {'username': username}
+
+    @app.post('/logout/')
+    async def logout(access_token: Optional[str] = Cookie(None)):
+        app.state.sessions.pop(access_token, None)
+        return {'message': 'Logout successful.'}
+
+    @app.post('/users/', status_code=status.HTTP_201_CREATED)
+    async def create_user(
+        username: str = Form(...),
+        email: str = Form(...),
+        password: str = Form(...),
+        display_name: str = Form(...),
+        bio: Optional[str] = Form(None),
+        location: Optional[str] = Form(None),
+        avatar: UploadFile = File(None),
+    ):
+        if username in app.state.passwords:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='Username already registered.',
+            )
+        app.state.passwords[username] = password
+        return {
+            'username': username,
+            'email': email,
+            'profile': {
+                'display_name': display_name,
+                'avatar': None,
+                'bio': bio or None,
+                'location': location or None,
+            },
+        }
+
+    @app.get('/users/me/')
+    async def read_users_me(access_token: Optional[str] = Cookie(None)):
+        username = app.state.sessions.get(access_token)
+        if username is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Could not validate credentials.',
+            )
+        return {'username': username}
+
+    return app
@@ -0,0 +1,322 @@
+import math
+import time
+import json
+import random
+import asyncio
+import tempfile
+import subprocess
+from typing import Any, AsyncIterator, Awaitable, Callable, NamedTuple
+
+import httpx
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from postamoo import storage, variants, metrics, querylog
+from postamoo.main import app
+from postamoo.cache import (
+    access_token_cache,
+    user_profile_cache,
+    response_cache,
+)
+from postamoo.database import Base, create_async_url
+from postamoo.dependencies import get_db, get_httpx_client
+from postamoo.benchmarks.auth_stub import create_auth_stub
+from postamoo.benchmarks.seed import (
+    BENCHMARK_PASSWORD,
+    SeedResult,
+    seed_data,
+    create_sample_image,
+)
+from postamoo.config import AUTH_MODE
+
+Scenario = Callable[
+    [httpx.AsyncClient, SeedResult, random.Random], Awaitable[httpx.Response]
+]
+
+
+class ScenarioResult(NamedTuple):
+    requests: int
+    errors: int
+    rps: float
+    p50: float
+    p95: float
+    p99: float
+
+
+async def list_posts(
+    client: httpx.AsyncClient,
+    seed_result: SeedResult,
+    rng: random.Random,
+) -> httpx.Response:
+    return await client.get('/posts/')
+
+
+async def read_post(
+    client: httpx.AsyncClient,
+    seed_result: SeedResult,
+    rng: random.Random,
+) -> httpx.Response:
+    return await client.get(f'/posts/{rng.choice(seed_result.post_ids)}/')
+
+
+async def create_post_with_media(
+    client: httpx.AsyncClient,
+    seed_result: SeedResult,
+    rng: random.Random,
+) -> httpx.Response:
+    return await client.post(
+        '/posts/',
+        data={'title': 'Benchmark post', 'text_content': 'Made under load.'},
+        files={
+            'media_files': ('photo.png', create_sample_image(), 'image/png')
+        },
+    )
+
+
+async def create_comment(
+    client: httpx.AsyncClient,
+    seed_result: SeedResult,
+    rng: random.Random,
+) -> httpx.Response:
+    return await client.post(
+        f'/posts/{rng.choice(seed_result.post_ids)}/comments/',
+        json={'content': 'Made under load.'},
+    )
+
+
+SCENARIOS: dict[str, Scenario] = {
+    'list_posts': list_posts,
+    'read_post': read_post,
+    'create_post_with_media': create_post_with_media,
+    'create_comment': create_comment,
+}
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+async def run_scenario(
+    scenario: Scenario,
+    client: httpx.AsyncClient,
+    seed_result: SeedResult,
+    request_count: int,
+    concurrency: int,
+    random_seed: int = 0,
+) -> ScenarioResult:
+    rng = random.Random(random_seed)
+    latencies = []
+    errors = 0
+    remaining = iter(range(request_count))
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in remaining:
+            start_time = time.perf_counter()
+            response = await scenario(client, seed_result, rng)
+            latencies.append(time.perf_counter() - start_time)
+            if response.status_code >= 400:
+                errors += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start_time
+    latencies.sort()
+    return ScenarioResult(
+        requests=request_count,
+        errors=errors,
+        rps=request_count / duration if duration > 0 else 0.0,
+        p50=percentile(latencies, 0.5),
+        p95=percentile(latencies, 0.95),
+        p99=percentile(latencies, 0.99),
+    )
+
+
+def compare_results(
+    results: dict[str, ScenarioResult],
+    baseline: dict[str, Any],
+    tolerance: float,
+) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        baseline_result = baseline['results'].get(name)
+        if baseline_result is None:
+            continue
+        if result.rps < baseline_result['rps'] * (1 - tolerance):
+            regressions.append(
+                f'{name}: {result.rps:.1f} RPS, baseline '
+                f'{baseline_result["rps"]:.1f}'
+            )
+        if result.p95 > baseline_result['p95'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p95 {result.p95 * 1000:.1f} ms, baseline '
+                f'{baseline_result["p95"] * 1000:.1f} ms'
+            )
+    return regressions
+
+
+def format_results(results: dict[str, ScenarioResult]) -> str:
+    lines = [
+        f'{"scenario":<24}{"requests":>10}{"errors":>8}{"rps":>10}'
+        f'{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+    ]
+    for name, result in results.items():
+        lines.append(
+            f'{name:<24}{result.requests:>10}{result.errors:>8}'
+            f'{result.rps:>10.1f}{result.p50 * 1000:>10.2f}'
+            f'{result.p95 * 1000:>10.2f}{result.p99 * 1000:>10.2f}'
+        )
+    return '\n'.join(lines)
+
+
+def _get_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def save_baseline(
+    path: str,
+    results: dict[str, ScenarioResult],
+    settings: dict[str, Any],
+) -> None:
+    with open(path, 'w') as f:
+        json.dump(
+            {
+                'commit': _get_commit(),
+                'settings': settings,
+                'results': {
+                    name: result._asdict() for name, result in results.items()
+                },
+            },
+            f,
+            indent=2,
+        )
+
+
+def load_baseline(path: str) -> dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+async def run_benchmark(
+    database_url: str,
+    scenario_names: list[str],
+    request_count: int,
+    concurrency: int,
+    warmup_count: int,
+    user_count: int,
+    post_count: int,
+    comments_per_post: int,
+    media_per_post: int,
+    random_seed: int,
+) -> dict[str, ScenarioResult]:
+    if AUTH_MODE != 'remote':
+        raise RuntimeError(
+            'Benchmarks log in through the auth provider stub, which needs '
+            'AUTH_MODE=remote.'
+        )
+
+    # Instrumented like the application's own engine, so the numbers
+    # include what production pays for metrics and the query log.
+    engine = create_async_engine(
+        create_async_url(database_url),
+        poolclass=metrics.InstrumentedQueuePool,
+        pool_size=concurrency,
+    )
+    metrics.instrument_engine(engine.sync_engine)
+    querylog.instrument_engine(engine.sync_engine)
+    SessionLocal = async_sessionmaker(
+        bind=engine, autoflush=False, expire_on_commit=False
+    )
+
+    async def override_get_db() -> AsyncIterator[AsyncSession]:
+        async with SessionLocal() as db:
+            yield db
+
+    auth_stub = create_auth_stub()
+    auth_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=auth_stub)
+    )
+    media_dir = tempfile.TemporaryDirectory(
+        prefix='postamoo-benchmark-', ignore_cleanup_errors=True
+    )
+    media_storage_path = storage.MEDIA_STORAGE_PATH
+    storage.MEDIA_STORAGE_PATH = media_dir.name
+
+    try:
+        # A fresh schema every run keeps results comparable between runs.
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+        async with SessionLocal() as db:
+            seed_result = await seed_data(
+                db,
+                user_count=user_count,
+                post_count=post_count,
+                comments_per_post=comments_per_post,
+                media_per_post=media_per_post,
+                random_seed=random_seed,
+            )
+        for username in seed_result.usernames:
+            auth_stub.state.passwords[username] = BENCHMARK_PASSWORD
+        for cache in (access_token_cache, user_profile_cache, response_cache):
+            cache.clear()
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_httpx_client] = lambda: auth_client
+        variants.start_variant_pool()
+        # Secure cookies, as set outside debug mode, need an https origin.
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url='https://postamoo.benchmark',
+        ) as client:
+            response = await client.post(
+                '/login/',
+                json={
+                    'username': seed_result.usernames[0],
+                    'password': BENCHMARK_PASSWORD,
+                },
+            )
+            response.raise_for_status()
+
+            results = {}
+            for name in scenario_names:
+                await run_scenario(
+                    SCENARIOS[name],
+                    client,
+                    seed_result,
+                    warmup_count,
+                    concurrency,
+                    random_seed,
+                )
+                results[name] = await run_scenario(
+                    SCENARIOS[name],
+                    client,
+                    seed_result,
+                    request_count,
+                    concurrency,
+                    random_seed,
+                )
+        return results
+    finally:
+        variants.stop_variant_pool()
+        app.dependency_overrides.clear()
+        await auth_client.aclose()
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+        storage.MEDIA_STORAGE_PATH = media_storage_path
+        media_dir.cleanup()
@@ -0,0 +1,238 @@
+import io
+import os
+import base64
+import random
+import functools
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, NamedTuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, storage, variants, metadata
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+SEED_BATCH_SIZE = 1000
+
+# A 1x1 PNG for when Pillow is not installed to draw a real photo size.
+_FALLBACK_IMAGE = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhg'
+    'GAWjR9awAAAABJRU5ErkJggg=='
+)
+_WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+    'tempor incididunt ut labore et dolore magna aliqua photo trip coffee '
+    'city night music weekend sunset friends cat garden'
+).split()
+
+
+class SeedResult(NamedTuple):
+    usernames: list[str]
+    post_ids: list[int]
+
+
+@functools.cache
+def create_sample_image() -> bytes:
+    if Image is None:
+        return _FALLBACK_IMAGE
+    size = (1024, 768)
+    image = Image.merge(
+        'RGB',
+        [
+            Image.linear_gradient('L').resize(size),
+            Image.linear_gradient('L').rotate(90).resize(size),
+            Image.new('L', size, 128),
+        ],
+    )
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _batched(rows: list[dict]) -> Iterator[list[dict]]:
+    for start in range(0, len(rows), SEED_BATCH_SIZE):
+        yield rows[start : start + SEED_BATCH_SIZE]
+
+
+def _sentence(rng: random.Random, word_count: int) -> str:
+    return ' '.join(rng.choice(_WORDS) for _ in range(word_count))
+
+
+def _write_sample_media(filenames: list[str], content: bytes) -> None:
+    template_filename, *other_filenames = filenames
+    template_path = storage.get_media_path(template_filename)
+    with open(template_path, 'wb') as f:
+        f.write(content)
+    variant_filenames = []
+    if variants.Image is not None:
+        variants.generate_media_variants(template_path)
+        variant_filenames = [
+            storage.get_variant_filename(template_filename, variant)
+            for variant in storage.MEDIA_VARIANT_EXTENSIONS
+        ]
+    # Hard links keep a large seed cheap on disk while every post still
+    # gets files of its own, variants included.
+    for filename in other_filenames:
+        os.link(template_path, storage.get_media_path(filename))
+        for variant, variant_filename in zip(
+            storage.MEDIA_VARIANT_EXTENSIONS, variant_filenames
+        ):
+            os.link(
+                storage.get_media_path(variant_filename),
+                storage.get_media_path(
+                    storage.get_variant_filename(filename, variant)
+                ),
+            )
+
+
+async def seed_data(
+    db: AsyncSession,
+    user_count: int = 10,
+    post_count: int = 1000,
+    comments_per_post: int = 5,
+    media_per_post: int = 1,
+    random_seed: int = 0,
+) -> SeedResult:
+    rng = random.Random(random_seed)
+    usernames = [f'bench_user_{i}' for i in range(user_count)]
+    user_ids = list(
+        await db.scalars(
+            insert(models.UserProfile).returning(models.UserProfile.id),
+            [
+                {
+                    'username': username,
+                    'display_name': username.replace('_', ' ').title(),
+                    'bio': _sentence(rng, 12),
+                }
+                for username in usernames
+            ],
+        )
+    )
+
+    started_at = datetime.now(timezone.utc) - timedelta(seconds=post_count)
+    media_filenames = [
+        [f'bench-{i}-{position}.png' for position in range(media_per_post)]
+        for i in range(post_count)
+    ]
+    post_rows = [
+        {
+            'title': _sentence(rng, 5).capitalize(),
+            'text_content': _sentence(rng, 40),
+            'media_files': media_filenames[i] or None,
+            'comment_count': comments_per_post,
+            'created_at': started_at + timedelta(seconds=i),
+            'author_id': rng.choice(user_ids),
+        }
+        for i in range(post_count)
+    ]
+    post_ids = []
+    for batch in _batched(post_rows):
+        post_ids.extend(
+            await db.scalars(
+                insert(models.Post).returning(
+                    models.Post.id, sort_by_parameter_order=True
+                ),
+                batch,
+            )
+        )
+
+    comment_rows = [
+        {
+            'content': _sentence(rng, 15),
+            'created_at': post_row['created_at'] + timedelta(seconds=j + 1),
+            'post_id': post_id,
+            'author_id': rng.choice(user_ids),
+        }
+        for post_id, post_row in zip(post_ids, post_rows)
+        for j in range(comments_per_post)
+    ]
+    for batch in _batched(comment_rows):
+        await db.execute(insert(models.Comment), batch)
+
+    if media_per_post > 0 and post_count > 0:
+        content = create_sample_image()
+        _write_sample_media(
+            [
+                filename
+                for filenames in media_filenames
+                for filename in filenames
+            ],
+            content,
+        )
+        media_metadata = metadata.extract_media_metadata(
+            storage.get_media_path(media_filenames[0][0]), 'image/png'
+        )
+        media_rows = [
+            {
+                'post_id': post_id,
+                'position': position,
+                'filename': filename,
+                'mime_type': 'image/png',
+                'byte_size': len(content),
+                'variants_ready': variants.Image is not None,
+                **media_metadata,
+            }
+            for post_id, filenames in zip(post_ids, media_filenames)
+            for position, filename in enumerate(filenames)
+        ]
+        for batch in _batched(media_rows):
+            await db.execute(insert(models.Media), batch)
+
+    await db.commit()
+    return SeedResult(usernames=usernames, post_ids=post_ids)
+
+
+def iter_user_rows(
+    first_id: int,
+    count: int,
+    rng: random.Random,
+) -> Iterator[dict]:
+    for user_id in range(first_id, first_id + count):
+        yield {
+            'id': user_id,
+            'username': f'seed_user_{user_id}',
+            'display_name': f'Seed User {user_id}',
+            'bio': _sentence(rng, 12),
+        }
+
+
+def iter_post_rows(
+    first_id: int,
+    count: int,
+    author_ids: range,
+    comments_per_post: int,
+    rng: random.Random,
+) -> Iterator[dict]:
+    started_at = datetime.now(timezone.utc) - timedelta(seconds=count)
+    for i in range(count):
+        yield {
+            'id': first_id + i,
+            'title': _sentence(rng, 5).capitalize(),
+            'text_content': _sentence(rng, 40),
+            'comment_count': comments_per_post,
+            'created_at': started_at + timedelta(seconds=i),
+            'author_id': rng.choice(author_ids),
+        }
+
+
+def iter_comment_rows(
+    post_ids: range,
+    comments_per_post: int,
+    author_ids: range,
+    rng: random.Random,
+) -> Iterator[dict]:
+    started_at = datetime.now(timezone.utc) - timedelta(seconds=len(post_ids))
+    for i, post_id in enumerate(post_ids):
+        for j in range(comments_per_post):
+            yield {
+                'content': _sentence(rng, 15),
+                'created_at': started_at
+                + timedelta(seconds=i, milliseconds=j),
+                'post_id': post_id,
+                'author_id': rng.choice(author_ids),
+            }
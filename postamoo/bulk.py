@@ -0,0 +1,199 @@
+import csv
+import gzip
+import json
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from sqlalchemy import (
+    ARRAY,
+    BigInteger,
+    DateTime,
+    Float,
+    Integer,
+    Table,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models
+
+# Parents before children, so foreign keys always point at loaded rows.
+IMPORT_TABLES = {
+    'user_profiles': models.UserProfile.__table__,
+    'posts': models.Post.__table__,
+    'comments': models.Comment.__table__,
+}
+COPY_BATCH_SIZE = 10000
+
+
+def open_records(path: str) -> Iterator[dict[str, Any]]:
+    stem = path.removesuffix('.gz')
+    if not stem.endswith(('.csv', '.ndjson', '.jsonl')):
+        raise ValueError(f'Unsupported file format: {path}')
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        if stem.endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _parse_datetime(value: Any) -> datetime:
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _parse_array(value: Any) -> list:
+    return json.loads(value) if isinstance(value, str) else list(value)
+
+
+def _get_converter(column_type: Any) -> Callable[[Any], Any]:
+    # COPY goes through asyncpg's binary protocol, which takes Python
+    # values of the column's own type rather than text.
+    if isinstance(column_type, (Integer, BigInteger)):
+        return int
+    elif isinstance(column_type, Float):
+        return float
+    elif isinstance(column_type, DateTime):
+        return _parse_datetime
+    elif isinstance(column_type, ARRAY):
+        return _parse_array
+    return str
+
+
+def _create_row_converter(
+    table: Table,
+    field_names: list[str],
+) -> tuple[list[str], Callable[[dict[str, Any]], tuple]]:
+    unknown_fields = set(field_names) - set(table.columns.keys())
+    if unknown_fields:
+        raise ValueError(
+            f'Unknown {table.name} columns: '
+            f'{", ".join(sorted(unknown_fields))}'
+        )
+    computed_fields = [
+        name for name in field_names if table.columns[name].computed
+    ]
+    if computed_fields:
+        raise ValueError(
+            f'Computed {table.name} columns cannot be imported: '
+            f'{", ".join(computed_fields)}'
+        )
+    converters = [
+        (name, _get_converter(table.columns[name].type))
+        for name in field_names
+    ]
+    # COPY only applies server defaults, so columns that get theirs from
+    # Python are filled in here, once for the whole import.
+    defaults = [
+        (
+            column.name,
+            column.default.arg(None)
+            if column.default.is_callable
+            else column.default.arg,
+        )
+        for column in table.columns
+        if column.name not in field_names
+        and column.default is not None
+        and column.server_default is None
+    ]
+    columns = field_names + [name for name, _ in defaults]
+    default_values = tuple(value for _, value in defaults)
+
+    def convert_row(row: dict[str, Any]) -> tuple:
+        values = []
+        for name, converter in converters:
+            value = row.get(name)
+            # CSV has no null, so an empty field stands for one.
+            values.append(
+                None if value is None or value == '' else converter(value)
+            )
+        return tuple(values) + default_values
+
+    return columns, convert_row
+
+
+def _iter_record_batches(
+    rows: Iterator[dict[str, Any]],
+    convert_row: Callable[[dict[str, Any]], tuple],
+) -> Iterator[list[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(convert_row(row))
+        if len(batch) >= COPY_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def copy_rows(
+    db: AsyncSession,
+    table_name: str,
+    rows: Iterator[dict[str, Any]],
+) -> int:
+    table = IMPORT_TABLES[table_name]
+    first_row = await run_in_threadpool(next, rows, None)
+    if first_row is None:
+        return 0
+    columns, convert_row = _create_row_converter(table, list(first_row))
+    copied_count = 0
+
+    async def iter_records() -> AsyncIterator[tuple]:
+        nonlocal copied_count
+        yield convert_row(first_row)
+        copied_count += 1
+        # Reading and converting run on a worker thread a batch at a time,
+        # so parsing a huge file never stalls the event loop.
+        async for batch in iterate_in_threadpool(
+            _iter_record_batches(rows, convert_row)
+        ):
+            for record in batch:
+                yield record
+            copied_count += len(batch)
+
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        table_name, records=iter_records(), columns=columns
+    )
+    return copied_count
+
+
+async def get_max_id(db: AsyncSession, table_name: str) -> int:
+    table = IMPORT_TABLES[table_name]
+    return await db.scalar(select(func.max(table.c.id))) or 0
+
+
+async def reset_sequence(db: AsyncSession, table_name: str) -> None:
+    # Rows copied with explicit ids leave the sequence behind, and the
+    # next regular insert would collide with them. It only ever moves
+    # forward, so ids of deleted rows are not handed out again.
+    await db.execute(
+        text(
+            'SELECT setval(sequence_name, GREATEST(COALESCE(MAX(id), 0), '
+            'COALESCE(pg_sequence_last_value(sequence_name), 0)) + 1, false) '
+            f"FROM {table_name}, pg_get_serial_sequence('{table_name}', 'id') "
+            'AS sequence_name GROUP BY sequence_name'
+        )
+    )
+
+
+def format_copy_rate(
+    table_name: str,
+    copied_count: int,
+    duration: float,
+) -> str:
+    rate = copied_count / duration if duration > 0 else 0
+    return (
+        f'Copied {copied_count:,} row(s) into {table_name} in '
+        f'{duration:.1f}s ({rate:,.0f} rows/s).'
+    )
@@ -0,0 +1,162 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple, Optional
+
+from postamoo.config import (
+    ACCESS_TOKEN_CACHE_SIZE,
+    ACCESS_TOKEN_CACHE_TTL,
+    USER_PROFILE_CACHE_SIZE,
+    USER_PROFILE_CACHE_TTL,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL,
+)
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    def __init__(self, maxbytes: int, ttl: float) -> None:
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, CachedResponse]] = (
+            OrderedDict()
+        )
+        self._size = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._pop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(
+        self,
+        key: Hashable,
+        value: CachedResponse,
+        generation: int,
+    ) -> None:
+        if len(value.body) > self.maxbytes:
+            return
+        with self._lock:
+            # Anything invalidated since the caller read `generation` may
+            # be what it loaded, so the possibly stale value is dropped.
+            if generation != self._generation:
+                return
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._size += len(value.body)
+            while self._size > self.maxbytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+
+    def delete(self, *keys: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'size': len(self._entries),
+            'bytes': self._size,
+            'maxbytes': self.maxbytes,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _pop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1].body)
+
+
+access_token_cache = TTLCache(
+    maxsize=ACCESS_TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_CACHE_TTL
+)
+user_profile_cache = TTLCache(
+    maxsize=USER_PROFILE_CACHE_SIZE, ttl=USER_PROFILE_CACHE_TTL
+)
+response_cache = ResponseCache(
+    maxbytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL
+)
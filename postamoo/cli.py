@@ -0,0 +1,220 @@
+import argparse
+import sys
+import time
+import random
+import asyncio
+import signal
+from typing import Iterator
+
+from postamoo import crud, jobs, bulk
+from postamoo.benchmarks import runner, seed
+from postamoo.database import SessionLocal, engine
+from postamoo.config import JOB_BATCH_SIZE, BENCHMARK_DATABASE_URL
+
+
+async def reconcile_comment_counts(args: argparse.Namespace) -> None:
+    async with SessionLocal() as db:
+        fixed_count = await crud.reconcile_comment_counts(
+            db, batch_size=args.batch_size
+        )
+    print(f'Fixed the comment count of {fixed_count} post(s).')
+
+
+async def run_jobs(args: argparse.Namespace) -> None:
+    if not args.once:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop_event.set)
+        await jobs.run_job_worker(stop_event, batch_size=args.batch_size)
+        return
+    async with SessionLocal() as db:
+        await jobs.schedule_recurring_jobs(db)
+        processed_count = await jobs.run_pending_jobs(
+            db, batch_size=args.batch_size
+        )
+    print(f'Ran {processed_count} job(s).')
+
+
+async def benchmark(args: argparse.Namespace) -> None:
+    results = await runner.run_benchmark(
+        database_url=args.database_url,
+        scenario_names=args.scenario or list(runner.SCENARIOS),
+        request_count=args.requests,
+        concurrency=args.concurrency,
+        warmup_count=args.warmup,
+        user_count=args.users,
+        post_count=args.posts,
+        comments_per_post=args.comments_per_post,
+        media_per_post=args.media_per_post,
+        random_seed=args.seed,
+    )
+    print(runner.format_results(results))
+    if args.save_baseline is not None:
+        settings = {
+            name: getattr(args, name)
+            for name in (
+                'scenario',
+                'requests',
+                'concurrency',
+                'warmup',
+                'users',
+                'posts',
+                'comments_per_post',
+                'media_per_post',
+                'seed',
+            )
+        }
+        runner.save_baseline(args.save_baseline, results, settings)
+        print(f'Saved the baseline to {args.save_baseline}.')
+    if args.compare is not None:
+        baseline = runner.load_baseline(args.compare)
+        regressions = runner.compare_results(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'Regression against {baseline["commit"]}: {regression}')
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions against {baseline["commit"]}.')
+
+
+async def _copy_tables(tables: dict[str, Iterator[dict]]) -> None:
+    async with SessionLocal() as db:
+        for table_name, rows in tables.items():
+            start_time = time.perf_counter()
+            copied_count = await bulk.copy_rows(db, table_name, rows)
+            await bulk.reset_sequence(db, table_name)
+            await db.commit()
+            print(
+                bulk.format_copy_rate(
+                    table_name, copied_count, time.perf_counter() - start_time
+                )
+            )
+
+
+async def import_data(args: argparse.Namespace) -> None:
+    await _copy_tables(
+        {
+            table_name: bulk.open_records(getattr(args, table_name))
+            for table_name in bulk.IMPORT_TABLES
+            if getattr(args, table_name) is not None
+        }
+    )
+    # Imported comments are not reflected in the counters on their posts.
+    if args.comments is not None:
+        async with SessionLocal() as db:
+            fixed_count = await crud.reconcile_comment_counts(db)
+        print(f'Fixed the comment count of {fixed_count} post(s).')
+
+
+async def seed_data(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    async with SessionLocal() as db:
+        first_user_id = await bulk.get_max_id(db, 'user_profiles') + 1
+        first_post_id = await bulk.get_max_id(db, 'posts') + 1
+    user_ids = range(first_user_id, first_user_id + args.users)
+    post_ids = range(first_post_id, first_post_id + args.posts)
+    await _copy_tables(
+        {
+            'user_profiles': seed.iter_user_rows(
+                first_user_id, args.users, rng
+            ),
+            'posts': seed.iter_post_rows(
+                first_post_id,
+                args.posts,
+                user_ids,
+                args.comments_per_post,
+                rng,
+            ),
+            'comments': seed.iter_comment_rows(
+                post_ids, args.comments_per_post, user_ids, rng
+            ),
+        }
+    )
+
+
+async def run_command(args: argparse.Namespace) -> None:
+    try:
+        await args.command(args)
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='postamoo')
+    subparsers = parser.add_subparsers(required=True)
+
+    reconcile_parser = subparsers.add_parser(
+        'reconcile-comment-counts',
+        help='Recount comments and fix posts whose counter has drifted.',
+    )
+    reconcile_parser.add_argument('--batch-size', type=int, default=1000)
+    reconcile_parser.set_defaults(command=reconcile_comment_counts)
+
+    jobs_parser = subparsers.add_parser(
+        'run-jobs',
+        help='Run queued background jobs until interrupted.',
+    )
+    jobs_parser.add_argument(
+        '--once',
+        action='store_true',
+        help='Run a single batch of due jobs and exit.',
+    )
+    jobs_parser.add_argument('--batch-size', type=int, default=JOB_BATCH_SIZE)
+    jobs_parser.set_defaults(command=run_jobs)
+
+    import_parser = subparsers.add_parser(
+        'import',
+        help='Bulk load NDJSON or CSV files (optionally gzipped) with COPY.',
+    )
+    for table_name in bulk.IMPORT_TABLES:
+        import_parser.add_argument(
+            f'--{table_name.replace("_", "-")}', metavar='PATH'
+        )
+    import_parser.set_defaults(command=import_data)
+
+    seed_parser = subparsers.add_parser(
+        'seed',
+        help='Bulk load generated users, posts and comments with COPY.',
+    )
+    seed_parser.add_argument('--users', type=int, default=1000)
+    seed_parser.add_argument('--posts', type=int, default=100000)
+    seed_parser.add_argument('--comments-per-post', type=int, default=10)
+    seed_parser.add_argument('--seed', type=int, default=0)
+    seed_parser.set_defaults(command=seed_data)
+
+    benchmark_parser = subparsers.add_parser(
+        'benchmark',
+        help='Seed a database and measure request throughput and latency.',
+    )
+    benchmark_parser.add_argument(
+        '--database-url', default=BENCHMARK_DATABASE_URL
+    )
+    benchmark_parser.add_argument(
+        '--scenario',
+        action='append',
+        choices=list(runner.SCENARIOS),
+        help='Run only this scenario; may be repeated.',
+    )
+    benchmark_parser.add_argument('--requests', type=int, default=500)
+    benchmark_parser.add_argument('--concurrency', type=int, default=10)
+    benchmark_parser.add_argument('--warmup', type=int, default=50)
+    benchmark_parser.add_argument('--users', type=int, default=10)
+    benchmark_parser.add_argument('--posts', type=int, default=1000)
+    benchmark_parser.add_argument('--comments-per-post', type=int, default=5)
+    benchmark_parser.add_argument('--media-per-post', type=int, default=1)
+    benchmark_parser.add_argument('--seed', type=int, default=0)
+    benchmark_parser.add_argument('--save-baseline', metavar='PATH')
+    benchmark_parser.add_argument('--compare', metavar='PATH')
+    benchmark_parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.1,
+        help='Allowed RPS drop and p95 rise against the baseline.',
+    )
+    benchmark_parser.set_defaults(command=benchmark)
+
+    asyncio.run(run_command(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,12 +9,97 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DEBUG_ENABLED = os.environ['DEBUG_ENABLED'] == '1'
 
 AUTH_PROVIDER_URL = os.environ['AUTH_PROVIDER_URL'].rstrip('/')
+AUTH_PROVIDER_TIMEOUT = float(os.environ.get('AUTH_PROVIDER_TIMEOUT', 10))
+AUTH_PROVIDER_MAX_CONNECTIONS = int(
+    os.environ.get('AUTH_PROVIDER_MAX_CONNECTIONS', 100)
+)
+AUTH_PROVIDER_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get('AUTH_PROVIDER_MAX_KEEPALIVE_CONNECTIONS', 20)
+)
+AUTH_PROVIDER_KEEPALIVE_EXPIRY = float(
+    os.environ.get('AUTH_PROVIDER_KEEPALIVE_EXPIRY', 30)
+)
+AUTH_PROVIDER_HTTP2_ENABLED = (
+    os.environ.get('AUTH_PROVIDER_HTTP2_ENABLED', '0') == '1'
+)
+
+# Either `remote` (ask the auth provider) or `local` (verify the signed
+# token with the key below and skip the network entirely).
+AUTH_MODE = os.environ.get('AUTH_MODE', 'remote')
+AUTH_TOKEN_ALGORITHMS = os.environ.get('AUTH_TOKEN_ALGORITHMS', 'HS256')
+AUTH_TOKEN_KEY = os.environ.get('AUTH_TOKEN_KEY')
+if os.environ.get('AUTH_TOKEN_KEY_FILE'):
+    with open(os.environ['AUTH_TOKEN_KEY_FILE']) as f:
+        AUTH_TOKEN_KEY = f.read()
+AUTH_TOKEN_AUDIENCE = os.environ.get('AUTH_TOKEN_AUDIENCE') or None
+AUTH_TOKEN_ISSUER = os.environ.get('AUTH_TOKEN_ISSUER') or None
+AUTH_TOKEN_USERNAME_CLAIM = os.environ.get('AUTH_TOKEN_USERNAME_CLAIM', 'sub')
+AUTH_TOKEN_LEEWAY = float(os.environ.get('AUTH_TOKEN_LEEWAY', 0))
+
+ACCESS_TOKEN_CACHE_SIZE = int(os.environ.get('ACCESS_TOKEN_CACHE_SIZE', 10000))
+ACCESS_TOKEN_CACHE_TTL = float(os.environ.get('ACCESS_TOKEN_CACHE_TTL', 60))
+
+USER_PROFILE_CACHE_SIZE = int(os.environ.get('USER_PROFILE_CACHE_SIZE', 10000))
+USER_PROFILE_CACHE_TTL = float(os.environ.get('USER_PROFILE_CACHE_TTL', 300))
+
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+)
+# Bounds how long a response can stay stale when an invalidation from
+# another process is missed.
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 60))
 
 DATABASE_URL = os.environ['DATABASE_URL']
 TEST_DATABASE_URL = os.environ['TEST_DATABASE_URL']
+# Wiped and reseeded by every `postamoo benchmark` run.
+BENCHMARK_DATABASE_URL = os.environ.get(
+    'BENCHMARK_DATABASE_URL', TEST_DATABASE_URL
+)
+# Statements slower than this many seconds are logged with their plan.
+SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.5))
+SLOW_QUERY_EXPLAIN_ENABLED = (
+    os.environ.get('SLOW_QUERY_EXPLAIN_ENABLED', '1') == '1'
+)
+# Most statements a single request may issue; only enforced in debug mode
+# and in tests, where going over it fails the request.
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 25))
 
 MEDIA_UPLOAD_FOLDER = os.environ['MEDIA_UPLOAD_FOLDER']
 MEDIA_STORAGE_PATH = os.path.join(BASE_DIR, MEDIA_UPLOAD_FOLDER)
+# Either `unique` (a random name per upload) or `content` (deduplicated,
+# reference-counted blobs named after their SHA-256).
+MEDIA_STORAGE_MODE = os.environ.get('MEDIA_STORAGE_MODE', 'unique')
 
 MAX_IMAGE_SIZE = int(os.environ['MAX_IMAGE_SIZE'])
 MAX_VIDEO_SIZE = int(os.environ['MAX_VIDEO_SIZE'])
+# Decoding costs memory per pixel however well the file compresses, so
+# larger images are rejected before they are decoded.
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 50000000))
+MEDIA_CHUNK_SIZE = int(os.environ.get('MEDIA_CHUNK_SIZE', 1024 * 1024))
+MEDIA_VARIANT_WORKERS = int(os.environ.get('MEDIA_VARIANT_WORKERS', 2))
+MEDIA_THUMBNAIL_SIZE = int(os.environ.get('MEDIA_THUMBNAIL_SIZE', 320))
+MEDIA_MEDIUM_SIZE = int(os.environ.get('MEDIA_MEDIUM_SIZE', 1280))
+MEDIA_VARIANT_QUALITY = int(os.environ.get('MEDIA_VARIANT_QUALITY', 80))
+MEDIA_CACHE_MAX_AGE = int(os.environ.get('MEDIA_CACHE_MAX_AGE', 31536000))
+# When set (e.g. `/protected-media/`), media responses only carry an
+# X-Accel-Redirect header and the fronting proxy sends the file.
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+
+# Runs the job worker inside the API process; set to 0 when it runs as a
+# separate `postamoo run-jobs` process instead.
+JOB_WORKER_ENABLED = os.environ.get('JOB_WORKER_ENABLED', '1') == '1'
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', 10))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 600))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', 30))
+MEDIA_SWEEP_INTERVAL = int(os.environ.get('MEDIA_SWEEP_INTERVAL', 3600))
+MEDIA_SWEEP_BATCH_SIZE = int(os.environ.get('MEDIA_SWEEP_BATCH_SIZE', 500))
+MEDIA_ORPHAN_GRACE_PERIOD = int(
+    os.environ.get('MEDIA_ORPHAN_GRACE_PERIOD', 86400)
+)
+
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', 20))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 100))
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 100))
+MAX_COMMENT_PREVIEW_SIZE = int(os.environ.get('MAX_COMMENT_PREVIEW_SIZE', 20))
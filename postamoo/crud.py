@@ -1,134 +1,394 @@
-import os
-import shutil
-import mimetypes
-import uuid
+import html
+import json
+import base64
+from datetime import datetime
+from collections import Counter
 from typing import Optional
 
-from fastapi import UploadFile, HTTPException, status
-from sqlalchemy.orm import Session
-
-from postamoo import models, schemas
-from postamoo.config import MEDIA_STORAGE_PATH, MAX_IMAGE_SIZE, MAX_VIDEO_SIZE
-
-
-def _create_unique_filename(filename: str) -> str:
-    unique_id = uuid.uuid4().hex[:15]
-    _, file_extension = os.path.splitext(filename)
-    return f'{unique_id}{file_extension}'
-
-
-def _save_media_file(file: UploadFile) -> str:
-    mime_type, _ = mimetypes.guess_type(file.filename)
-    if mime_type in [
-        'image/jpeg',
-        'image/png',
-        'image/gif',
-        'image/bmp',
-    ]:
-        if file.size > MAX_IMAGE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=(
-                    'Image file size exceeds the limit of '
-                    f'{MAX_IMAGE_SIZE / (1024 * 1024)} MB.'
-                ),
-            )
-    elif mime_type in [
-        'video/mp4',
-        'video/mpeg',
-        'video/quicktime',
-        'video/x-msvideo',
-    ]:
-        if file.size > MAX_VIDEO_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=(
-                    'Video file size exceeds the limit of '
-                    f'{MAX_VIDEO_SIZE / (1024 * 1024)} MB.'
-                ),
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import (
+    Integer,
+    column,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+    tuple_,
+    true,
+    values,
+)
+from sqlalchemy.orm import Load, aliased, noload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, schemas, storage, variants, jobs, invalidation
+from postamoo.cache import user_profile_cache
+from postamoo.config import DEFAULT_PAGE_SIZE
+
+# Private use characters that cannot clash with anything html.escape emits.
+SNIPPET_START = '\ue000'
+SNIPPET_STOP = '\ue001'
+
+
+def _pack_cursor(values: list) -> str:
+    raw_cursor = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw_cursor).decode().rstrip('=')
+
+
+def _unpack_cursor(cursor: str) -> list:
+    padded_cursor = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded_cursor))
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail='Invalid cursor.',
+    )
+
+
+def _parse_cursor_id(value: int) -> int:
+    post_id = int(value)
+    if not 1 <= post_id <= schemas.MAX_ID:
+        raise ValueError(f'Post id out of range: {post_id}')
+    return post_id
+
+
+def _mark_snippet(snippet: str) -> str:
+    # Post text is user input, so it is escaped before the highlight
+    # markers are swapped for real tags.
+    return (
+        html.escape(snippet)
+        .replace(SNIPPET_START, '<mark>')
+        .replace(SNIPPET_STOP, '</mark>')
+    )
+
+
+async def _commit_post_changes(db: AsyncSession, *post_ids: int) -> None:
+    # Other processes drop their cached responses once the notification
+    # arrives; this one does so right away.
+    await invalidation.notify_post_responses(db, *post_ids)
+    await db.commit()
+    invalidation.invalidate_post_responses(*post_ids)
+
+
+def _post_loader_options(
+    expand_author: bool,
+    comment_preview_size: Optional[int] = None,
+) -> list[Load]:
+    comments_loader = selectinload(models.Post.comments)
+    loader_options = [selectinload(models.Post.media)]
+    if expand_author:
+        # Selectin loading a many-to-one collects the distinct author ids,
+        # so each page costs one profile query however many rows share them.
+        loader_options.append(selectinload(models.Post.author))
+        comments_loader = comments_loader.selectinload(models.Comment.author)
+    if comment_preview_size is not None:
+        # `_load_comment_previews` fills the collection in instead.
+        comments_loader = noload(models.Post.comments)
+    loader_options.append(comments_loader)
+    # Callers also set `populate_existing` when expanding: rows already in
+    # the session keep their unloaded (None) author otherwise.
+    return loader_options
+
+
+async def _load_comment_previews(
+    db: AsyncSession,
+    db_posts: list[models.Post],
+    comment_preview_size: int,
+    expand_author: bool,
+) -> None:
+    comment_previews = {db_post.id: [] for db_post in db_posts}
+    if comment_previews and comment_preview_size > 0:
+        target_posts = values(
+            column('post_id', Integer), name='target_posts'
+        ).data([(post_id,) for post_id in comment_previews])
+        # A LATERAL subquery per post walks the (post_id, created_at) index
+        # backwards and stops after N rows, so a post with 50k comments
+        # costs no more than one with five.
+        latest_comments = (
+            select(models.Comment)
+            .filter(models.Comment.post_id == target_posts.c.post_id)
+            .order_by(
+                models.Comment.created_at.desc(), models.Comment.id.desc()
             )
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail='Unsupported media type.',
+            .limit(comment_preview_size)
+            .lateral('latest_comments')
+        )
+        comment_alias = aliased(models.Comment, latest_comments)
+        query = (
+            select(comment_alias)
+            .select_from(target_posts)
+            .join(latest_comments, true())
+            .execution_options(populate_existing=expand_author)
+        )
+        if expand_author:
+            query = query.options(selectinload(comment_alias.author))
+        for db_comment in await db.scalars(query):
+            comment_previews[db_comment.post_id].append(db_comment)
+
+    for db_post in db_posts:
+        set_committed_value(
+            db_post,
+            'comments',
+            sorted(
+                comment_previews[db_post.id],
+                key=lambda db_comment: (db_comment.created_at, db_comment.id),
+            ),
         )
 
-    filename = _create_unique_filename(file.filename)
-    file_path = os.path.join(MEDIA_STORAGE_PATH, filename)
-    with open(file_path, 'wb') as f:
-        shutil.copyfileobj(file.file, f)
-    return filename
 
+def _encode_cursor(created_at: datetime, post_id: int) -> str:
+    return _pack_cursor([created_at.isoformat(), post_id])
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, post_id = _unpack_cursor(cursor)
+        return datetime.fromisoformat(created_at), _parse_cursor_id(post_id)
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
 
-def get_user_profile_by_id(
-    db: Session,
+
+def _encode_search_cursor(rank: float, post_id: int) -> str:
+    return _pack_cursor([rank, post_id])
+
+
+def _decode_search_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        rank, post_id = _unpack_cursor(cursor)
+        return float(rank), _parse_cursor_id(post_id)
+    except (ValueError, TypeError):
+        raise _invalid_cursor()
+
+
+async def get_user_profile_by_id(
+    db: AsyncSession,
     user_id: int,
 ) -> Optional[models.UserProfile]:
-    return (
-        db.query(models.UserProfile)
-        .filter(models.UserProfile.id == user_id)
-        .first()
+    return await db.scalar(
+        select(models.UserProfile).filter(models.UserProfile.id == user_id)
     )
 
 
-def get_user_profile_by_username(
-    db: Session,
+async def get_user_profile_by_username(
+    db: AsyncSession,
     username: str,
 ) -> Optional[models.UserProfile]:
-    return (
-        db.query(models.UserProfile)
-        .filter(models.UserProfile.username == username)
-        .first()
+    return await db.scalar(
+        select(models.UserProfile).filter(
+            models.UserProfile.username == username
+        )
     )
 
 
-def create_user_profile(
-    db: Session,
+async def create_user_profile(
+    db: AsyncSession,
     user_profile: schemas.UserProfileCreate,
 ) -> models.UserProfile:
     db_user_profile = models.UserProfile(**user_profile.model_dump())
     db.add(db_user_profile)
-    db.commit()
-    db.refresh(db_user_profile)
+    await db.commit()
+    await db.refresh(db_user_profile)
+    user_profile_cache.delete(db_user_profile.username)
     return db_user_profile
 
 
-def get_posts(db: Session) -> Optional[list[models.Post]]:
-    return db.query(models.Post).all()
+async def get_posts(
+    db: AsyncSession,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    author_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    expand_author: bool = False,
+    comment_preview_size: Optional[int] = None,
+) -> tuple[list[models.Post], Optional[str]]:
+    query = (
+        select(models.Post)
+        .options(*_post_loader_options(expand_author, comment_preview_size))
+        .execution_options(populate_existing=expand_author)
+    )
+    if author_id is not None:
+        query = query.filter(models.Post.author_id == author_id)
+    if created_after is not None:
+        query = query.filter(models.Post.created_at >= created_after)
+    if created_before is not None:
+        query = query.filter(models.Post.created_at < created_before)
+    if cursor is not None:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        # Seeks past the last seen row instead of using an offset, so every
+        # page is an index range scan of the same size.
+        query = query.filter(
+            tuple_(models.Post.created_at, models.Post.id)
+            < tuple_(cursor_created_at, cursor_id)
+        )
 
+    result = await db.scalars(
+        query.order_by(
+            models.Post.created_at.desc(), models.Post.id.desc()
+        ).limit(limit + 1)
+    )
+    posts = list(result.all())
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        next_cursor = _encode_cursor(posts[-1].created_at, posts[-1].id)
+    if comment_preview_size is not None:
+        await _load_comment_previews(
+            db, posts, comment_preview_size, expand_author
+        )
+    return posts, next_cursor
 
-def get_post_by_id(db: Session, post_id: int) -> Optional[models.Post]:
-    return db.query(models.Post).filter(models.Post.id == post_id).first()
 
+async def search_posts(
+    db: AsyncSession,
+    query: str,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    expand_author: bool = False,
+    comment_preview_size: Optional[int] = None,
+) -> tuple[list[tuple[models.Post, float, str]], Optional[str]]:
+    ts_query = func.websearch_to_tsquery(models.SEARCH_CONFIG, query)
+    rank = func.ts_rank(models.Post.search_vector, ts_query)
+    page_query = select(models.Post.id, rank.label('rank')).filter(
+        models.Post.search_vector.bool_op('@@')(ts_query)
+    )
+    if cursor is not None:
+        cursor_rank, cursor_id = _decode_search_cursor(cursor)
+        page_query = page_query.filter(
+            tuple_(rank, models.Post.id) < tuple_(cursor_rank, cursor_id)
+        )
+    page = (
+        page_query.order_by(rank.desc(), models.Post.id.desc())
+        .limit(limit + 1)
+        .subquery()
+    )
 
-def create_post(
-    db: Session,
+    # Highlighting is the costly part, so it only runs on the page of
+    # matches the GIN index narrowed down, not on every match.
+    snippet = func.ts_headline(
+        models.SEARCH_CONFIG,
+        func.coalesce(models.Post.text_content, models.Post.title),
+        ts_query,
+        f'StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, '
+        'MaxFragments=2, MinWords=5, MaxWords=20',
+    )
+    result = await db.execute(
+        select(models.Post, page.c.rank, snippet)
+        .join(page, models.Post.id == page.c.id)
+        .options(*_post_loader_options(expand_author, comment_preview_size))
+        .execution_options(populate_existing=expand_author)
+        .order_by(page.c.rank.desc(), models.Post.id.desc())
+    )
+    matches = [
+        (db_post, post_rank, _mark_snippet(post_snippet))
+        for db_post, post_rank, post_snippet in result.all()
+    ]
+    next_cursor = None
+    if len(matches) > limit:
+        matches = matches[:limit]
+        last_post, last_rank, _ = matches[-1]
+        next_cursor = _encode_search_cursor(last_rank, last_post.id)
+    if comment_preview_size is not None:
+        await _load_comment_previews(
+            db,
+            [db_post for db_post, _, _ in matches],
+            comment_preview_size,
+            expand_author,
+        )
+    return matches, next_cursor
+
+
+async def get_post_by_id(
+    db: AsyncSession,
+    post_id: int,
+    expand_author: bool = False,
+) -> Optional[models.Post]:
+    return await db.scalar(
+        select(models.Post)
+        .options(*_post_loader_options(expand_author))
+        .execution_options(populate_existing=expand_author)
+        .filter(models.Post.id == post_id)
+    )
+
+
+async def get_posts_by_ids(
+    db: AsyncSession,
+    post_ids: list[int],
+    expand_author: bool = False,
+    comment_preview_size: Optional[int] = None,
+) -> list[models.Post]:
+    result = await db.scalars(
+        select(models.Post)
+        .options(*_post_loader_options(expand_author, comment_preview_size))
+        .execution_options(populate_existing=expand_author)
+        .filter(
+            models.Post.id.in_(
+                [
+                    post_id
+                    for post_id in post_ids
+                    if 1 <= post_id <= schemas.MAX_ID
+                ]
+            )
+        )
+    )
+    posts = list(result.all())
+    if comment_preview_size is not None:
+        await _load_comment_previews(
+            db, posts, comment_preview_size, expand_author
+        )
+    return posts
+
+
+async def create_post(
+    db: AsyncSession,
     post: schemas.PostCreate,
     author_id: int,
 ) -> models.Post:
-    media_files = []
+    saved_media_files = []
     if post.media_files is not None:
-        for file in post.media_files:
-            saved_file_name = _save_media_file(file)
-            media_files.append(saved_file_name)
+        saved_media_files = await storage.save_media_files(
+            db, post.media_files
+        )
+    media_files = [media_file.filename for media_file in saved_media_files]
 
     db_post = models.Post(
         **post.model_dump(exclude={'media_files'}),
         media_files=media_files,
+        media=[
+            models.Media(position=position, **media_file._asdict())
+            for position, media_file in enumerate(saved_media_files)
+        ],
         author_id=author_id,
+        comments=[],
     )
     db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+    try:
+        await db.commit()
+    except Exception:
+        await run_in_threadpool(storage.abandon_media_files, media_files)
+        raise
+    variants.schedule_media_variants(media_files)
+    # Refreshing would expire the collections and make them lazy
+    # load on serialization, which is not allowed on an async session.
     return db_post
 
 
-def delete_post_by_id(
-    db: Session,
+async def delete_post_by_id(
+    db: AsyncSession,
     post_id: int,
     current_user_id: int,
 ) -> None:
-    db_post = get_post_by_id(db, post_id)
+    # Comments and media rows go with the post through the foreign key
+    # cascades, so they are never loaded just to be deleted one by one.
+    db_post = await db.scalar(
+        select(models.Post)
+        .options(noload(models.Post.media))
+        .filter(models.Post.id == post_id)
+    )
     if db_post is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -139,37 +399,70 @@ def delete_post_by_id(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='You do not have permission to delete this post.',
         )
-    db.delete(db_post)
-    db.commit()
+    removable_filenames = await storage.release_media_files(
+        db, db_post.media_files
+    )
+    # Files are unlinked by a job only once the delete is committed, so a
+    # rollback never leaves a post pointing at missing media.
+    if removable_filenames:
+        await jobs.enqueue_job(
+            db, 'remove_media_files', {'filenames': removable_filenames}
+        )
+    await db.delete(db_post)
+    await _commit_post_changes(db, post_id)
 
 
-def get_post_comments(
-    db: Session,
+async def get_post_comments(
+    db: AsyncSession,
     post_id: int,
+    expand_author: bool = False,
 ) -> Optional[list[models.Comment]]:
-    return (
-        db.query(models.Comment)
-        .filter(models.Comment.post_id == post_id)
-        .all()
+    query = select(models.Comment).execution_options(
+        populate_existing=expand_author
     )
+    if expand_author:
+        query = query.options(selectinload(models.Comment.author))
+    result = await db.scalars(
+        query.filter(models.Comment.post_id == post_id).order_by(
+            models.Comment.created_at, models.Comment.id
+        )
+    )
+    comments = list(result.all())
+    # Comments imply their post exists; only an empty list needs a check.
+    if not comments and (
+        await db.scalar(
+            select(models.Post.id).filter(models.Post.id == post_id)
+        )
+        is None
+    ):
+        return None
+    return comments
 
 
-def get_comment_by_id(db: Session, comment_id: int) -> Optional[models.Post]:
-    return (
-        db.query(models.Comment)
-        .filter(models.Comment.id == comment_id)
-        .first()
+async def get_comment_by_id(
+    db: AsyncSession,
+    comment_id: int,
+) -> Optional[models.Comment]:
+    return await db.scalar(
+        select(models.Comment).filter(models.Comment.id == comment_id)
     )
 
 
-def create_comment(
-    db: Session,
+async def create_comment(
+    db: AsyncSession,
     comment: schemas.CommentCreate,
     post_id: int,
     author_id: int,
 ) -> models.Comment:
-    db_post = get_post_by_id(db, post_id)
-    if db_post is None:
+    # Bumping the counter doubles as the existence check and holds the
+    # post row lock until the comment is committed alongside it.
+    updated_post_id = await db.scalar(
+        update(models.Post)
+        .where(models.Post.id == post_id)
+        .values(comment_count=models.Post.comment_count + 1)
+        .returning(models.Post.id)
+    )
+    if updated_post_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='Post not found.',
@@ -181,17 +474,79 @@ def create_comment(
         author_id=author_id,
     )
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+    await _commit_post_changes(db, post_id)
+    await db.refresh(db_comment)
     return db_comment
 
 
-def delete_comment_by_id(
-    db: Session,
+async def create_comments(
+    db: AsyncSession,
+    comments: list[schemas.CommentBatchItem],
+    author_id: int,
+) -> list[Optional[models.Comment]]:
+    # Out-of-range ids cannot match a post, and would fail the statement.
+    comment_counts = Counter(
+        comment.post_id
+        for comment in comments
+        if 1 <= comment.post_id <= schemas.MAX_ID
+    )
+    existing_post_ids = set()
+    if comment_counts:
+        post_comment_counts = values(
+            column('post_id', Integer),
+            column('comment_count', Integer),
+            name='post_comment_counts',
+        ).data(list(comment_counts.items()))
+        # One statement both finds which target posts exist and bumps
+        # their counters, locking those rows until the comments are
+        # committed.
+        result = await db.scalars(
+            update(models.Post)
+            .where(models.Post.id == post_comment_counts.c.post_id)
+            .values(
+                comment_count=models.Post.comment_count
+                + post_comment_counts.c.comment_count
+            )
+            .returning(models.Post.id)
+            .execution_options(synchronize_session=False)
+        )
+        existing_post_ids = set(result.all())
+
+    valid_comments = [
+        comment for comment in comments if comment.post_id in existing_post_ids
+    ]
+    db_comments = []
+    if valid_comments:
+        result = await db.scalars(
+            insert(models.Comment).returning(
+                models.Comment, sort_by_parameter_order=True
+            ),
+            [
+                {
+                    **comment.model_dump(),
+                    'author_id': author_id,
+                }
+                for comment in valid_comments
+            ],
+        )
+        db_comments = list(result.all())
+    await _commit_post_changes(db, *existing_post_ids)
+
+    created_comments = iter(db_comments)
+    return [
+        next(created_comments)
+        if comment.post_id in existing_post_ids
+        else None
+        for comment in comments
+    ]
+
+
+async def delete_comment_by_id(
+    db: AsyncSession,
     comment_id: int,
     current_user_id: int,
 ) -> None:
-    db_comment = get_comment_by_id(db, comment_id)
+    db_comment = await get_comment_by_id(db, comment_id)
     if db_comment is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -202,5 +557,52 @@ def delete_comment_by_id(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='You do not have permission to delete this comment.',
         )
-    db.delete(db_comment)
-    db.commit()
+    # A concurrent delete may have removed the row since it was read, and
+    # the count must only drop for the delete that actually removed it.
+    post_id = await db.scalar(
+        delete(models.Comment)
+        .where(models.Comment.id == comment_id)
+        .returning(models.Comment.post_id)
+    )
+    if post_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Comment not found.',
+        )
+    await db.execute(
+        update(models.Post)
+        .where(models.Post.id == post_id)
+        .values(comment_count=models.Post.comment_count - 1)
+    )
+    await _commit_post_changes(db, post_id)
+
+
+async def reconcile_comment_counts(
+    db: AsyncSession,
+    batch_size: int = 1000,
+) -> int:
+    max_post_id = await db.scalar(select(func.max(models.Post.id)))
+    actual_comment_count = (
+        select(func.count(models.Comment.id))
+        .where(models.Comment.post_id == models.Post.id)
+        .scalar_subquery()
+    )
+    fixed_count = 0
+    # Works through the table in id ranges with a commit after each, so
+    # no single transaction holds locks on every post.
+    for start_id in range(1, (max_post_id or 0) + 1, batch_size):
+        result = await db.scalars(
+            update(models.Post)
+            .where(
+                models.Post.id >= start_id,
+                models.Post.id < start_id + batch_size,
+                models.Post.comment_count != actual_comment_count,
+            )
+            .values(comment_count=actual_comment_count)
+            .returning(models.Post.id)
+            .execution_options(synchronize_session=False)
+        )
+        fixed_post_ids = result.all()
+        fixed_count += len(fixed_post_ids)
+        await _commit_post_changes(db, *fixed_post_ids)
+    return fixed_count
@@ -1,9 +1,28 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
 
+from postamoo import metrics, querylog
 from postamoo.config import DATABASE_URL
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+def create_async_url(url: str) -> URL:
+    database_url = make_url(url)
+    if database_url.get_backend_name() == 'postgresql':
+        database_url = database_url.set(drivername='postgresql+asyncpg')
+    return database_url
+
+
+engine = create_async_engine(
+    create_async_url(DATABASE_URL), poolclass=metrics.InstrumentedQueuePool
+)
+metrics.instrument_engine(engine.sync_engine)
+metrics.register_pool(engine.sync_engine.pool)
+querylog.instrument_engine(engine.sync_engine)
+SessionLocal = async_sessionmaker(
+    bind=engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
 
 Base = declarative_base()
@@ -1,25 +1,76 @@
-from typing import Iterator, AsyncIterator
+import time
+import hashlib
+from typing import Any, AsyncIterator
+from http.cookiejar import CookieJar, DefaultCookiePolicy
 
 import httpx
 from fastapi import Request, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from postamoo import models, crud
+from postamoo import schemas, crud, metrics
+from postamoo.cache import access_token_cache, user_profile_cache
+from postamoo.security import verify_access_token
 from postamoo.database import SessionLocal
-from postamoo.config import AUTH_PROVIDER_URL
+from postamoo.config import (
+    AUTH_PROVIDER_URL,
+    AUTH_PROVIDER_TIMEOUT,
+    AUTH_PROVIDER_MAX_CONNECTIONS,
+    AUTH_PROVIDER_MAX_KEEPALIVE_CONNECTIONS,
+    AUTH_PROVIDER_KEEPALIVE_EXPIRY,
+    AUTH_PROVIDER_HTTP2_ENABLED,
+    AUTH_MODE,
+)
 
 
-def get_db() -> Iterator[Session]:
-    db = SessionLocal()
-    try:
+def hash_access_token(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-async def get_httpx_client() -> AsyncIterator[httpx.AsyncClient]:
-    async with httpx.AsyncClient() as client:
-        yield client
+def create_httpx_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=AUTH_PROVIDER_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=AUTH_PROVIDER_MAX_CONNECTIONS,
+            max_keepalive_connections=AUTH_PROVIDER_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=AUTH_PROVIDER_KEEPALIVE_EXPIRY,
+        ),
+        http2=AUTH_PROVIDER_HTTP2_ENABLED,
+        # The client is shared by every request, so it must never keep the
+        # cookies set by one user's response and send them for another.
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+    )
+
+
+async def get_httpx_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.httpx_client
+
+
+async def request_auth_provider(
+    client: httpx.AsyncClient,
+    method: str,
+    path: str,
+    **kwargs: Any,
+) -> httpx.Response:
+    status_code = 'error'
+    start_time = time.perf_counter()
+    try:
+        response = await client.request(
+            method, f'{AUTH_PROVIDER_URL}{path}', **kwargs
+        )
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.observe_auth_provider_request(
+            time.perf_counter() - start_time,
+            method=method,
+            path=path,
+            status_code=status_code,
+        )
 
 
 async def get_access_token(request: Request) -> str:
@@ -32,32 +83,58 @@ async def get_access_token(request: Request) -> str:
     return access_token
 
 
+async def _fetch_username(
+    access_token: str,
+    client: httpx.AsyncClient,
+) -> str:
+    access_token_hash = hash_access_token(access_token)
+    username = access_token_cache.get(access_token_hash)
+    if username is None:
+        try:
+            response = await request_auth_provider(
+                client,
+                'GET',
+                '/users/me/',
+                cookies={'access_token': access_token},
+            )
+            response.raise_for_status()
+            response_content = response.json()
+        except httpx.HTTPError as e:
+            error_response = e.response.json()
+            error_detail = error_response.get('detail', 'Unknown error!')
+            raise HTTPException(
+                status_code=e.response.status_code,
+                detail=error_detail,
+            )
+        username = response_content['username']
+        access_token_cache.set(access_token_hash, username)
+    return username
+
+
 async def get_current_user(
     access_token: str = Depends(get_access_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     client: httpx.AsyncClient = Depends(get_httpx_client),
-) -> models.UserProfile:
-    try:
-        response = await client.get(
-            f'{AUTH_PROVIDER_URL}/users/me/',
-            cookies={'access_token': access_token},
-        )
-        response.raise_for_status()
-        response_content = response.json()
-    except httpx.HTTPError as e:
-        error_response = e.response.json()
-        error_detail = error_response.get('detail', 'Unknown error!')
-        raise HTTPException(
-            status_code=e.response.status_code,
-            detail=error_detail,
-        )
+) -> schemas.UserProfile:
+    if AUTH_MODE == 'local':
+        username = verify_access_token(access_token)
+    else:
+        username = await _fetch_username(access_token, client)
+
+    user_profile = user_profile_cache.get(username)
+    if user_profile is not None:
+        return user_profile
 
-    db_user_profile = crud.get_user_profile_by_username(
-        db=db, username=response_content['username']
+    db_user_profile = await crud.get_user_profile_by_username(
+        db=db, username=username
     )
     if db_user_profile is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail='User not found in the database.',
         )
-    return db_user_profile
+    # Cache a frozen copy rather than the ORM instance, which belongs to
+    # this request's session.
+    user_profile = schemas.UserProfile.model_validate(db_user_profile)
+    user_profile_cache.set(username, user_profile)
+    return user_profile
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import contextlib
+from typing import Any, Optional
+
+import asyncpg
+from sqlalchemy import Integer, String, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo.cache import response_cache
+from postamoo.config import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+POST_RESPONSES_CHANNEL = 'post_responses'
+RECONNECT_DELAY = 5
+
+_listener_task: Optional[asyncio.Task] = None
+_stop_event: Optional[asyncio.Event] = None
+
+
+def invalidate_post_responses(*post_ids: int) -> None:
+    response_cache.delete(
+        *(
+            (resource, post_id, expand_author)
+            for post_id in post_ids
+            for resource in ('post', 'post_comments')
+            for expand_author in (False, True)
+        )
+    )
+
+
+async def notify_post_responses(db: AsyncSession, *post_ids: int) -> None:
+    if not post_ids:
+        return
+    # Delivered to every listening process when the transaction commits,
+    # and not at all when it rolls back.
+    post_id = func.unnest(literal(list(post_ids), ARRAY(Integer)))
+    await db.execute(
+        select(
+            func.pg_notify(
+                POST_RESPONSES_CHANNEL,
+                cast(post_id.column_valued('post_id'), String),
+            )
+        )
+    )
+
+
+def _handle_notification(
+    connection: Any,
+    pid: int,
+    channel: str,
+    payload: str,
+) -> None:
+    invalidate_post_responses(int(payload))
+
+
+async def _wait_for_any(*events: asyncio.Event) -> None:
+    waiters = [asyncio.create_task(event.wait()) for event in events]
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+
+async def listen_for_invalidations(
+    stop_event: asyncio.Event,
+    database_url: str = DATABASE_URL,
+) -> None:
+    # A dedicated connection, so the listener never holds one of the pool.
+    dsn = (
+        make_url(database_url)
+        .set(drivername='postgresql')
+        .render_as_string(hide_password=False)
+    )
+    while not stop_event.is_set():
+        try:
+            connection = await asyncpg.connect(dsn)
+        except (OSError, asyncpg.PostgresError):
+            logger.exception('Could not connect to listen for invalidations.')
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), RECONNECT_DELAY)
+            continue
+
+        connection_lost = asyncio.Event()
+        connection.add_termination_listener(lambda _: connection_lost.set())
+        try:
+            await connection.add_listener(
+                POST_RESPONSES_CHANNEL, _handle_notification
+            )
+            # Invalidations sent while nothing was listening were missed.
+            response_cache.clear()
+            await _wait_for_any(stop_event, connection_lost)
+        except (OSError, asyncpg.PostgresError):
+            logger.exception('Lost the invalidation listener connection.')
+        finally:
+            with contextlib.suppress(OSError, asyncpg.PostgresError):
+                await connection.close()
+        if not stop_event.is_set():
+            logger.warning('Reconnecting the invalidation listener.')
+
+
+def start_invalidation_listener() -> None:
+    global _listener_task, _stop_event
+    _stop_event = asyncio.Event()
+    _listener_task = asyncio.create_task(listen_for_invalidations(_stop_event))
+
+
+async def stop_invalidation_listener(timeout: float = 10) -> None:
+    global _listener_task
+    if _listener_task is None:
+        return
+    _stop_event.set()
+    with contextlib.suppress(asyncio.TimeoutError, asyncio.CancelledError):
+        await asyncio.wait_for(_listener_task, timeout)
+    _listener_task = None
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import contextlib
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, storage
+from postamoo.database import SessionLocal
+from postamoo.config import (
+    JOB_POLL_INTERVAL,
+    JOB_BATCH_SIZE,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_DELAY,
+    MEDIA_SWEEP_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[AsyncSession, dict[str, Any]], Awaitable[None]]
+
+JOB_HANDLERS: dict[str, JobHandler] = {}
+RECURRING_JOBS = {'sweep_orphaned_media': MEDIA_SWEEP_INTERVAL}
+
+_worker_task: Optional[asyncio.Task] = None
+_stop_event: Optional[asyncio.Event] = None
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    def register(handler: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = handler
+        return handler
+
+    return register
+
+
+async def enqueue_job(
+    db: AsyncSession,
+    kind: str,
+    payload: dict[str, Any],
+    delay: float = 0,
+) -> None:
+    # Not committed here: the job becomes visible together with the change
+    # that asked for it, or not at all.
+    await db.execute(
+        insert(models.Job).values(
+            kind=kind,
+            payload=payload,
+            run_at=func.now() + timedelta(seconds=delay),
+        )
+    )
+
+
+async def schedule_recurring_jobs(db: AsyncSession) -> None:
+    # Serializes workers starting at the same time, so each recurring job
+    # is only ever queued once.
+    await db.execute(
+        select(func.pg_advisory_xact_lock(func.hashtext('recurring_jobs')))
+    )
+    # Dead-lettered rows keep their kind but will never run again.
+    scheduled_kinds = set(
+        await db.scalars(
+            select(models.Job.kind)
+            .filter(
+                models.Job.kind.in_(RECURRING_JOBS),
+                models.Job.run_at.is_not(None),
+            )
+            .distinct()
+        )
+    )
+    for kind in RECURRING_JOBS.keys() - scheduled_kinds:
+        await enqueue_job(db, kind, {})
+    await db.commit()
+
+
+async def run_pending_jobs(
+    db: AsyncSession,
+    batch_size: int = JOB_BATCH_SIZE,
+) -> int:
+    claimable_job_ids = (
+        select(models.Job.id)
+        .filter(models.Job.run_at <= func.now())
+        .order_by(models.Job.run_at, models.Job.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    # Claiming pushes `run_at` past a lease instead of holding row locks
+    # while the handlers run, so a worker that dies mid-job only delays it.
+    result = await db.execute(
+        update(models.Job)
+        .filter(models.Job.id.in_(claimable_job_ids.scalar_subquery()))
+        .values(
+            run_at=func.now() + timedelta(seconds=JOB_LEASE_SECONDS),
+            attempts=models.Job.attempts + 1,
+        )
+        .returning(
+            models.Job.id,
+            models.Job.kind,
+            models.Job.payload,
+            models.Job.attempts,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    claimed_jobs = result.all()
+    await db.commit()
+
+    for job in claimed_jobs:
+        try:
+            await JOB_HANDLERS[job.kind](db, job.payload)
+        except Exception as e:
+            await db.rollback()
+            logger.exception('Job %s (%s) failed.', job.id, job.kind)
+            retry_delay = min(JOB_RETRY_DELAY * 2 ** (job.attempts - 1), 3600)
+            dead_lettered = job.attempts >= JOB_MAX_ATTEMPTS
+            await db.execute(
+                update(models.Job)
+                .filter(models.Job.id == job.id)
+                .values(
+                    run_at=(
+                        None
+                        if dead_lettered
+                        else func.now() + timedelta(seconds=retry_delay)
+                    ),
+                    last_error=repr(e),
+                )
+            )
+            # The failed run stays behind for inspection, but a recurring
+            # job still has to come around again.
+            if dead_lettered and job.kind in RECURRING_JOBS:
+                await enqueue_job(
+                    db, job.kind, job.payload, RECURRING_JOBS[job.kind]
+                )
+        else:
+            await db.execute(
+                delete(models.Job).filter(models.Job.id == job.id)
+            )
+            if job.kind in RECURRING_JOBS:
+                await enqueue_job(
+                    db, job.kind, job.payload, RECURRING_JOBS[job.kind]
+                )
+        await db.commit()
+    return len(claimed_jobs)
+
+
+async def run_job_worker(
+    stop_event: asyncio.Event,
+    batch_size: int = JOB_BATCH_SIZE,
+) -> None:
+    recurring_jobs_scheduled = False
+    while not stop_event.is_set():
+        try:
+            async with SessionLocal() as db:
+                if not recurring_jobs_scheduled:
+                    await schedule_recurring_jobs(db)
+                    recurring_jobs_scheduled = True
+                processed_count = await run_pending_jobs(db, batch_size)
+        except Exception:
+            logger.exception('Failed to run pending jobs.')
+            processed_count = 0
+        if processed_count == 0:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), JOB_POLL_INTERVAL)
+
+
+def start_job_worker() -> None:
+    global _worker_task, _stop_event
+    _stop_event = asyncio.Event()
+    _worker_task = asyncio.create_task(run_job_worker(_stop_event))
+
+
+async def stop_job_worker(timeout: float = 10) -> None:
+    global _worker_task
+    if _worker_task is None:
+        return
+    _stop_event.set()
+    # A job cut off here keeps its lease and is retried once it runs out.
+    with contextlib.suppress(asyncio.TimeoutError, asyncio.CancelledError):
+        await asyncio.wait_for(_worker_task, timeout)
+    _worker_task = None
+
+
+@job_handler('remove_media_files')
+async def remove_media_files(
+    db: AsyncSession,
+    payload: dict[str, Any],
+) -> None:
+    await storage.remove_unreferenced_media_files(db, payload['filenames'])
+
+
+@job_handler('sweep_orphaned_media')
+async def sweep_orphaned_media(
+    db: AsyncSession,
+    payload: dict[str, Any],
+) -> None:
+    removed_count = await storage.sweep_orphaned_media(db)
+    logger.info('Swept %d orphaned media file(s).', removed_count)
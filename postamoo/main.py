@@ -3,20 +3,38 @@ from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-from postamoo.routers import user_management, posts
-from postamoo.database import Base, engine
-from postamoo.config import MEDIA_UPLOAD_FOLDER, MEDIA_STORAGE_PATH
+from postamoo import variants, jobs, invalidation
+from postamoo.metrics import MetricsMiddleware
+from postamoo.routers import user_management, posts, media, stats
+from postamoo.database import engine
+from postamoo.dependencies import create_httpx_client
+from postamoo.security import check_local_auth_config
+from postamoo.config import (
+    AUTH_MODE,
+    MEDIA_STORAGE_PATH,
+    JOB_WORKER_ENABLED,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    if AUTH_MODE == 'local':
+        check_local_auth_config()
     os.makedirs(MEDIA_STORAGE_PATH, exist_ok=True)
-    Base.metadata.create_all(bind=engine)
+    app.state.httpx_client = create_httpx_client()
+    variants.start_variant_pool()
+    invalidation.start_invalidation_listener()
+    if JOB_WORKER_ENABLED:
+        jobs.start_job_worker()
     # Yield to allow the application to start handling requests.
     yield
+    await jobs.stop_job_worker()
+    await invalidation.stop_invalidation_listener()
+    variants.stop_variant_pool()
+    await app.state.httpx_client.aclose()
+    await engine.dispose()
 
 
 app = FastAPI(
@@ -32,14 +50,9 @@ app.add_middleware(
     allow_methods=['*'],
     allow_headers=['*'],
 )
-
-media_files_path = f'/{MEDIA_UPLOAD_FOLDER}'
-media_files_directory = os.path.dirname(MEDIA_UPLOAD_FOLDER)
-app.mount(
-    media_files_path,
-    StaticFiles(directory=MEDIA_STORAGE_PATH),
-    name=media_files_directory,
-)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(user_management.router, tags=['User Management'])
 app.include_router(posts.router, tags=['Posts'])
+app.include_router(media.router, tags=['Media'])
+app.include_router(stats.router, tags=['Stats'])
@@ -0,0 +1,186 @@
+import json
+import math
+import shutil
+import subprocess
+from typing import Any, Optional
+
+from postamoo.config import MAX_IMAGE_PIXELS
+
+try:
+    from PIL import Image, ImageOps, ExifTags
+except ImportError:
+    Image = None
+
+_BASE83_CHARACTERS = (
+    '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    'abcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+)
+
+
+class ImageTooLargeError(Exception):
+    pass
+
+
+def _encode_base83(value: int, length: int) -> str:
+    return ''.join(
+        _BASE83_CHARACTERS[(value // 83 ** (length - i - 1)) % 83]
+        for i in range(length)
+    )
+
+
+def _srgb_to_linear(value: int) -> float:
+    value = value / 255
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return round(value * 12.92 * 255)
+    return round((1.055 * value ** (1 / 2.4) - 0.055) * 255)
+
+
+def encode_blurhash(
+    image: Any,
+    x_components: int = 4,
+    y_components: int = 3,
+) -> str:
+    # BlurHash (https://blurha.sh) packs a handful of DCT components into
+    # ~30 characters that clients render as a blurred preview.
+    image = image.convert('RGB')
+    image.thumbnail((32, 32))
+    width, height = image.size
+    pixels = [
+        tuple(_srgb_to_linear(channel) for channel in pixel)
+        for pixel in image.getdata()
+    ]
+
+    factors = []
+    for j in range(y_components):
+        cosines_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cosines_x = [
+                math.cos(math.pi * i * x / width) for x in range(width)
+            ]
+            normalisation = 1 if i == 0 and j == 0 else 2
+            factor = [0.0, 0.0, 0.0]
+            for y in range(height):
+                for x in range(width):
+                    basis = cosines_x[x] * cosines_y[y]
+                    pixel = pixels[y * width + x]
+                    for channel in range(3):
+                        factor[channel] += basis * pixel[channel]
+            scale = normalisation / (width * height)
+            factors.append([value * scale for value in factor])
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = _encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        actual_maximum = max(abs(value) for factor in ac for value in factor)
+        quantised_maximum = max(
+            0, min(82, math.floor(actual_maximum * 166 - 0.5))
+        )
+        maximum = (quantised_maximum + 1) / 166
+    else:
+        quantised_maximum, maximum = 0, 1
+    blurhash += _encode_base83(quantised_maximum, 1)
+    blurhash += _encode_base83(
+        (_linear_to_srgb(dc[0]) << 16)
+        + (_linear_to_srgb(dc[1]) << 8)
+        + _linear_to_srgb(dc[2]),
+        4,
+    )
+    for factor in ac:
+        quantised = [
+            max(
+                0,
+                min(
+                    18,
+                    math.floor(
+                        math.copysign(abs(value / maximum) ** 0.5, value) * 9
+                        + 9.5
+                    ),
+                ),
+            )
+            for value in factor
+        ]
+        blurhash += _encode_base83(
+            quantised[0] * 19 * 19 + quantised[1] * 19 + quantised[2], 2
+        )
+    return blurhash
+
+
+def _extract_image_metadata(file_path: str) -> dict[str, Any]:
+    if Image is None:
+        return {}
+    try:
+        image = Image.open(file_path)
+    except Image.DecompressionBombError as error:
+        raise ImageTooLargeError from error
+    with image:
+        # Read before `draft`, which shrinks the size JPEGs report.
+        width, height = image.size
+        if width * height > MAX_IMAGE_PIXELS:
+            raise ImageTooLargeError
+        if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+            width, height = height, width
+        # Lets the JPEG decoder skip most of the work for the placeholder.
+        image.draft('RGB', (64, 64))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return {
+            'width': width,
+            'height': height,
+            'placeholder': encode_blurhash(image),
+        }
+
+
+def _extract_video_metadata(file_path: str) -> dict[str, Any]:
+    ffprobe_path = shutil.which('ffprobe')
+    if ffprobe_path is None:
+        return {}
+    completed_process = subprocess.run(
+        [
+            ffprobe_path,
+            '-v',
+            'error',
+            '-select_streams',
+            'v:0',
+            '-show_entries',
+            'stream=width,height:format=duration',
+            '-of',
+            'json',
+            file_path,
+        ],
+        capture_output=True,
+        timeout=30,
+    )
+    if completed_process.returncode != 0:
+        return {}
+    probe = json.loads(completed_process.stdout)
+    streams = probe.get('streams') or [{}]
+    duration = probe.get('format', {}).get('duration')
+    return {
+        'width': streams[0].get('width'),
+        'height': streams[0].get('height'),
+        'duration': float(duration) if duration is not None else None,
+    }
+
+
+def extract_media_metadata(
+    file_path: str,
+    mime_type: Optional[str],
+) -> dict[str, Any]:
+    try:
+        if mime_type is not None and mime_type.startswith('image/'):
+            return _extract_image_metadata(file_path)
+        elif mime_type is not None and mime_type.startswith('video/'):
+            return _extract_video_metadata(file_path)
+    except (OSError, ValueError, subprocess.SubprocessError):
+        # Metadata is a convenience for clients, so an unreadable file is
+        # stored without it rather than rejected.
+        pass
+    return {}
@@ -0,0 +1,199 @@
+import time
+import contextvars
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import prometheus_client
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:
+    prometheus_client = None
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, float('inf'))
+
+if prometheus_client is not None:
+    CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST
+
+    http_request_duration = prometheus_client.Histogram(
+        'postamoo_http_request_duration_seconds',
+        'Time spent handling HTTP requests.',
+        ('method', 'route', 'status_code'),
+    )
+    http_request_queries = prometheus_client.Histogram(
+        'postamoo_http_request_db_queries',
+        'Database queries issued per HTTP request.',
+        ('method', 'route'),
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+    http_request_query_duration = prometheus_client.Histogram(
+        'postamoo_http_request_db_duration_seconds',
+        'Time spent in database queries per HTTP request.',
+        ('method', 'route'),
+    )
+    db_query_duration = prometheus_client.Histogram(
+        'postamoo_db_query_duration_seconds',
+        'Time spent executing database queries.',
+    )
+    db_pool_checkout_duration = prometheus_client.Histogram(
+        'postamoo_db_pool_checkout_duration_seconds',
+        'Time spent waiting for a pooled database connection.',
+    )
+    auth_provider_request_duration = prometheus_client.Histogram(
+        'postamoo_auth_provider_request_duration_seconds',
+        'Time spent on requests to the auth provider.',
+        ('method', 'path', 'status_code'),
+    )
+
+
+def metrics_enabled() -> bool:
+    return prometheus_client is not None
+
+
+def render_metrics() -> bytes:
+    return prometheus_client.generate_latest()
+
+
+class RequestStats:
+    def __init__(self, scope: Scope) -> None:
+        self.scope = scope
+        self.query_count = 0
+        self.query_duration = 0.0
+
+    @property
+    def route(self) -> str:
+        # Only known once the router has matched the request; the path
+        # template keeps the label set bounded, unlike the raw path.
+        route = self.scope.get('route')
+        return getattr(route, 'path', 'unmatched')
+
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = (
+    contextvars.ContextVar('request_stats', default=None)
+)
+
+
+def get_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+class MetricsMiddleware:
+    # Request stats are collected even without prometheus_client, as the
+    # query budget in `querylog` reads them.
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_stats = RequestStats(scope)
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        token = _request_stats.set(request_stats)
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start_time
+            _request_stats.reset(token)
+            if prometheus_client is not None:
+                method, route = scope['method'], request_stats.route
+                http_request_duration.labels(
+                    method, route, status_code
+                ).observe(duration)
+                http_request_queries.labels(method, route).observe(
+                    request_stats.query_count
+                )
+                http_request_query_duration.labels(method, route).observe(
+                    request_stats.query_duration
+                )
+
+
+def observe_auth_provider_request(
+    duration: float,
+    method: str,
+    path: str,
+    status_code: Any,
+) -> None:
+    if prometheus_client is not None:
+        auth_provider_request_duration.labels(
+            method, path, status_code
+        ).observe(duration)
+
+
+def _before_cursor_execute(conn: Any, *args: Any) -> None:
+    conn.info.setdefault('query_start_times', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn: Any, *args: Any) -> None:
+    duration = time.perf_counter() - conn.info['query_start_times'].pop()
+    if prometheus_client is not None:
+        db_query_duration.observe(duration)
+    request_stats = _request_stats.get()
+    if request_stats is not None:
+        request_stats.query_count += 1
+        request_stats.query_duration += duration
+
+
+def _handle_error(context: Any) -> None:
+    if context.connection is not None:
+        query_start_times = context.connection.info.get('query_start_times')
+        if query_start_times:
+            query_start_times.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def connect(self) -> Any:
+        start_time = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            if prometheus_client is not None:
+                db_pool_checkout_duration.observe(
+                    time.perf_counter() - start_time
+                )
+
+
+class _PoolCollector:
+    def __init__(self, pool: QueuePool) -> None:
+        self.pool = pool
+
+    def collect(self) -> Iterator[Any]:
+        # Read at scrape time, so the gauges never lag behind the pool.
+        gauge = GaugeMetricFamily(
+            'postamoo_db_pool_connections',
+            'Connections of the database pool by state.',
+            labels=('state',),
+        )
+        gauge.add_metric(('size',), self.pool.size())
+        gauge.add_metric(('idle',), self.pool.checkedin())
+        gauge.add_metric(('in_use',), self.pool.checkedout())
+        gauge.add_metric(('overflow',), max(self.pool.overflow(), 0))
+        yield gauge
+
+
+def register_pool(pool: Pool) -> None:
+    if prometheus_client is not None and isinstance(pool, QueuePool):
+        prometheus_client.REGISTRY.register(_PoolCollector(pool))
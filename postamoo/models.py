@@ -4,15 +4,25 @@ from sqlalchemy import (
     Column,
     ForeignKey,
     Integer,
+    BigInteger,
+    Boolean,
+    Float,
     String,
     Text,
     DateTime,
-    ARRAY,
+    Index,
+    Computed,
+    func,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 
 from postamoo.database import Base
 
+# `simple` only lowercases, so no language's stemming is forced on posts
+# written in another.
+SEARCH_CONFIG = 'simple'
+
 
 class UserProfile(Base):
     __tablename__ = 'user_profiles'
@@ -34,16 +44,72 @@ class Post(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(100), nullable=False)
     text_content = Column(Text)
-    media_files = Column(ARRAY(String(40)))
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    media_files = Column(ARRAY(String(100)))
+    comment_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+    )
     author_id = Column(
         Integer,
         ForeignKey('user_profiles.id'),
         nullable=False,
     )
+    search_vector = deferred(
+        Column(
+            TSVECTOR,
+            Computed(
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+                "coalesce(title, '')), 'A') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+                "coalesce(text_content, '')), 'B')",
+                persisted=True,
+            ),
+        )
+    )
 
-    author = relationship('UserProfile', back_populates='posts')
-    comments = relationship('Comment', back_populates='post')
+    # Lazy loading cannot run on an async session, so the author stays
+    # unset unless a query asks for it with `selectinload`.
+    author = relationship('UserProfile', back_populates='posts', lazy='noload')
+    comments = relationship(
+        'Comment',
+        back_populates='post',
+        order_by='(Comment.created_at, Comment.id)',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+    )
+    media = relationship(
+        'Media',
+        back_populates='post',
+        order_by='Media.position',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        Index('ix_posts_created_at_id', 'created_at', 'id'),
+        Index(
+            'ix_posts_author_id_created_at',
+            'author_id',
+            created_at.desc(),
+            id.desc(),
+        ),
+        Index(
+            'ix_posts_search_vector',
+            'search_vector',
+            postgresql_using='gin',
+        ),
+        Index(
+            'ix_posts_media_files',
+            'media_files',
+            postgresql_using='gin',
+        ),
+    )
 
 
 class Comment(Base):
@@ -51,13 +117,96 @@ class Comment(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    post_id = Column(Integer, ForeignKey('posts.id'), nullable=False)
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+    )
+    post_id = Column(
+        Integer,
+        ForeignKey('posts.id', ondelete='CASCADE'),
+        nullable=False,
+    )
     author_id = Column(
         Integer,
         ForeignKey('user_profiles.id'),
         nullable=False,
     )
 
-    author = relationship('UserProfile', back_populates='comments')
+    author = relationship(
+        'UserProfile', back_populates='comments', lazy='noload'
+    )
     post = relationship('Post', back_populates='comments')
+
+    __table_args__ = (
+        Index('ix_comments_post_id_created_at', 'post_id', 'created_at', 'id'),
+    )
+
+
+class MediaBlob(Base):
+    __tablename__ = 'media_blobs'
+
+    filename = Column(String(100), primary_key=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+
+
+class Media(Base):
+    __tablename__ = 'media'
+
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(
+        Integer,
+        ForeignKey('posts.id', ondelete='CASCADE'),
+        nullable=False,
+    )
+    position = Column(Integer, nullable=False)
+    filename = Column(String(100), nullable=False)
+    mime_type = Column(String(100), nullable=False)
+    byte_size = Column(BigInteger, nullable=False)
+    width = Column(Integer)
+    height = Column(Integer)
+    duration = Column(Float)
+    placeholder = Column(String(100))
+    # Set by the variant pool once every variant of an image is written.
+    variants_ready = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default='false',
+    )
+
+    post = relationship('Post', back_populates='media')
+
+    __table_args__ = (
+        Index('ix_media_post_id_position', 'post_id', 'position'),
+    )
+
+
+class Job(Base):
+    __tablename__ = 'jobs'
+
+    id = Column(BigInteger, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSONB, nullable=False, default=dict)
+    # Null once the job has used up its attempts and is kept for
+    # inspection only.
+    run_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        server_default=func.now(),
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+    __table_args__ = (
+        Index(
+            'ix_jobs_run_at_id',
+            'run_at',
+            'id',
+            postgresql_where=run_at.isnot(None),
+        ),
+    )
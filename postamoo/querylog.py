@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import contextvars
+from typing import Any, Optional
+
+import greenlet
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from postamoo.cache import TTLCache
+from postamoo.metrics import get_request_stats
+from postamoo.config import (
+    DEBUG_ENABLED,
+    SLOW_QUERY_THRESHOLD,
+    SLOW_QUERY_EXPLAIN_ENABLED,
+    QUERY_BUDGET,
+)
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_ENFORCED = DEBUG_ENABLED
+EXPLAINABLE_STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+MAX_PENDING_EXPLAINS = 4
+
+_CRUD_FILE = os.path.join(os.path.dirname(__file__), 'crud.py')
+
+# A statement that is slow once tends to be slow on every request, so its
+# plan is captured at most once in a while.
+_explained_statements = TTLCache(maxsize=1000, ttl=300)
+_pending_explains: set[asyncio.Task] = set()
+_explaining = contextvars.ContextVar('explaining', default=False)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def _redact_value(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return [_redact_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _redact_value(item) for key, item in value.items()}
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return f'<{type(value).__name__}>'
+
+
+def redact_parameters(parameters: Any) -> Any:
+    # Numbers and flags (ids, limits) help reproduce a plan and leak
+    # nothing; text, bytes and timestamps only keep their type.
+    return _redact_value(parameters)
+
+
+def _find_crud_caller() -> Optional[str]:
+    # Cursor events run on the greenlet SQLAlchemy spawns per call, while
+    # the awaiting coroutines are suspended on its parent greenlets.
+    frame, current_greenlet = sys._getframe(1), greenlet.getcurrent()
+    while True:
+        while frame is not None:
+            if frame.f_code.co_filename == _CRUD_FILE:
+                return f'crud.{frame.f_code.co_name}'
+            frame = frame.f_back
+        current_greenlet = current_greenlet.parent
+        if current_greenlet is None:
+            return None
+        frame = current_greenlet.gr_frame
+
+
+async def _explain_and_log(
+    engine: AsyncEngine,
+    statement: str,
+    message: str,
+    args: tuple,
+) -> None:
+    _explaining.set(True)
+    try:
+        async with engine.connect() as connection:
+            # Values would show up as literals in the plan, so it is a
+            # generic one, explained with nulls standing in for them.
+            await connection.exec_driver_sql(
+                'SET LOCAL plan_cache_mode = force_generic_plan'
+            )
+            await connection.exec_driver_sql(
+                f'PREPARE postamoo_explain AS {statement}'
+            )
+            try:
+                parameter_count = await connection.scalar(
+                    text(
+                        'SELECT cardinality(parameter_types) '
+                        'FROM pg_prepared_statements '
+                        "WHERE name = 'postamoo_explain'"
+                    )
+                )
+                result = await connection.exec_driver_sql(
+                    'EXPLAIN EXECUTE postamoo_explain'
+                    f'({", ".join(["NULL"] * parameter_count)})'
+                    if parameter_count
+                    else 'EXPLAIN EXECUTE postamoo_explain'
+                )
+                plan = '\n'.join(row[0] for row in result)
+            finally:
+                await connection.rollback()
+                await connection.exec_driver_sql('DEALLOCATE postamoo_explain')
+    except Exception as e:
+        plan = f'unavailable ({e!r})'
+    logger.warning(message + '\n%s', *args, plan)
+
+
+def _before_cursor_execute(conn: Any, *args: Any) -> None:
+    request_stats = get_request_stats()
+    if (
+        QUERY_BUDGET_ENFORCED
+        and request_stats is not None
+        and request_stats.query_count >= QUERY_BUDGET
+    ):
+        raise QueryBudgetExceeded(
+            f'{request_stats.route} issued more than {QUERY_BUDGET} '
+            'statements; look for lazy or per-row loading.'
+        )
+    conn.info.setdefault('slow_query_start_times', []).append(
+        time.perf_counter()
+    )
+
+
+def _after_cursor_execute(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    duration = time.perf_counter() - conn.info['slow_query_start_times'].pop()
+    if duration < SLOW_QUERY_THRESHOLD or _explaining.get():
+        return
+
+    request_stats = get_request_stats()
+    message = 'Slow query (%.3fs) in %s from %s: %s\nParameters: %r'
+    args = (
+        duration,
+        request_stats.route if request_stats is not None else 'background',
+        _find_crud_caller() or 'unknown',
+        statement,
+        redact_parameters(parameters),
+    )
+    if (
+        not SLOW_QUERY_EXPLAIN_ENABLED
+        or executemany
+        or not statement.lstrip().upper().startswith(EXPLAINABLE_STATEMENTS)
+        or _explained_statements.get(statement) is not None
+        or len(_pending_explains) >= MAX_PENDING_EXPLAINS
+    ):
+        logger.warning(message, *args)
+        return
+
+    _explained_statements.set(statement, True)
+    # Runs on its own connection after this statement has returned, so
+    # the request never waits for the plan; the empty context keeps the
+    # EXPLAIN out of the request's statement count.
+    task = asyncio.get_running_loop().create_task(
+        _explain_and_log(AsyncEngine(conn.engine), statement, message, args),
+        context=contextvars.Context(),
+    )
+    _pending_explains.add(task)
+    task.add_done_callback(_pending_explains.discard)
+
+
+def _handle_error(context: Any) -> None:
+    if context.connection is not None:
+        start_times = context.connection.info.get('slow_query_start_times')
+        if start_times:
+            start_times.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    # Ahead of the other listeners: SQLAlchemy does not clean up after a
+    # listener that raises, so nothing may have started timing yet.
+    event.listen(
+        engine, 'before_cursor_execute', _before_cursor_execute, insert=True
+    )
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
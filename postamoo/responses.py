@@ -0,0 +1,79 @@
+from typing import Optional, Mapping
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Scope, Receive, Send
+
+from postamoo.config import MEDIA_CHUNK_SIZE
+
+
+def etag_matches(header_value: Optional[str], etag: str) -> bool:
+    if header_value is None:
+        return False
+    return any(
+        candidate.strip() in ('*', etag, f'W/{etag}')
+        for candidate in header_value.split(',')
+    )
+
+
+class FileRangeResponse(Response):
+    chunk_size = MEDIA_CHUNK_SIZE
+
+    def __init__(
+        self,
+        path: str,
+        offset: int,
+        length: int,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ) -> None:
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers['content-length'] = str(length)
+
+    async def __call__(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        await send(
+            {
+                'type': 'http.response.start',
+                'status': self.status_code,
+                'headers': self.raw_headers,
+            }
+        )
+        if scope['method'].upper() == 'HEAD' or self.length == 0:
+            await send({'type': 'http.response.body', 'body': b''})
+        elif 'http.response.zerocopysend' in scope.get('extensions', {}):
+            # Lets servers that implement the extension hand the range to
+            # sendfile(2) instead of copying it through Python.
+            with open(self.path, 'rb') as file:
+                await send(
+                    {
+                        'type': 'http.response.zerocopysend',
+                        'file': file,
+                        'offset': self.offset,
+                        'count': self.length,
+                    }
+                )
+        else:
+            async with await anyio.open_file(self.path, mode='rb') as file:
+                await file.seek(self.offset)
+                remaining = self.length
+                more_body = True
+                while more_body:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    remaining -= len(chunk)
+                    more_body = remaining > 0 and len(chunk) > 0
+                    await send(
+                        {
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': more_body,
+                        }
+                    )
@@ -0,0 +1,135 @@
+import os
+import stat
+import mimetypes
+from email.utils import formatdate
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import APIRouter, Request, Response, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from postamoo import storage
+from postamoo.responses import FileRangeResponse, etag_matches
+from postamoo.config import (
+    MEDIA_UPLOAD_FOLDER,
+    MEDIA_CACHE_MAX_AGE,
+    MEDIA_ACCEL_REDIRECT_PREFIX,
+)
+
+router = APIRouter()
+
+
+def _resolve_media_path(filename: str) -> str:
+    media_root = os.path.realpath(storage.get_media_path(''))
+    file_path = os.path.realpath(storage.get_media_path(filename))
+    if not file_path.startswith(media_root + os.sep) or file_path.endswith(
+        '.part'
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Media file not found.',
+        )
+    return file_path
+
+
+def _create_etag(filename: str) -> str:
+    # Stored names are either random or the SHA-256 of the content and are
+    # never reused for different bytes, so the name is a strong validator.
+    stem, _ = os.path.splitext(os.path.basename(filename))
+    return f'"{stem}"'
+
+
+def _parse_range(
+    range_header: Optional[str],
+    file_size: int,
+) -> Optional[tuple[int, int]]:
+    if range_header is None or not range_header.startswith('bytes='):
+        return None
+    range_spec = range_header.removeprefix('bytes=').strip()
+    if ',' in range_spec:
+        # Multipart ranges are rare for media, and serving the whole file
+        # instead is allowed.
+        return None
+
+    first_byte, _, last_byte = range_spec.partition('-')
+    try:
+        if first_byte:
+            start = int(first_byte)
+            end = int(last_byte) if last_byte else file_size - 1
+            if last_byte and end < start:
+                return None
+        else:
+            suffix_length = int(last_byte)
+            start = file_size - suffix_length if suffix_length else file_size
+            start, end = max(start, 0), file_size - 1
+    except ValueError:
+        return None
+    if start >= file_size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={'content-range': f'bytes */{file_size}'},
+        )
+    return start, min(end, file_size - 1)
+
+
+@router.api_route(
+    f'/{MEDIA_UPLOAD_FOLDER}/{{filename:path}}',
+    methods=['GET', 'HEAD'],
+    include_in_schema=False,
+)
+async def read_media_file(filename: str, request: Request):
+    file_path = _resolve_media_path(filename)
+    etag = _create_etag(filename)
+    headers = {
+        'etag': etag,
+        'cache-control': f'public, max-age={MEDIA_CACHE_MAX_AGE}, immutable',
+        'accept-ranges': 'bytes',
+    }
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+
+    media_type = mimetypes.guess_type(filename)[0]
+    if MEDIA_ACCEL_REDIRECT_PREFIX:
+        # The fronting proxy serves the bytes (including ranges) itself.
+        headers['x-accel-redirect'] = (
+            f'{MEDIA_ACCEL_REDIRECT_PREFIX}{quote(filename)}'
+        )
+        return Response(headers=headers, media_type=media_type)
+
+    try:
+        stat_result = await run_in_threadpool(os.stat, file_path)
+    except FileNotFoundError:
+        stat_result = None
+    if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Media file not found.',
+        )
+    headers['last-modified'] = formatdate(stat_result.st_mtime, usegmt=True)
+
+    file_size = stat_result.st_size
+    byte_range = None
+    if_range = request.headers.get('if-range')
+    if if_range is None or if_range.strip() == etag:
+        byte_range = _parse_range(request.headers.get('range'), file_size)
+    if byte_range is None:
+        return FileRangeResponse(
+            file_path,
+            offset=0,
+            length=file_size,
+            headers=headers,
+            media_type=media_type,
+        )
+
+    start, end = byte_range
+    headers['content-range'] = f'bytes {start}-{end}/{file_size}'
+    return FileRangeResponse(
+        file_path,
+        offset=start,
+        length=end - start + 1,
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        headers=headers,
+        media_type=media_type,
+    )
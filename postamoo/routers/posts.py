@@ -1,40 +1,174 @@
-from typing import Optional
+import hashlib
+from datetime import datetime
+from typing import Literal, Optional
 
 from fastapi import (
     APIRouter,
+    Request,
     Response,
     Depends,
     Body,
+    Query,
+    Path,
     UploadFile,
     File,
     HTTPException,
     status,
 )
-from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from postamoo import models, schemas, crud
+from postamoo import schemas, crud
+from postamoo.cache import CachedResponse, response_cache
+from postamoo.responses import etag_matches
 from postamoo.dependencies import get_db, get_current_user
+from postamoo.config import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    MAX_COMMENT_PREVIEW_SIZE,
+)
 
 router = APIRouter()
 
+_comment_list_adapter = TypeAdapter(list[schemas.Comment])
+
+
+@router.get('/posts/', response_model=schemas.Page[schemas.Post])
+async def read_posts(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    author_id: Optional[int] = Query(None, ge=1),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
+    expand: Optional[Literal['author']] = Query(None),
+    comments_preview: Optional[int] = Query(
+        None, ge=0, le=MAX_COMMENT_PREVIEW_SIZE
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    posts, next_cursor = await crud.get_posts(
+        db=db,
+        limit=limit,
+        cursor=cursor,
+        author_id=author_id,
+        created_after=created_after,
+        created_before=created_before,
+        expand_author=expand == 'author',
+        comment_preview_size=comments_preview,
+    )
+    return {'items': posts, 'next_cursor': next_cursor}
+
+
+@router.post('/posts/batch/', response_model=schemas.PostBatch)
+async def read_posts_batch(
+    batch: schemas.PostBatchRequest,
+    expand: Optional[Literal['author']] = Query(None),
+    comments_preview: Optional[int] = Query(
+        None, ge=0, le=MAX_COMMENT_PREVIEW_SIZE
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    post_ids = list(dict.fromkeys(batch.ids))
+    db_posts = {
+        db_post.id: db_post
+        for db_post in await crud.get_posts_by_ids(
+            db=db,
+            post_ids=post_ids,
+            expand_author=expand == 'author',
+            comment_preview_size=comments_preview,
+        )
+    }
+    return {
+        'items': [
+            db_posts[post_id] for post_id in post_ids if post_id in db_posts
+        ],
+        'missing_ids': [
+            post_id for post_id in post_ids if post_id not in db_posts
+        ],
+    }
+
+
+@router.get(
+    '/posts/search/', response_model=schemas.Page[schemas.PostSearchResult]
+)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    expand: Optional[Literal['author']] = Query(None),
+    comments_preview: Optional[int] = Query(
+        None, ge=0, le=MAX_COMMENT_PREVIEW_SIZE
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    matches, next_cursor = await crud.search_posts(
+        db=db,
+        query=q,
+        limit=limit,
+        cursor=cursor,
+        expand_author=expand == 'author',
+        comment_preview_size=comments_preview,
+    )
+    return {
+        'items': [
+            {'post': db_post, 'rank': rank, 'snippet': snippet}
+            for db_post, rank, snippet in matches
+        ],
+        'next_cursor': next_cursor,
+    }
 
-@router.get('/posts/', response_model=list[schemas.Post])
-async def read_posts(db: Session = Depends(get_db)):
-    return crud.get_posts(db=db)
+
+def _create_cached_response(body: bytes) -> CachedResponse:
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return CachedResponse(body, f'"{digest}"')
+
+
+def _send_cached_response(
+    request: Request,
+    cached_response: CachedResponse,
+) -> Response:
+    # `no-cache` lets clients keep the body but makes them revalidate,
+    # since comments can change it at any time.
+    headers = {'etag': cached_response.etag, 'cache-control': 'no-cache'}
+    if etag_matches(
+        request.headers.get('if-none-match'), cached_response.etag
+    ):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+    return Response(
+        cached_response.body, media_type='application/json', headers=headers
+    )
 
 
 @router.get('/posts/{post_id}/', response_model=schemas.Post)
 async def read_post(
-    post_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    post_id: int = Path(..., ge=1, le=schemas.MAX_ID),
+    expand: Optional[Literal['author']] = Query(None),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_post = crud.get_post_by_id(db=db, post_id=post_id)
-    if db_post is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail='Post not found.',
+    expand_author = expand == 'author'
+    cache_key = ('post', post_id, expand_author)
+    cached_response = response_cache.get(cache_key)
+    if cached_response is None:
+        generation = response_cache.generation
+        db_post = await crud.get_post_by_id(
+            db=db, post_id=post_id, expand_author=expand_author
+        )
+        if db_post is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Post not found.',
+            )
+        post = schemas.Post.model_validate(db_post)
+        cached_response = _create_cached_response(
+            post.model_dump_json().encode()
         )
-    return db_post
+        # The variant pool invalidates the post once its variants are
+        # ready, so a post still linking its originals is cached too.
+        response_cache.set(cache_key, cached_response, generation)
+    return _send_cached_response(request, cached_response)
 
 
 @router.post('/posts/', response_model=schemas.Post)
@@ -42,8 +176,8 @@ async def create_post(
     title: str = Body(...),
     text_content: Optional[str] = Body(None),
     media_files: list[UploadFile] = File(None),
-    db: Session = Depends(get_db),
-    current_user: models.UserProfile = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserProfile = Depends(get_current_user),
 ):
     try:
         new_post = schemas.PostCreate(
@@ -51,7 +185,7 @@ async def create_post(
             text_content=text_content,
             media_files=media_files,
         )
-        return crud.create_post(
+        return await crud.create_post(
             db=db, post=new_post, author_id=current_user.id
         )
     except ValueError as e:
@@ -63,11 +197,11 @@ async def create_post(
 
 @router.delete('/posts/{post_id}/')
 async def delete_post(
-    post_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.UserProfile = Depends(get_current_user),
+    post_id: int = Path(..., ge=1, le=schemas.MAX_ID),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserProfile = Depends(get_current_user),
 ):
-    crud.delete_post_by_id(
+    await crud.delete_post_by_id(
         db=db, post_id=post_id, current_user_id=current_user.id
     )
     return Response(status_code=status.HTTP_204_NO_CONTENT, content=None)
@@ -75,37 +209,80 @@ async def delete_post(
 
 @router.get('/posts/{post_id}/comments/', response_model=list[schemas.Comment])
 async def read_post_comments(
-    post_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    post_id: int = Path(..., ge=1, le=schemas.MAX_ID),
+    expand: Optional[Literal['author']] = Query(None),
+    db: AsyncSession = Depends(get_db),
 ):
-    db_post = crud.get_post_by_id(db=db, post_id=post_id)
-    if db_post is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail='Post not found.'
+    expand_author = expand == 'author'
+    cache_key = ('post_comments', post_id, expand_author)
+    cached_response = response_cache.get(cache_key)
+    if cached_response is None:
+        generation = response_cache.generation
+        comments = await crud.get_post_comments(
+            db=db, post_id=post_id, expand_author=expand_author
+        )
+        if comments is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Post not found.',
+            )
+        cached_response = _create_cached_response(
+            _comment_list_adapter.dump_json(
+                _comment_list_adapter.validate_python(comments)
+            )
         )
-    return crud.get_post_comments(db=db, post_id=post_id)
+        response_cache.set(cache_key, cached_response, generation)
+    return _send_cached_response(request, cached_response)
 
 
 @router.post('/posts/{post_id}/comments/', response_model=schemas.Comment)
 async def create_comment(
-    post_id: int,
     comment: schemas.CommentCreate,
-    db: Session = Depends(get_db),
-    current_user: models.UserProfile = Depends(get_current_user),
+    post_id: int = Path(..., ge=1, le=schemas.MAX_ID),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserProfile = Depends(get_current_user),
 ):
-    return crud.create_comment(
+    return await crud.create_comment(
         db=db, comment=comment, post_id=post_id, author_id=current_user.id
     )
 
 
+@router.post('/comments/batch/', response_model=schemas.CommentBatch)
+async def create_comments_batch(
+    batch: schemas.CommentBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserProfile = Depends(get_current_user),
+):
+    db_comments = await crud.create_comments(
+        db=db, comments=batch.comments, author_id=current_user.id
+    )
+    return {
+        'results': [
+            {
+                'post_id': comment.post_id,
+                'status_code': status.HTTP_201_CREATED,
+                'comment': db_comment,
+            }
+            if db_comment is not None
+            else {
+                'post_id': comment.post_id,
+                'status_code': status.HTTP_404_NOT_FOUND,
+                'detail': 'Post not found.',
+            }
+            for comment, db_comment in zip(batch.comments, db_comments)
+        ]
+    }
+
+
 @router.delete('/posts/{post_id}/comments/{comment_id}/')
 async def delete_comment(
-    post_id: int,
-    comment_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.UserProfile = Depends(get_current_user),
+    post_id: int = Path(..., ge=1, le=schemas.MAX_ID),
+    comment_id: int = Path(..., ge=1, le=schemas.MAX_ID),
+    db: AsyncSession = Depends(get_db),
+    current_user: schemas.UserProfile = Depends(get_current_user),
 ):
-    crud.delete_comment_by_id(
+    await crud.delete_comment_by_id(
         db=db, comment_id=comment_id, current_user_id=current_user.id
     )
     return Response(status_code=status.HTTP_204_NO_CONTENT, content=None)
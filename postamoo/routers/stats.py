@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Response, HTTPException, status
+
+from postamoo import metrics
+from postamoo.cache import (
+    access_token_cache,
+    user_profile_cache,
+    response_cache,
+)
+
+router = APIRouter()
+
+
+@router.get('/stats/caches/')
+async def read_cache_stats():
+    return {
+        'access_tokens': access_token_cache.stats(),
+        'user_profiles': user_profile_cache.stats(),
+        'responses': response_cache.stats(),
+    }
+
+
+@router.get('/metrics')
+async def read_metrics():
+    if not metrics.metrics_enabled():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Metrics require the `metrics` extra.',
+        )
+    return Response(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
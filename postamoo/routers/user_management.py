@@ -6,16 +6,24 @@ from fastapi import (
     Response,
     Depends,
     Body,
+    Cookie,
     UploadFile,
     File,
     HTTPException,
     status,
 )
-from sqlalchemy.orm import Session
-
-from postamoo import models, schemas, crud
-from postamoo.dependencies import get_db, get_httpx_client, get_current_user
-from postamoo.config import DEBUG_ENABLED, AUTH_PROVIDER_URL
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import schemas, crud
+from postamoo.dependencies import (
+    get_db,
+    get_httpx_client,
+    get_current_user,
+    hash_access_token,
+    request_auth_provider,
+)
+from postamoo.cache import access_token_cache
+from postamoo.config import DEBUG_ENABLED
 
 router = APIRouter()
 
@@ -25,12 +33,14 @@ async def login(
     response: Response,
     username: str = Body(...),
     password: str = Body(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     client: httpx.AsyncClient = Depends(get_httpx_client),
 ):
     try:
-        login_response = await client.post(
-            f'{AUTH_PROVIDER_URL}/login/',
+        login_response = await request_auth_provider(
+            client,
+            'POST',
+            '/login/',
             json={'username': username, 'password': password},
         )
         login_response.raise_for_status()
@@ -43,7 +53,7 @@ async def login(
             detail=error_detail,
         )
 
-    db_user_profile = crud.get_user_profile_by_username(
+    db_user_profile = await crud.get_user_profile_by_username(
         db=db, username=login_response_content['username']
     )
     if db_user_profile is None:
@@ -67,10 +77,18 @@ async def login(
 @router.post('/logout/')
 async def logout(
     response: Response,
+    access_token: Optional[str] = Cookie(None),
     client: httpx.AsyncClient = Depends(get_httpx_client),
 ):
+    cookies = None
+    if access_token is not None:
+        access_token_cache.delete(hash_access_token(access_token))
+        cookies = {'access_token': access_token}
+
     try:
-        logout_response = await client.post(f'{AUTH_PROVIDER_URL}/logout/')
+        logout_response = await request_auth_provider(
+            client, 'POST', '/logout/', cookies=cookies
+        )
         logout_response.raise_for_status()
     except httpx.HTTPError as e:
         error_response = e.response.json()
@@ -91,7 +109,7 @@ async def create_user(
     bio: Optional[str] = Body(None),
     location: Optional[str] = Body(None),
     avatar: UploadFile = File(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     client: httpx.AsyncClient = Depends(get_httpx_client),
 ):
     files = {}
@@ -101,8 +119,10 @@ async def create_user(
         files['avatar'] = (avatar.filename, file_content, avatar.content_type)
 
     try:
-        create_response = await client.post(
-            f'{AUTH_PROVIDER_URL}/users/',
+        create_response = await request_auth_provider(
+            client,
+            'POST',
+            '/users/',
             data={
                 'username': username,
                 'email': email,
@@ -131,7 +151,9 @@ async def create_user(
             bio=create_response_content['profile']['bio'],
             location=create_response_content['profile']['location'],
         )
-        return crud.create_user_profile(db=db, user_profile=new_user_profile)
+        return await crud.create_user_profile(
+            db=db, user_profile=new_user_profile
+        )
     except KeyError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -144,8 +166,8 @@ async def create_user(
         )
 
 
-@router.get('/users/me/')
+@router.get('/users/me/', response_model=schemas.UserProfile)
 async def read_users_me(
-    current_user: models.UserProfile = Depends(get_current_user),
+    current_user: schemas.UserProfile = Depends(get_current_user),
 ):
     return current_user
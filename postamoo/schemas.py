@@ -1,8 +1,16 @@
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Generic, TypeVar
 
 from fastapi import UploadFile
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, computed_field
+
+from postamoo import storage
+from postamoo.config import MAX_BATCH_SIZE
+
+T = TypeVar('T')
+
+# Ids are int4 columns; larger values fail in the driver, not the query.
+MAX_ID = 2**31 - 1
 
 
 class UserProfileBase(BaseModel):
@@ -18,11 +26,20 @@ class UserProfileCreate(UserProfileBase):
 
 
 class UserProfile(UserProfileBase):
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
     id: int = Field(..., ge=1)
 
 
+class AuthorSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    display_name: str
+    avatar: Optional[str] = None
+
+
 class PostBase(BaseModel):
     title: str = Field(..., min_length=3, max_length=100)
     text_content: Optional[str] = None
@@ -33,14 +50,57 @@ class PostCreate(PostBase):
     media_files: Optional[list[UploadFile]] = None
 
 
+class Media(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    filename: str
+    mime_type: str
+    byte_size: int = Field(..., ge=0)
+    width: Optional[int] = None
+    height: Optional[int] = None
+    duration: Optional[float] = None
+    placeholder: Optional[str] = None
+    variants_ready: bool = False
+
+
 class Post(PostBase):
     model_config = ConfigDict(from_attributes=True)
 
     id: int = Field(..., ge=1)
     created_at: datetime
     author_id: int = Field(..., ge=1)
+    author: Optional[AuthorSummary] = None
+    comment_count: int = Field(0, ge=0)
+    media: list[Media] = []
     comments: Optional[list['Comment']] = None
 
+    @computed_field
+    @property
+    def media_variants(self) -> list[dict[str, str]]:
+        # Posts from before media rows existed have no variants at all.
+        ready_filenames = {
+            media.filename for media in self.media if media.variants_ready
+        }
+        return [
+            storage.get_media_variants(filename, filename in ready_filenames)
+            for filename in self.media_files or []
+        ]
+
+
+class PostBatchRequest(BaseModel):
+    ids: list[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class PostBatch(BaseModel):
+    items: list[Post]
+    missing_ids: list[int]
+
+
+class PostSearchResult(BaseModel):
+    post: Post
+    rank: float
+    snippet: str
+
 
 class CommentBase(BaseModel):
     content: str = Field(..., min_length=1, max_length=500)
@@ -57,3 +117,30 @@ class Comment(CommentBase):
     created_at: datetime
     post_id: int = Field(..., ge=1)
     author_id: int = Field(..., ge=1)
+    author: Optional[AuthorSummary] = None
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[str] = None
+
+
+class CommentBatchItem(CommentCreate):
+    post_id: int
+
+
+class CommentBatchRequest(BaseModel):
+    comments: list[CommentBatchItem] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_SIZE
+    )
+
+
+class CommentBatchResult(BaseModel):
+    post_id: int
+    status_code: int
+    comment: Optional[Comment] = None
+    detail: Optional[str] = None
+
+
+class CommentBatch(BaseModel):
+    results: list[CommentBatchResult]
@@ -0,0 +1,52 @@
+from fastapi import HTTPException, status
+
+from postamoo.config import (
+    AUTH_TOKEN_ALGORITHMS,
+    AUTH_TOKEN_KEY,
+    AUTH_TOKEN_AUDIENCE,
+    AUTH_TOKEN_ISSUER,
+    AUTH_TOKEN_USERNAME_CLAIM,
+    AUTH_TOKEN_LEEWAY,
+)
+
+try:
+    import jwt
+except ImportError:
+    jwt = None
+
+
+def check_local_auth_config() -> None:
+    if jwt is None:
+        raise RuntimeError(
+            'Local token verification requires PyJWT; '
+            'install the `jwt` extra.'
+        )
+    elif not AUTH_TOKEN_KEY:
+        raise RuntimeError(
+            'Local token verification requires AUTH_TOKEN_KEY '
+            'or AUTH_TOKEN_KEY_FILE to be set.'
+        )
+
+
+def verify_access_token(access_token: str) -> str:
+    try:
+        payload = jwt.decode(
+            access_token,
+            AUTH_TOKEN_KEY,
+            algorithms=AUTH_TOKEN_ALGORITHMS.split(','),
+            audience=AUTH_TOKEN_AUDIENCE,
+            issuer=AUTH_TOKEN_ISSUER,
+            leeway=AUTH_TOKEN_LEEWAY,
+            options={'require': ['exp', AUTH_TOKEN_USERNAME_CLAIM]},
+        )
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Access token has expired.',
+        )
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Invalid access token.',
+        )
+    return payload[AUTH_TOKEN_USERNAME_CLAIM]
@@ -0,0 +1,466 @@
+import os
+import re
+import time
+import mimetypes
+import uuid
+import hashlib
+import asyncio
+import contextlib
+from collections import Counter
+from typing import Any, Iterator, Optional, BinaryIO, NamedTuple
+
+from fastapi import UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from sqlalchemy import func, select, update, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, metadata
+from postamoo.config import (
+    MEDIA_STORAGE_PATH,
+    MEDIA_STORAGE_MODE,
+    MAX_IMAGE_SIZE,
+    MAX_VIDEO_SIZE,
+    MAX_IMAGE_PIXELS,
+    MEDIA_CHUNK_SIZE,
+    MEDIA_SWEEP_BATCH_SIZE,
+    MEDIA_ORPHAN_GRACE_PERIOD,
+)
+
+
+IMAGE_MIME_TYPES = [
+    'image/jpeg',
+    'image/png',
+    'image/gif',
+    'image/bmp',
+]
+VIDEO_MIME_TYPES = [
+    'video/mp4',
+    'video/mpeg',
+    'video/quicktime',
+    'video/x-msvideo',
+]
+MEDIA_VARIANT_EXTENSIONS = {
+    'thumbnail': '.jpg',
+    'medium': '.jpg',
+    'webp': '.webp',
+}
+
+# Names the storage itself hands out, with an optional extension; the
+# sweep leaves anything else in the directory alone.
+_STORED_STEM_PATTERN = r'([0-9a-f]{15}|[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64})'
+_STORED_FILENAME_PATTERN = re.compile(_STORED_STEM_PATTERN + r'(\.\w+)?')
+_PARTIAL_FILENAME_PATTERN = re.compile(r'[0-9a-f]{32}\.part')
+
+
+class MediaFile(NamedTuple):
+    filename: str
+    mime_type: str
+    byte_size: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+    duration: Optional[float] = None
+    placeholder: Optional[str] = None
+
+
+class _StagedMediaFile(NamedTuple):
+    filename: str
+    temp_file_path: str
+    mime_type: str
+    byte_size: int
+    metadata: dict[str, Any]
+
+
+def _create_unique_filename(filename: str) -> str:
+    unique_id = uuid.uuid4().hex[:15]
+    _, file_extension = os.path.splitext(filename)
+    return f'{unique_id}{file_extension}'
+
+
+def _create_content_filename(digest: str, filename: str) -> str:
+    _, file_extension = os.path.splitext(filename)
+    # Two levels of 256 shards keep every directory small even with
+    # millions of blobs.
+    return f'{digest[:2]}/{digest[2:4]}/{digest}{file_extension.lower()}'
+
+
+def _is_content_addressed(filename: str) -> bool:
+    return '/' in filename
+
+
+def get_media_path(filename: str) -> str:
+    return os.path.join(MEDIA_STORAGE_PATH, filename)
+
+
+def is_image(filename: str) -> bool:
+    mime_type, _ = mimetypes.guess_type(filename)
+    return mime_type in IMAGE_MIME_TYPES
+
+
+def get_variant_filename(filename: str, variant: str) -> str:
+    stem, _ = os.path.splitext(filename)
+    return f'{stem}.{variant}{MEDIA_VARIANT_EXTENSIONS[variant]}'
+
+
+def get_media_variants(filename: str, is_ready: bool) -> dict[str, str]:
+    media_variants = {'original': filename}
+    for variant in MEDIA_VARIANT_EXTENSIONS:
+        # Until the background pipeline has written the variants, clients
+        # get the original in their place.
+        media_variants[variant] = (
+            get_variant_filename(filename, variant) if is_ready else filename
+        )
+    return media_variants
+
+
+def _get_media_size_limit(filename: str) -> tuple[str, str, int]:
+    mime_type, _ = mimetypes.guess_type(filename)
+    if mime_type in IMAGE_MIME_TYPES:
+        return mime_type, 'Image', MAX_IMAGE_SIZE
+    elif mime_type in VIDEO_MIME_TYPES:
+        return mime_type, 'Video', MAX_VIDEO_SIZE
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail='Unsupported media type.',
+    )
+
+
+def _media_file_too_large(media_kind: str, max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=(
+            f'{media_kind} file size exceeds the limit of '
+            f'{max_size / (1024 * 1024)} MB.'
+        ),
+    )
+
+
+def _stage_media_file(
+    source: BinaryIO,
+    filename: str,
+    mime_type: str,
+    media_kind: str,
+    max_size: int,
+    content_addressed: bool,
+) -> _StagedMediaFile:
+    temp_file_path = get_media_path(f'{uuid.uuid4().hex}.part')
+    digest = hashlib.sha256() if content_addressed else None
+    try:
+        with open(temp_file_path, 'wb') as f:
+            written_size = 0
+            while chunk := source.read(MEDIA_CHUNK_SIZE):
+                written_size += len(chunk)
+                if written_size > max_size:
+                    raise _media_file_too_large(media_kind, max_size)
+                if digest is not None:
+                    digest.update(chunk)
+                f.write(chunk)
+        # Probed once here, while the file is still local to this worker,
+        # so reads never have to open the media.
+        media_metadata = metadata.extract_media_metadata(
+            temp_file_path, mime_type
+        )
+    except metadata.ImageTooLargeError:
+        os.remove(temp_file_path)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f'Image dimensions exceed the limit of {MAX_IMAGE_PIXELS} '
+                'pixels.'
+            ),
+        )
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_file_path)
+        raise
+
+    if digest is not None:
+        filename = _create_content_filename(digest.hexdigest(), filename)
+    else:
+        filename = _create_unique_filename(filename)
+    return _StagedMediaFile(
+        filename, temp_file_path, mime_type, written_size, media_metadata
+    )
+
+
+def _publish_media_files(staged_files: list[_StagedMediaFile]) -> None:
+    for staged_file in staged_files:
+        file_path = get_media_path(staged_file.filename)
+        if os.path.exists(file_path):
+            # The same content is already stored, so the copy is redundant.
+            os.remove(staged_file.temp_file_path)
+        else:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            os.replace(staged_file.temp_file_path, file_path)
+
+
+def _discard_media_files(staged_files: list[_StagedMediaFile]) -> None:
+    for staged_file in staged_files:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(staged_file.temp_file_path)
+
+
+def remove_media_files(filenames: list[str]) -> None:
+    for filename in filenames:
+        file_paths = [get_media_path(filename)]
+        if is_image(filename):
+            file_paths.extend(
+                get_media_path(get_variant_filename(filename, variant))
+                for variant in MEDIA_VARIANT_EXTENSIONS
+            )
+        for file_path in file_paths:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(file_path)
+
+
+def abandon_media_files(filenames: list[str]) -> None:
+    # Content-addressed blobs may be shared with other posts, so only files
+    # owned by a single upload are removed; stray blobs are left for a sweep.
+    remove_media_files(
+        [
+            filename
+            for filename in filenames
+            if not _is_content_addressed(filename)
+        ]
+    )
+
+
+async def _receive_media_file(
+    file: UploadFile,
+    content_addressed: bool,
+) -> _StagedMediaFile:
+    mime_type, media_kind, max_size = _get_media_size_limit(file.filename)
+    if file.size is not None and file.size > max_size:
+        raise _media_file_too_large(media_kind, max_size)
+
+    # The whole chunked copy runs on a worker thread, so a large video
+    # never blocks the event loop.
+    return await run_in_threadpool(
+        _stage_media_file,
+        file.file,
+        file.filename,
+        mime_type,
+        media_kind,
+        max_size,
+        content_addressed,
+    )
+
+
+async def _lock_media_blob(db: AsyncSession, filename: str) -> None:
+    # Serializes reference count changes and file publishing/unlinking for
+    # one blob until the surrounding transaction ends.
+    await db.execute(
+        select(func.pg_advisory_xact_lock(func.hashtext(filename)))
+    )
+
+
+async def save_media_files(
+    db: AsyncSession,
+    files: list[UploadFile],
+) -> list[MediaFile]:
+    content_addressed = MEDIA_STORAGE_MODE == 'content'
+    results = await asyncio.gather(
+        *(_receive_media_file(file, content_addressed) for file in files),
+        return_exceptions=True,
+    )
+    staged_files = [
+        result for result in results if not isinstance(result, BaseException)
+    ]
+    for result in results:
+        if isinstance(result, BaseException):
+            await run_in_threadpool(_discard_media_files, staged_files)
+            raise result
+
+    ref_counts = Counter(staged_file.filename for staged_file in staged_files)
+    try:
+        if content_addressed and ref_counts:
+            for filename in sorted(ref_counts):
+                await _lock_media_blob(db, filename)
+            insert_stmt = insert(models.MediaBlob).values(
+                [
+                    {'filename': filename, 'ref_count': ref_count}
+                    for filename, ref_count in ref_counts.items()
+                ]
+            )
+            await db.execute(
+                insert_stmt.on_conflict_do_update(
+                    index_elements=[models.MediaBlob.filename],
+                    set_={
+                        'ref_count': models.MediaBlob.ref_count
+                        + insert_stmt.excluded.ref_count
+                    },
+                )
+            )
+        await run_in_threadpool(_publish_media_files, staged_files)
+    except BaseException:
+        await run_in_threadpool(_discard_media_files, staged_files)
+        raise
+    return [
+        MediaFile(
+            filename=staged_file.filename,
+            mime_type=staged_file.mime_type,
+            byte_size=staged_file.byte_size,
+            **staged_file.metadata,
+        )
+        for staged_file in staged_files
+    ]
+
+
+async def release_media_files(
+    db: AsyncSession,
+    filenames: Optional[list[str]],
+) -> list[str]:
+    ref_counts = Counter(
+        filename
+        for filename in filenames or []
+        if _is_content_addressed(filename)
+    )
+    # Files owned by a single upload are freed right away, blobs only once
+    # their last reference is gone.
+    freed_filenames = [
+        filename
+        for filename in dict.fromkeys(filenames or [])
+        if filename not in ref_counts
+    ]
+    for filename in sorted(ref_counts):
+        await _lock_media_blob(db, filename)
+        ref_count = await db.scalar(
+            update(models.MediaBlob)
+            .where(models.MediaBlob.filename == filename)
+            .values(
+                ref_count=models.MediaBlob.ref_count - ref_counts[filename]
+            )
+            .returning(models.MediaBlob.ref_count)
+        )
+        if ref_count is not None and ref_count <= 0:
+            await db.execute(
+                delete(models.MediaBlob).where(
+                    models.MediaBlob.filename == filename
+                )
+            )
+            freed_filenames.append(filename)
+    return freed_filenames
+
+
+async def _find_unreferenced_media_files(
+    db: AsyncSession,
+    filenames: list[str],
+) -> list[str]:
+    if not filenames:
+        return []
+    content_filenames = sorted(
+        filename for filename in filenames if _is_content_addressed(filename)
+    )
+    # Held until the caller commits, so an upload of the same content
+    # cannot start referencing a blob between the check and the unlink.
+    for filename in content_filenames:
+        await _lock_media_blob(db, filename)
+    referenced_filenames = set(
+        await db.scalars(
+            select(func.unnest(models.Post.media_files)).filter(
+                models.Post.media_files.overlap(filenames)
+            )
+        )
+    )
+    if content_filenames:
+        referenced_filenames.update(
+            await db.scalars(
+                select(models.MediaBlob.filename).filter(
+                    models.MediaBlob.filename.in_(content_filenames)
+                )
+            )
+        )
+    return [
+        filename
+        for filename in filenames
+        if filename not in referenced_filenames
+    ]
+
+
+async def remove_unreferenced_media_files(
+    db: AsyncSession,
+    filenames: list[str],
+) -> list[str]:
+    unreferenced_filenames = await _find_unreferenced_media_files(
+        db, filenames
+    )
+    await run_in_threadpool(remove_media_files, unreferenced_filenames)
+    return unreferenced_filenames
+
+
+def _iter_sweep_batches(
+    cutoff: float,
+    batch_size: int,
+) -> Iterator[list[tuple[str, bool]]]:
+    variant_suffixes = tuple(
+        f'.{variant}{extension}'
+        for variant, extension in MEDIA_VARIANT_EXTENSIONS.items()
+    )
+    batch = []
+    for dir_path, _, names in os.walk(MEDIA_STORAGE_PATH):
+        original_stems = {
+            os.path.splitext(name)[0]
+            for name in names
+            if not name.endswith(variant_suffixes + ('.part',))
+        }
+        for name in names:
+            file_path = os.path.join(dir_path, name)
+            try:
+                if os.stat(file_path).st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            filename = os.path.relpath(file_path, MEDIA_STORAGE_PATH)
+            filename = filename.replace(os.sep, '/')
+            variant_suffix = next(
+                (
+                    suffix
+                    for suffix in variant_suffixes
+                    if name.endswith(suffix)
+                ),
+                None,
+            )
+            if _PARTIAL_FILENAME_PATTERN.fullmatch(filename):
+                # Left behind by an upload that died mid-transfer.
+                batch.append((filename, False))
+            elif variant_suffix is not None:
+                # Variants go with their original, unless it is gone.
+                if (
+                    _STORED_FILENAME_PATTERN.fullmatch(
+                        filename[: -len(variant_suffix)]
+                    )
+                    and name[: -len(variant_suffix)] not in original_stems
+                ):
+                    batch.append((filename, False))
+            elif _STORED_FILENAME_PATTERN.fullmatch(filename):
+                batch.append((filename, True))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+async def sweep_orphaned_media(
+    db: AsyncSession,
+    grace_period: int = MEDIA_ORPHAN_GRACE_PERIOD,
+    batch_size: int = MEDIA_SWEEP_BATCH_SIZE,
+) -> int:
+    # The grace period keeps files of uploads whose post is not committed
+    # yet out of reach.
+    cutoff = time.time() - grace_period
+    removed_count = 0
+    async for batch in iterate_in_threadpool(
+        _iter_sweep_batches(cutoff, batch_size)
+    ):
+        removed_filenames = await remove_unreferenced_media_files(
+            db, [filename for filename, is_original in batch if is_original]
+        )
+        stray_filenames = [
+            filename for filename, is_original in batch if not is_original
+        ]
+        await run_in_threadpool(remove_media_files, stray_filenames)
+        # Committing per batch releases the blob locks as the sweep goes.
+        await db.commit()
+        removed_count += len(removed_filenames) + len(stray_filenames)
+    return removed_count
@@ -1,99 +1,151 @@
 import os
+import pathlib
 from urllib.parse import urlparse
-from typing import Optional, Any, Iterator
+from typing import Any, AsyncIterator, Iterator
 
+import httpx
 import pytest
-from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, event
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
-from postamoo import models, schemas, crud
+from postamoo import models, schemas, crud, storage, metrics, querylog
 from postamoo.main import app
-from postamoo.database import Base
+from postamoo.cache import (
+    access_token_cache,
+    user_profile_cache,
+    response_cache,
+)
+from postamoo.database import Base, create_async_url
 from postamoo.dependencies import get_db
 from postamoo.config import TEST_DATABASE_URL
 
-engine = create_engine(TEST_DATABASE_URL)
-TestingSessionLocal = sessionmaker(
-    bind=engine, autocommit=False, autoflush=False
+engine = create_async_engine(
+    create_async_url(TEST_DATABASE_URL), poolclass=NullPool
 )
+metrics.instrument_engine(engine.sync_engine)
+querylog.instrument_engine(engine.sync_engine)
 
-Base.metadata.create_all(bind=engine)
 
+@pytest.fixture(scope='session')
+def anyio_backend() -> str:
+    return 'asyncio'
 
-@pytest.fixture(scope='function')
-def test_db_session() -> Iterator[Session]:
-    connection = engine.connect()
-    transaction = connection.begin()
-    session = Session(bind=connection)
 
-    nested = connection.begin_nested()
+@pytest.fixture(scope='function', autouse=True)
+def clear_caches() -> None:
+    access_token_cache.clear()
+    user_profile_cache.clear()
+    response_cache.clear()
 
-    @event.listens_for(session, 'after_transaction_end')
-    def reset_transaction(
-        session: Session,
-        transaction: Optional[Any],
-    ) -> None:
-        nonlocal nested
-        if not nested.is_active:
-            nested = connection.begin_nested()
 
-    yield session
+@pytest.fixture(scope='function', autouse=True)
+def enforce_query_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(querylog, 'QUERY_BUDGET_ENFORCED', True)
 
-    session.close()
-    transaction.rollback()
-    connection.close()
+
+@pytest.fixture(scope='function')
+async def test_db_session() -> AsyncIterator[AsyncSession]:
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        # Commits inside the code under test only release a savepoint, so
+        # everything is rolled back with the outer transaction.
+        session = AsyncSession(
+            bind=connection,
+            autoflush=False,
+            expire_on_commit=False,
+            join_transaction_mode='create_savepoint',
+        )
+
+        yield session
+
+        await session.close()
+        await transaction.rollback()
 
 
 @pytest.fixture(scope='function')
-def test_client(test_db_session: Session) -> Iterator[TestClient]:
-    def override_get_db() -> Iterator[Session]:
-        try:
-            yield test_db_session
-        finally:
-            test_db_session.close()
+async def test_client(
+    test_db_session: AsyncSession,
+) -> AsyncIterator[httpx.AsyncClient]:
+    async def override_get_db() -> AsyncIterator[AsyncSession]:
+        yield test_db_session
 
     app.dependency_overrides[get_db] = override_get_db
 
-    with TestClient(app) as test_client:
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url='http://testserver',
+    ) as test_client:
         yield test_client
 
+    app.dependency_overrides.clear()
+
 
 @pytest.fixture(scope='function')
-def create_test_user(test_db_session: Session) -> models.UserProfile:
+def media_storage_path(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> pathlib.Path:
+    monkeypatch.setattr(storage, 'MEDIA_STORAGE_PATH', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture(scope='function')
+def query_counter() -> Iterator[list[str]]:
+    statements = []
+
+    def count_query(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', count_query)
+    yield statements
+    event.remove(engine.sync_engine, 'before_cursor_execute', count_query)
+
+
+@pytest.fixture(scope='function')
+async def create_test_user(
+    test_db_session: AsyncSession,
+) -> models.UserProfile:
     user_profile_data = schemas.UserProfileCreate(
         username='johndoe',
         display_name='John Doe',
     )
-    return crud.create_user_profile(
+    return await crud.create_user_profile(
         db=test_db_session, user_profile=user_profile_data
     )
 
 
 @pytest.fixture(scope='function')
-def create_test_post(
-    test_db_session: Session,
+async def create_test_post(
+    test_db_session: AsyncSession,
     create_test_user: models.UserProfile,
 ) -> models.Post:
     post_data = schemas.PostCreate(
         title='Test Post',
         text_content='This is a test post.',
     )
-    return crud.create_post(
+    return await crud.create_post(
         db=test_db_session, post=post_data, author_id=create_test_user.id
     )
 
 
 @pytest.fixture(scope='function')
-def create_test_comment(
-    test_db_session: Session,
+async def create_test_comment(
+    test_db_session: AsyncSession,
     create_test_user: models.UserProfile,
     create_test_post: models.Post,
 ) -> models.Comment:
     comment_data = schemas.CommentCreate(
         content='This is a test comment.',
     )
-    return crud.create_comment(
+    return await crud.create_comment(
         db=test_db_session,
         comment=comment_data,
         post_id=create_test_post.id,
@@ -102,10 +154,15 @@ def create_test_comment(
 
 
 @pytest.fixture(scope='session', autouse=True)
-def teardown_test_database() -> Iterator[None]:
+async def setup_test_database(anyio_backend: str) -> AsyncIterator[None]:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
     yield
 
-    Base.metadata.drop_all(bind=engine)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
 
     parsed_url = urlparse(TEST_DATABASE_URL)
     if parsed_url.scheme in ('sqlite',):
@@ -0,0 +1,101 @@
+import pathlib
+import random
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, crud
+from postamoo.main import app
+from postamoo.dependencies import get_httpx_client
+from postamoo.benchmarks import runner
+from postamoo.benchmarks.auth_stub import create_auth_stub
+from postamoo.benchmarks.seed import BENCHMARK_PASSWORD, seed_data
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_login_through_auth_stub(
+    test_client: httpx.AsyncClient,
+    create_test_user: models.UserProfile,
+) -> None:
+    auth_stub = create_auth_stub()
+    auth_stub.state.passwords['johndoe'] = BENCHMARK_PASSWORD
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=auth_stub)
+    ) as auth_client:
+        app.dependency_overrides[get_httpx_client] = lambda: auth_client
+        response = await test_client.post(
+            '/login/', json={'username': 'johndoe', 'password': 'wrong'}
+        )
+        assert response.status_code == 401
+
+        response = await test_client.post(
+            '/login/',
+            json={'username': 'johndoe', 'password': BENCHMARK_PASSWORD},
+        )
+        assert response.status_code == 200
+        response = await test_client.get('/users/me/')
+        assert response.status_code == 200
+        assert response.json()['id'] == create_test_user.id
+
+
+async def test_seed_data(
+    test_db_session: AsyncSession,
+    media_storage_path: pathlib.Path,
+) -> None:
+    seed_result = await seed_data(
+        test_db_session,
+        user_count=2,
+        post_count=3,
+        comments_per_post=2,
+        media_per_post=2,
+    )
+    assert seed_result.usernames == ['bench_user_0', 'bench_user_1']
+    assert len(seed_result.post_ids) == 3
+    for model, count in (
+        (models.UserProfile, 2),
+        (models.Post, 3),
+        (models.Comment, 6),
+        (models.Media, 6),
+    ):
+        assert (
+            await test_db_session.scalar(
+                select(func.count()).select_from(model)
+            )
+            == count
+        )
+    assert await crud.reconcile_comment_counts(test_db_session) == 0
+    assert (media_storage_path / 'bench-2-1.png').exists()
+
+
+async def test_run_scenario_and_compare() -> None:
+    async def fake_scenario(
+        client: httpx.AsyncClient,
+        seed_result: runner.SeedResult,
+        rng: random.Random,
+    ) -> httpx.Response:
+        return httpx.Response(404 if rng.random() < 0.5 else 200)
+
+    result = await runner.run_scenario(
+        fake_scenario, None, None, request_count=20, concurrency=4
+    )
+    assert result.requests == 20
+    assert 0 < result.errors < 20
+    assert 0 <= result.p50 <= result.p95 <= result.p99
+
+    baseline = {'results': {'fake': {'rps': result.rps, 'p95': result.p95}}}
+    assert runner.compare_results({'fake': result}, baseline, 0.1) == []
+    slower_result = result._replace(rps=result.rps / 2, p95=result.p95 * 2)
+    assert (
+        len(runner.compare_results({'fake': slower_result}, baseline, 0.1))
+        == 2
+    )
+
+
+def test_percentile() -> None:
+    values = [float(value) for value in range(1, 101)]
+    assert runner.percentile(values, 0.5) == 50
+    assert runner.percentile(values, 0.99) == 99
+    assert runner.percentile([], 0.5) == 0
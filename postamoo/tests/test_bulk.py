@@ -0,0 +1,93 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, schemas, crud, bulk
+
+pytestmark = pytest.mark.anyio
+
+
+def test_open_records(tmp_path: Path) -> None:
+    csv_path = tmp_path / 'posts.csv'
+    csv_path.write_text('id,title\n1,"Hello, world"\n2,\n')
+    ndjson_path = tmp_path / 'posts.ndjson.gz'
+    with gzip.open(ndjson_path, 'wt') as f:
+        f.write('{"id": 1, "title": "Hello"}\n\n{"id": 2}\n')
+
+    assert list(bulk.open_records(str(csv_path))) == [
+        {'id': '1', 'title': 'Hello, world'},
+        {'id': '2', 'title': ''},
+    ]
+    assert list(bulk.open_records(str(ndjson_path))) == [
+        {'id': 1, 'title': 'Hello'},
+        {'id': 2},
+    ]
+    with pytest.raises(ValueError):
+        list(bulk.open_records(str(tmp_path / 'posts.xml')))
+
+
+async def test_copy_rows(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    tmp_path: Path,
+) -> None:
+    csv_path = tmp_path / 'posts.csv'
+    csv_path.write_text(
+        'title,text_content,media_files,author_id,created_at\n'
+        f'First,,"[""a.png""]",{create_test_user.id},2024-01-01T10:00:00\n'
+        f'Second,Some text,,{create_test_user.id},2024-01-02T10:00:00\n'
+    )
+    copied_count = await bulk.copy_rows(
+        test_db_session, 'posts', bulk.open_records(str(csv_path))
+    )
+
+    assert copied_count == 2
+    db_posts = (
+        await test_db_session.scalars(
+            select(models.Post).order_by(models.Post.created_at)
+        )
+    ).all()
+    assert [db_post.title for db_post in db_posts] == ['First', 'Second']
+    assert db_posts[0].text_content is None
+    assert db_posts[0].media_files == ['a.png']
+    assert db_posts[0].created_at.tzinfo is not None
+    assert db_posts[1].media_files is None
+    assert all(db_post.comment_count == 0 for db_post in db_posts)
+
+
+async def test_copy_rows_rejects_unknown_columns(
+    test_db_session: AsyncSession,
+    tmp_path: Path,
+) -> None:
+    ndjson_path = tmp_path / 'posts.ndjson'
+    ndjson_path.write_text(json.dumps({'title': 'Hi', 'likes': 3}) + '\n')
+
+    with pytest.raises(ValueError, match='likes'):
+        await bulk.copy_rows(
+            test_db_session, 'posts', bulk.open_records(str(ndjson_path))
+        )
+
+
+async def test_reset_sequence(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+) -> None:
+    first_id = await bulk.get_max_id(test_db_session, 'user_profiles') + 100
+    await bulk.copy_rows(
+        test_db_session,
+        'user_profiles',
+        iter([{'id': first_id, 'username': 'imported', 'display_name': 'Im'}]),
+    )
+    await bulk.reset_sequence(test_db_session, 'user_profiles')
+
+    db_user_profile = await crud.create_user_profile(
+        db=test_db_session,
+        user_profile=schemas.UserProfileCreate(
+            username='regular', display_name='Regular'
+        ),
+    )
+    assert db_user_profile.id == first_id + 1
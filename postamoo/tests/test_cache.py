@@ -0,0 +1,73 @@
+import pytest
+
+from postamoo.cache import TTLCache, CachedResponse, ResponseCache
+
+
+def test_ttl_cache_expires_entries(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 1000.0
+    monkeypatch.setattr('postamoo.cache.time.monotonic', lambda: now)
+    cache = TTLCache(maxsize=10, ttl=30)
+    cache.set('key', 'value')
+    assert cache.get('key') == 'value'
+
+    now += 31
+    assert cache.get('key') is None
+    assert len(cache) == 0
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used() -> None:
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_ttl_cache_delete() -> None:
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.set('a', 1)
+    cache.delete('a')
+    cache.delete('missing')
+    assert cache.get('a') is None
+
+
+def test_response_cache_is_bounded_by_bytes() -> None:
+    cache = ResponseCache(maxbytes=10, ttl=30)
+    generation = cache.generation
+    cache.set('a', CachedResponse(b'1234', '"a"'), generation)
+    cache.set('b', CachedResponse(b'1234', '"b"'), generation)
+    cache.get('a')
+    cache.set('c', CachedResponse(b'1234', '"c"'), generation)
+    assert cache.get('b') is None
+    assert cache.get('a').etag == '"a"'
+    assert cache.stats()['bytes'] == 8
+
+    cache.set('d', CachedResponse(b'x' * 11, '"d"'), generation)
+    assert cache.get('d') is None
+
+
+def test_response_cache_drops_values_read_before_invalidation() -> None:
+    cache = ResponseCache(maxbytes=10, ttl=30)
+    generation = cache.generation
+    cache.delete('a')
+    cache.set('a', CachedResponse(b'stale', '"a"'), generation)
+    assert cache.get('a') is None
+
+
+def test_response_cache_expires_entries(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    now = 1000.0
+    monkeypatch.setattr('postamoo.cache.time.monotonic', lambda: now)
+    cache = ResponseCache(maxbytes=10, ttl=30)
+    cache.set('a', CachedResponse(b'1234', '"a"'), cache.generation)
+    assert cache.get('a').etag == '"a"'
+
+    now += 31
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == 0
@@ -1,16 +1,24 @@
-from sqlalchemy.orm import Session
+import io
+import pathlib
 
-from postamoo import models, schemas, crud
+import pytest
+from fastapi import UploadFile, HTTPException
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from postamoo import models, schemas, crud, storage
 
-def test_create_user_profile(test_db_session: Session) -> None:
+pytestmark = pytest.mark.anyio
+
+
+async def test_create_user_profile(test_db_session: AsyncSession) -> None:
     user_profile_data = schemas.UserProfileCreate(
         username='michaelbrown',
         display_name='Michael Brown',
         bio='Writer and journalist. Interests include history, politics, and sports.',
         location='Boston, MA',
     )
-    created_user_profile = crud.create_user_profile(
+    created_user_profile = await crud.create_user_profile(
         db=test_db_session,
         user_profile=user_profile_data,
     )
@@ -23,11 +31,11 @@ def test_create_user_profile(test_db_session: Session) -> None:
     assert created_user_profile.location == 'Boston, MA'
 
 
-def test_get_user_profile_by_id(
-    test_db_session: Session,
+async def test_get_user_profile_by_id(
+    test_db_session: AsyncSession,
     create_test_user: models.UserProfile,
 ) -> None:
-    retrieved_user_profile = crud.get_user_profile_by_id(
+    retrieved_user_profile = await crud.get_user_profile_by_id(
         db=test_db_session, user_id=create_test_user.id
     )
     assert retrieved_user_profile.id == create_test_user.id
@@ -37,15 +45,15 @@ def test_get_user_profile_by_id(
     assert retrieved_user_profile.location == create_test_user.location
 
 
-def test_create_post(
-    test_db_session: Session,
+async def test_create_post(
+    test_db_session: AsyncSession,
     create_test_user: models.UserProfile,
 ) -> None:
     post_data = schemas.PostCreate(
         title='Test Post',
         text_content='This is a test post.',
     )
-    created_post = crud.create_post(
+    created_post = await crud.create_post(
         db=test_db_session, post=post_data, author_id=create_test_user.id
     )
     assert created_post.title == 'Test Post'
@@ -53,11 +61,60 @@ def test_create_post(
     assert created_post.author_id == create_test_user.id
 
 
-def test_get_posts(
-    test_db_session: Session,
+async def test_create_post_with_media_files(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    media_storage_path: pathlib.Path,
+) -> None:
+    post_data = schemas.PostCreate(
+        title='Test Post',
+        media_files=[
+            UploadFile(file=io.BytesIO(b'first'), filename='first.png'),
+            UploadFile(file=io.BytesIO(b'second'), filename='second.jpg'),
+        ],
+    )
+    created_post = await crud.create_post(
+        db=test_db_session, post=post_data, author_id=create_test_user.id
+    )
+    assert len(created_post.media_files) == 2
+    assert sorted(path.name for path in media_storage_path.iterdir()) == (
+        sorted(created_post.media_files)
+    )
+    assert (media_storage_path / created_post.media_files[1]).read_bytes() == (
+        b'second'
+    )
+
+
+async def test_create_post_rejects_oversized_media_file(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    media_storage_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(storage, 'MAX_IMAGE_SIZE', 8)
+    monkeypatch.setattr(storage, 'MEDIA_CHUNK_SIZE', 4)
+    post_data = schemas.PostCreate(
+        title='Test Post',
+        media_files=[
+            UploadFile(file=io.BytesIO(b'small'), filename='small.png'),
+            UploadFile(file=io.BytesIO(b'x' * 64), filename='large.png'),
+        ],
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        await crud.create_post(
+            db=test_db_session,
+            post=post_data,
+            author_id=create_test_user.id,
+        )
+    assert exc_info.value.status_code == 413
+    assert list(media_storage_path.iterdir()) == []
+
+
+async def test_get_posts(
+    test_db_session: AsyncSession,
     create_test_post: models.Post,
 ) -> None:
-    posts = crud.get_posts(db=test_db_session)
+    posts, _ = await crud.get_posts(db=test_db_session)
     assert len(posts) >= 1
     found_post = next(
         (post for post in posts if post.id == create_test_post.id), None
@@ -68,11 +125,42 @@ def test_get_posts(
     assert found_post.author_id == create_test_post.author_id
 
 
-def test_get_post_by_id(
-    test_db_session: Session,
+async def test_get_posts_paginates_by_cursor(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+) -> None:
+    created_posts = [
+        await crud.create_post(
+            db=test_db_session,
+            post=schemas.PostCreate(title=f'Test Post {i}'),
+            author_id=create_test_user.id,
+        )
+        for i in range(3)
+    ]
+    first_page, next_cursor = await crud.get_posts(
+        db=test_db_session, limit=2, author_id=create_test_user.id
+    )
+    assert [post.id for post in first_page] == [
+        created_posts[2].id,
+        created_posts[1].id,
+    ]
+    assert next_cursor is not None
+
+    second_page, next_cursor = await crud.get_posts(
+        db=test_db_session,
+        limit=2,
+        cursor=next_cursor,
+        author_id=create_test_user.id,
+    )
+    assert [post.id for post in second_page] == [created_posts[0].id]
+    assert next_cursor is None
+
+
+async def test_get_post_by_id(
+    test_db_session: AsyncSession,
     create_test_post: models.Post,
 ) -> None:
-    retrieved_post = crud.get_post_by_id(
+    retrieved_post = await crud.get_post_by_id(
         db=test_db_session, post_id=create_test_post.id
     )
     assert retrieved_post.id == create_test_post.id
@@ -81,31 +169,31 @@ def test_get_post_by_id(
     assert retrieved_post.author_id == create_test_post.author_id
 
 
-def test_delete_post_by_id(
-    test_db_session: Session,
+async def test_delete_post_by_id(
+    test_db_session: AsyncSession,
     create_test_user: models.UserProfile,
     create_test_post: models.Post,
 ) -> None:
-    crud.delete_post_by_id(
+    await crud.delete_post_by_id(
         db=test_db_session,
         post_id=create_test_post.id,
         current_user_id=create_test_user.id,
     )
-    deleted_post = crud.get_post_by_id(
+    deleted_post = await crud.get_post_by_id(
         db=test_db_session, post_id=create_test_post.id
     )
     assert deleted_post is None
 
 
-def test_create_comment(
-    test_db_session: Session,
+async def test_create_comment(
+    test_db_session: AsyncSession,
     create_test_user: models.UserProfile,
     create_test_post: models.Post,
 ) -> None:
     comment_data = schemas.CommentCreate(
         content='This is a test comment.',
     )
-    created_comment = crud.create_comment(
+    created_comment = await crud.create_comment(
         db=test_db_session,
         comment=comment_data,
         post_id=create_test_post.id,
@@ -116,12 +204,12 @@ def test_create_comment(
     assert created_comment.author_id == create_test_user.id
 
 
-def test_get_post_comments(
-    test_db_session: Session,
+async def test_get_post_comments(
+    test_db_session: AsyncSession,
     create_test_post: models.Post,
     create_test_comment: models.Comment,
 ) -> None:
-    comments = crud.get_post_comments(
+    comments = await crud.get_post_comments(
         db=test_db_session, post_id=create_test_post.id
     )
     assert len(comments) >= 1
@@ -139,11 +227,11 @@ def test_get_post_comments(
     assert found_comment.author_id == create_test_comment.author_id
 
 
-def test_get_comment_by_id(
-    test_db_session: Session,
+async def test_get_comment_by_id(
+    test_db_session: AsyncSession,
     create_test_comment: models.Comment,
 ) -> None:
-    retrieved_comment = crud.get_comment_by_id(
+    retrieved_comment = await crud.get_comment_by_id(
         db=test_db_session, comment_id=create_test_comment.id
     )
     assert retrieved_comment.id == create_test_comment.id
@@ -152,17 +240,138 @@ def test_get_comment_by_id(
     assert retrieved_comment.author_id == create_test_comment.author_id
 
 
-def test_delete_comment_by_id(
-    test_db_session: Session,
+async def test_delete_comment_by_id(
+    test_db_session: AsyncSession,
     create_test_user: models.UserProfile,
     create_test_comment: models.Comment,
 ) -> None:
-    crud.delete_comment_by_id(
+    await crud.delete_comment_by_id(
         db=test_db_session,
         comment_id=create_test_comment.id,
         current_user_id=create_test_user.id,
     )
-    deleted_comment = crud.get_comment_by_id(
+    deleted_comment = await crud.get_comment_by_id(
         db=test_db_session, comment_id=create_test_comment.id
     )
     assert deleted_comment is None
+
+
+async def test_comment_count_follows_comments(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    create_test_post: models.Post,
+    create_test_comment: models.Comment,
+) -> None:
+    db_post = await crud.get_post_by_id(
+        db=test_db_session, post_id=create_test_post.id
+    )
+    assert db_post.comment_count == 1
+
+    await crud.delete_comment_by_id(
+        db=test_db_session,
+        comment_id=create_test_comment.id,
+        current_user_id=create_test_user.id,
+    )
+    test_db_session.expunge_all()
+    db_post = await crud.get_post_by_id(
+        db=test_db_session, post_id=create_test_post.id
+    )
+    assert db_post.comment_count == 0
+
+
+async def test_comment_count_survives_double_delete(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    create_test_post: models.Post,
+    create_test_comment: models.Comment,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    post_id = create_test_post.id
+    await crud.delete_comment_by_id(
+        db=test_db_session,
+        comment_id=create_test_comment.id,
+        current_user_id=create_test_user.id,
+    )
+
+    # The second request read the comment before the first one deleted it.
+    async def get_stale_comment(*args, **kwargs) -> models.Comment:
+        return create_test_comment
+
+    monkeypatch.setattr(crud, 'get_comment_by_id', get_stale_comment)
+    with pytest.raises(HTTPException) as exc_info:
+        await crud.delete_comment_by_id(
+            db=test_db_session,
+            comment_id=create_test_comment.id,
+            current_user_id=create_test_user.id,
+        )
+    assert exc_info.value.status_code == 404
+
+    test_db_session.expunge_all()
+    db_post = await crud.get_post_by_id(db=test_db_session, post_id=post_id)
+    assert db_post.comment_count == 0
+
+
+async def test_create_comment_on_missing_post(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+) -> None:
+    with pytest.raises(HTTPException) as exc_info:
+        await crud.create_comment(
+            db=test_db_session,
+            comment=schemas.CommentCreate(content='Hello'),
+            post_id=1_000_000,
+            author_id=create_test_user.id,
+        )
+    assert exc_info.value.status_code == 404
+
+
+async def test_reconcile_comment_counts(
+    test_db_session: AsyncSession,
+    create_test_post: models.Post,
+    create_test_comment: models.Comment,
+) -> None:
+    await test_db_session.execute(
+        update(models.Post)
+        .where(models.Post.id == create_test_post.id)
+        .values(comment_count=7)
+    )
+    assert await crud.reconcile_comment_counts(test_db_session, 2) == 1
+    assert await crud.reconcile_comment_counts(test_db_session, 2) == 0
+
+    test_db_session.expunge_all()
+    db_post = await crud.get_post_by_id(
+        db=test_db_session, post_id=create_test_post.id
+    )
+    assert db_post.comment_count == 1
+
+
+async def test_create_comments(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    create_test_post: models.Post,
+    query_counter: list[str],
+) -> None:
+    comments = [
+        schemas.CommentBatchItem(post_id=create_test_post.id, content='One'),
+        schemas.CommentBatchItem(post_id=1_000_000, content='Lost'),
+        schemas.CommentBatchItem(post_id=create_test_post.id, content='Two'),
+    ]
+    db_comments = await crud.create_comments(
+        db=test_db_session, comments=comments, author_id=create_test_user.id
+    )
+    assert [
+        db_comment.content if db_comment is not None else None
+        for db_comment in db_comments
+    ] == ['One', None, 'Two']
+    assert [
+        statement.split()[0]
+        for statement in query_counter
+        if not statement.startswith(('SAVEPOINT', 'RELEASE'))
+    ] == ['UPDATE', 'INSERT', 'SELECT']
+
+    test_db_session.expunge_all()
+    db_post = await crud.get_post_by_id(
+        db=test_db_session, post_id=create_test_post.id
+    )
+    assert db_post.comment_count == 2
+    assert [comment.content for comment in db_post.comments] == ['One', 'Two']
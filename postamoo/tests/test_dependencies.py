@@ -0,0 +1,83 @@
+import httpx
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, schemas, crud
+from postamoo.cache import access_token_cache, user_profile_cache
+from postamoo.dependencies import (
+    create_httpx_client,
+    get_current_user,
+    hash_access_token,
+)
+
+
+def test_shared_httpx_client_does_not_persist_cookies() -> None:
+    client = create_httpx_client()
+    response = httpx.Response(
+        200,
+        headers={'set-cookie': 'access_token=secret; Path=/'},
+        request=httpx.Request('POST', 'http://localhost:5734/login/'),
+    )
+    client.cookies.extract_cookies(response)
+    assert 'access_token' not in client.cookies
+
+
+@pytest.mark.anyio
+async def test_get_current_user_caches_token_validation(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+) -> None:
+    hits = access_token_cache.hits
+    requests = []
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json={'username': 'johndoe'})
+
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handle_request)
+    ) as client:
+        for _ in range(3):
+            current_user = await get_current_user(
+                access_token='token', db=test_db_session, client=client
+            )
+            assert current_user.id == create_test_user.id
+
+    assert len(requests) == 1
+    assert access_token_cache.hits == hits + 2
+
+
+@pytest.mark.anyio
+async def test_get_current_user_caches_user_profile(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    query_counter: list[str],
+) -> None:
+    access_token_cache.set(hash_access_token('token'), 'johndoe')
+    current_user = await get_current_user(
+        access_token='token', db=test_db_session, client=None
+    )
+    query_counter.clear()
+    cached_user = await get_current_user(
+        access_token='token', db=test_db_session, client=None
+    )
+    assert cached_user == current_user
+    assert cached_user.id == create_test_user.id
+    assert query_counter == []
+    with pytest.raises(ValidationError):
+        cached_user.display_name = 'Jane Doe'
+
+
+@pytest.mark.anyio
+async def test_create_user_profile_invalidates_cached_profile(
+    test_db_session: AsyncSession,
+) -> None:
+    user_profile_cache.set('janedoe', 'stale')
+    await crud.create_user_profile(
+        db=test_db_session,
+        user_profile=schemas.UserProfileCreate(
+            username='janedoe', display_name='Jane Doe'
+        ),
+    )
+    assert user_profile_cache.get('janedoe') is None
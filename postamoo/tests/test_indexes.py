@@ -0,0 +1,184 @@
+import json
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Iterator
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, crud
+from postamoo.tests.conftest import engine
+
+pytestmark = pytest.mark.anyio
+
+PRIMARY_KEY_INDEXES = {
+    'user_profiles': {'user_profiles_pkey', 'ix_user_profiles_id'},
+    'posts': {'posts_pkey', 'ix_posts_id'},
+    'comments': {'comments_pkey', 'ix_comments_id'},
+}
+
+CRUD_QUERIES: list[
+    tuple[
+        str,
+        Callable[[AsyncSession, models.Comment], Awaitable[Any]],
+        list[set[str]],
+    ]
+] = [
+    (
+        'get_user_profile_by_id',
+        lambda db, comment: crud.get_user_profile_by_id(db, comment.author_id),
+        [PRIMARY_KEY_INDEXES['user_profiles']],
+    ),
+    (
+        'get_user_profile_by_username',
+        lambda db, comment: crud.get_user_profile_by_username(db, 'johndoe'),
+        [{'user_profiles_username_key'}],
+    ),
+    (
+        'get_posts',
+        lambda db, comment: crud.get_posts(db),
+        [
+            {'ix_posts_created_at_id'},
+            {'ix_comments_post_id_created_at'},
+            {'ix_media_post_id_position'},
+        ],
+    ),
+    (
+        'get_posts_by_cursor',
+        lambda db, comment: crud.get_posts(
+            db,
+            cursor=crud._encode_cursor(datetime.now(timezone.utc), 1),
+            created_after=datetime(2000, 1, 1, tzinfo=timezone.utc),
+        ),
+        [
+            {'ix_posts_created_at_id'},
+            {'ix_comments_post_id_created_at'},
+            {'ix_media_post_id_position'},
+        ],
+    ),
+    (
+        'get_posts_with_comment_preview',
+        lambda db, comment: crud.get_posts(db, comment_preview_size=3),
+        [
+            {'ix_posts_created_at_id'},
+            {'ix_media_post_id_position'},
+            {'ix_comments_post_id_created_at'},
+        ],
+    ),
+    (
+        'get_posts_by_author',
+        lambda db, comment: crud.get_posts(db, author_id=comment.author_id),
+        [
+            {'ix_posts_author_id_created_at'},
+            {'ix_comments_post_id_created_at'},
+            {'ix_media_post_id_position'},
+        ],
+    ),
+    (
+        'search_posts',
+        lambda db, comment: crud.search_posts(db, 'test'),
+        [
+            {'ix_posts_search_vector'},
+            {'ix_comments_post_id_created_at'},
+            {'ix_media_post_id_position'},
+        ],
+    ),
+    (
+        'get_post_by_id',
+        lambda db, comment: crud.get_post_by_id(db, comment.post_id),
+        [
+            PRIMARY_KEY_INDEXES['posts'],
+            {'ix_comments_post_id_created_at'},
+            {'ix_media_post_id_position'},
+        ],
+    ),
+    (
+        'get_posts_by_ids',
+        lambda db, comment: crud.get_posts_by_ids(db, [comment.post_id, 2]),
+        [
+            PRIMARY_KEY_INDEXES['posts'],
+            {'ix_comments_post_id_created_at'},
+            {'ix_media_post_id_position'},
+        ],
+    ),
+    (
+        'get_post_comments',
+        lambda db, comment: crud.get_post_comments(db, comment.post_id),
+        [{'ix_comments_post_id_created_at'}],
+    ),
+    (
+        'get_comment_by_id',
+        lambda db, comment: crud.get_comment_by_id(db, comment.id),
+        [PRIMARY_KEY_INDEXES['comments']],
+    ),
+]
+
+
+@pytest.fixture(scope='function')
+def captured_queries() -> Iterator[list[tuple[str, Any]]]:
+    queries = []
+
+    def capture_query(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        queries.append((statement, parameters))
+
+    event.listen(engine.sync_engine, 'before_cursor_execute', capture_query)
+    yield queries
+    event.remove(engine.sync_engine, 'before_cursor_execute', capture_query)
+
+
+def _walk_plan(plan: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    yield plan
+    for subplan in plan.get('Plans', []):
+        yield from _walk_plan(subplan)
+
+
+async def _explain(
+    db: AsyncSession,
+    statement: str,
+    parameters: Any,
+) -> list[dict[str, Any]]:
+    connection = await db.connection()
+    result = await connection.exec_driver_sql(
+        f'EXPLAIN (FORMAT JSON) {statement}', parameters
+    )
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return list(_walk_plan(plan[0]['Plan']))
+
+
+@pytest.mark.parametrize(
+    'crud_call,expected_indexes',
+    [(crud_call, indexes) for _, crud_call, indexes in CRUD_QUERIES],
+    ids=[name for name, _, _ in CRUD_QUERIES],
+)
+async def test_crud_query_uses_index(
+    test_db_session: AsyncSession,
+    create_test_comment: models.Comment,
+    captured_queries: list[tuple[str, Any]],
+    crud_call: Callable[[AsyncSession, models.Comment], Awaitable[Any]],
+    expected_indexes: list[set[str]],
+) -> None:
+    # The test tables are tiny, so sequential scans are priced out to make
+    # the planner show which index it would pick on a real table.
+    connection = await test_db_session.connection()
+    await connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    captured_queries.clear()
+    await crud_call(test_db_session, create_test_comment)
+
+    queries = list(captured_queries)
+    assert len(queries) == len(expected_indexes)
+    used_indexes = set()
+    for statement, parameters in queries:
+        nodes = await _explain(test_db_session, statement, parameters)
+        assert all(node['Node Type'] != 'Seq Scan' for node in nodes), nodes
+        used_indexes.update(node.get('Index Name') for node in nodes)
+    for index_names in expected_indexes:
+        assert used_indexes & index_names, used_indexes
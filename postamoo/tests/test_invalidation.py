@@ -0,0 +1,77 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import invalidation
+from postamoo.cache import CachedResponse, response_cache
+from postamoo.config import TEST_DATABASE_URL
+from postamoo.tests.conftest import engine
+
+pytestmark = pytest.mark.anyio
+
+
+def _cache_post_response(post_id: int) -> tuple:
+    key = ('post', post_id, False)
+    response_cache.set(
+        key, CachedResponse(b'{}', f'"{post_id}"'), response_cache.generation
+    )
+    return key
+
+
+async def _wait_until_missing(key: tuple, timeout: float = 5) -> None:
+    async with asyncio.timeout(timeout):
+        while response_cache.get(key) is not None:
+            await asyncio.sleep(0.05)
+
+
+@pytest.fixture(scope='function')
+async def invalidation_listener() -> AsyncIterator[None]:
+    stop_event = asyncio.Event()
+    # The listener clears the cache once it is subscribed.
+    subscribed_key = _cache_post_response(0)
+    listener_task = asyncio.create_task(
+        invalidation.listen_for_invalidations(stop_event, TEST_DATABASE_URL)
+    )
+    await _wait_until_missing(subscribed_key)
+
+    yield
+
+    stop_event.set()
+    with contextlib.suppress(asyncio.CancelledError):
+        await asyncio.wait_for(listener_task, 5)
+
+
+async def test_notified_post_responses_are_invalidated(
+    invalidation_listener: None,
+) -> None:
+    notified_key = _cache_post_response(7)
+    other_key = _cache_post_response(8)
+
+    async with AsyncSession(engine) as db:
+        await invalidation.notify_post_responses(db, 7)
+        await db.commit()
+
+    await _wait_until_missing(notified_key)
+    assert response_cache.get(other_key) is not None
+
+
+async def test_rolled_back_changes_are_not_notified(
+    invalidation_listener: None,
+) -> None:
+    rolled_back_key = _cache_post_response(7)
+    committed_key = _cache_post_response(8)
+
+    async with AsyncSession(engine) as db:
+        await invalidation.notify_post_responses(db, 7)
+        await db.rollback()
+    async with AsyncSession(engine) as db:
+        await invalidation.notify_post_responses(db, 8)
+        await db.commit()
+
+    # Notifications arrive in commit order, so the rolled back one would
+    # have been handled by now.
+    await _wait_until_missing(committed_key)
+    assert response_cache.get(rolled_back_key) is not None
@@ -0,0 +1,123 @@
+from typing import Any
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, crud, jobs
+
+pytestmark = pytest.mark.anyio
+
+
+async def _get_jobs(db: AsyncSession) -> list[models.Job]:
+    db.expunge_all()
+    result = await db.scalars(select(models.Job).order_by(models.Job.id))
+    return list(result.all())
+
+
+async def test_run_pending_jobs(
+    test_db_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    payloads = []
+
+    async def record_payload(db: AsyncSession, payload: Any) -> None:
+        payloads.append(payload)
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'record', record_payload)
+    for number in range(3):
+        await jobs.enqueue_job(test_db_session, 'record', {'n': number})
+    await test_db_session.commit()
+
+    assert await jobs.run_pending_jobs(test_db_session, batch_size=2) == 2
+    assert await jobs.run_pending_jobs(test_db_session, batch_size=2) == 1
+    assert await jobs.run_pending_jobs(test_db_session) == 0
+    assert payloads == [{'n': 0}, {'n': 1}, {'n': 2}]
+    assert await _get_jobs(test_db_session) == []
+
+
+async def test_failed_job_is_retried_then_dead_lettered(
+    test_db_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def fail(db: AsyncSession, payload: Any) -> None:
+        raise RuntimeError('boom')
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'fail', fail)
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 2)
+    monkeypatch.setattr(jobs, 'JOB_RETRY_DELAY', 0)
+    await jobs.enqueue_job(test_db_session, 'fail', {})
+    await test_db_session.commit()
+
+    assert await jobs.run_pending_jobs(test_db_session) == 1
+    [db_job] = await _get_jobs(test_db_session)
+    assert db_job.attempts == 1
+    assert db_job.run_at is not None
+    assert db_job.last_error == "RuntimeError('boom')"
+
+    assert await jobs.run_pending_jobs(test_db_session) == 1
+    [db_job] = await _get_jobs(test_db_session)
+    assert db_job.attempts == 2
+    assert db_job.run_at is None
+    assert await jobs.run_pending_jobs(test_db_session) == 0
+
+
+async def test_recurring_job_is_scheduled_once(
+    test_db_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def sweep(db: AsyncSession, payload: Any) -> None:
+        pass
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'sweep_orphaned_media', sweep)
+    await jobs.schedule_recurring_jobs(test_db_session)
+    await jobs.schedule_recurring_jobs(test_db_session)
+    [db_job] = await _get_jobs(test_db_session)
+    assert db_job.kind == 'sweep_orphaned_media'
+
+    assert await jobs.run_pending_jobs(test_db_session) == 1
+    [next_db_job] = await _get_jobs(test_db_session)
+    assert next_db_job.id != db_job.id
+    assert next_db_job.run_at > db_job.run_at
+
+
+async def test_dead_lettered_recurring_job_is_rescheduled(
+    test_db_session: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def fail(db: AsyncSession, payload: Any) -> None:
+        raise RuntimeError('boom')
+
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'sweep_orphaned_media', fail)
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 1)
+    await jobs.schedule_recurring_jobs(test_db_session)
+
+    assert await jobs.run_pending_jobs(test_db_session) == 1
+    dead_db_job, next_db_job = await _get_jobs(test_db_session)
+    assert dead_db_job.run_at is None
+    assert next_db_job.kind == 'sweep_orphaned_media'
+    assert next_db_job.run_at is not None
+
+    await test_db_session.delete(next_db_job)
+    await test_db_session.commit()
+    await jobs.schedule_recurring_jobs(test_db_session)
+    dead_db_job, next_db_job = await _get_jobs(test_db_session)
+    assert dead_db_job.run_at is None
+    assert next_db_job.run_at is not None
+
+
+async def test_delete_post_removes_comments(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    create_test_comment: models.Comment,
+) -> None:
+    await crud.delete_post_by_id(
+        db=test_db_session,
+        post_id=create_test_comment.post_id,
+        current_user_id=create_test_user.id,
+    )
+    test_db_session.expunge_all()
+    assert (
+        await test_db_session.get(models.Comment, create_test_comment.id)
+        is None
+    )
@@ -0,0 +1,100 @@
+import pathlib
+
+import httpx
+import pytest
+
+from postamoo.routers import media
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(scope='function')
+def media_file(media_storage_path: pathlib.Path) -> str:
+    (media_storage_path / 'ab' / 'cd').mkdir(parents=True)
+    (media_storage_path / 'ab' / 'cd' / 'abcdef.mp4').write_bytes(
+        bytes(range(100))
+    )
+    return 'ab/cd/abcdef.mp4'
+
+
+async def test_read_media_file(
+    test_client: httpx.AsyncClient,
+    media_file: str,
+) -> None:
+    response = await test_client.get(f'/media/{media_file}')
+    assert response.status_code == 200
+    assert response.content == bytes(range(100))
+    assert response.headers['content-type'] == 'video/mp4'
+    assert response.headers['etag'] == '"abcdef"'
+    assert 'immutable' in response.headers['cache-control']
+    assert response.headers['accept-ranges'] == 'bytes'
+
+
+async def test_read_media_file_not_modified(
+    test_client: httpx.AsyncClient,
+    media_file: str,
+) -> None:
+    response = await test_client.get(
+        f'/media/{media_file}', headers={'if-none-match': '"abcdef"'}
+    )
+    assert response.status_code == 304
+    assert response.content == b''
+
+
+@pytest.mark.parametrize(
+    'range_header, expected_range, expected_content',
+    [
+        ('bytes=10-19', 'bytes 10-19/100', bytes(range(10, 20))),
+        ('bytes=95-', 'bytes 95-99/100', bytes(range(95, 100))),
+        ('bytes=-3', 'bytes 97-99/100', bytes(range(97, 100))),
+        ('bytes=90-500', 'bytes 90-99/100', bytes(range(90, 100))),
+    ],
+)
+async def test_read_media_file_range(
+    test_client: httpx.AsyncClient,
+    media_file: str,
+    range_header: str,
+    expected_range: str,
+    expected_content: bytes,
+) -> None:
+    response = await test_client.get(
+        f'/media/{media_file}', headers={'range': range_header}
+    )
+    assert response.status_code == 206
+    assert response.headers['content-range'] == expected_range
+    assert response.content == expected_content
+
+
+async def test_read_media_file_unsatisfiable_range(
+    test_client: httpx.AsyncClient,
+    media_file: str,
+) -> None:
+    response = await test_client.get(
+        f'/media/{media_file}', headers={'range': 'bytes=100-'}
+    )
+    assert response.status_code == 416
+    assert response.headers['content-range'] == 'bytes */100'
+
+
+async def test_read_media_file_rejects_path_traversal(
+    test_client: httpx.AsyncClient,
+    media_file: str,
+) -> None:
+    response = await test_client.get('/media/..%2F..%2Fconfig.py')
+    assert response.status_code == 404
+
+
+async def test_read_media_file_accel_redirect(
+    test_client: httpx.AsyncClient,
+    media_file: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(
+        media, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/'
+    )
+    response = await test_client.get(f'/media/{media_file}')
+    assert response.status_code == 200
+    assert response.headers['x-accel-redirect'] == (
+        f'/protected-media/{media_file}'
+    )
+    assert response.content == b''
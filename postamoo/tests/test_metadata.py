@@ -0,0 +1,122 @@
+import io
+import pathlib
+
+import pytest
+from fastapi import UploadFile, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, schemas, crud, metadata
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def test_encode_blurhash() -> None:
+    blurhash = metadata.encode_blurhash(Image.new('RGB', (64, 48), 'red'))
+    assert len(blurhash) == 28
+    # The size flag for 4x3 components, then the average colour.
+    assert blurhash[0] == 'L'
+    assert blurhash[2:6] == metadata._encode_base83(0xFF0000, 4)
+
+
+def test_extract_media_metadata_of_unreadable_image(
+    tmp_path: pathlib.Path,
+) -> None:
+    file_path = tmp_path / 'broken.png'
+    file_path.write_bytes(b'not an image')
+    assert metadata.extract_media_metadata(str(file_path), 'image/png') == {}
+
+
+@pytest.mark.parametrize(
+    'orientation,expected_size', [(1, (4000, 3000)), (6, (3000, 4000))]
+)
+def test_extract_media_metadata_of_jpeg(
+    tmp_path: pathlib.Path,
+    orientation: int,
+    expected_size: tuple[int, int],
+) -> None:
+    file_path = tmp_path / 'photo.jpg'
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    Image.new('RGB', (4000, 3000), 'green').save(file_path, 'JPEG', exif=exif)
+
+    media_metadata = metadata.extract_media_metadata(
+        str(file_path), 'image/jpeg'
+    )
+    assert (media_metadata['width'], media_metadata['height']) == (
+        expected_size
+    )
+    assert len(media_metadata['placeholder']) == 28
+
+
+def test_extract_media_metadata_rejects_large_image(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    file_path = tmp_path / 'large.png'
+    Image.new('RGB', (300, 200), 'blue').save(file_path, 'PNG')
+    monkeypatch.setattr(metadata, 'MAX_IMAGE_PIXELS', 300 * 200 - 1)
+    with pytest.raises(metadata.ImageTooLargeError):
+        metadata.extract_media_metadata(str(file_path), 'image/png')
+
+
+@pytest.mark.anyio
+async def test_create_post_rejects_decompression_bomb(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    media_storage_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    image_content = io.BytesIO()
+    Image.new('RGB', (300, 200), 'blue').save(image_content, 'PNG')
+    # Pillow refuses to open images over twice its own limit.
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    post_data = schemas.PostCreate(
+        title='Test Post',
+        media_files=[
+            UploadFile(
+                file=io.BytesIO(image_content.getvalue()),
+                filename='bomb.png',
+            )
+        ],
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        await crud.create_post(
+            db=test_db_session, post=post_data, author_id=create_test_user.id
+        )
+    assert exc_info.value.status_code == 400
+    assert not any(media_storage_path.iterdir())
+
+
+@pytest.mark.anyio
+async def test_create_post_stores_media_metadata(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    media_storage_path: pathlib.Path,
+) -> None:
+    image_content = io.BytesIO()
+    Image.new('RGB', (300, 200), 'blue').save(image_content, 'PNG')
+    post_data = schemas.PostCreate(
+        title='Test Post',
+        media_files=[
+            UploadFile(
+                file=io.BytesIO(image_content.getvalue()),
+                filename='photo.png',
+            ),
+            UploadFile(file=io.BytesIO(b'0' * 64), filename='clip.mp4'),
+        ],
+    )
+    db_post = await crud.create_post(
+        db=test_db_session, post=post_data, author_id=create_test_user.id
+    )
+
+    test_db_session.expunge_all()
+    db_post = await crud.get_post_by_id(test_db_session, db_post.id)
+    post = schemas.Post.model_validate(db_post)
+    assert [media.filename for media in post.media] == post.media_files
+    assert post.media[0].mime_type == 'image/png'
+    assert post.media[0].byte_size == len(image_content.getvalue())
+    assert (post.media[0].width, post.media[0].height) == (300, 200)
+    assert len(post.media[0].placeholder) == 28
+    assert post.media[1].mime_type == 'video/mp4'
+    assert post.media[1].byte_size == 64
+    assert post.media[1].placeholder is None
@@ -0,0 +1,90 @@
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models
+from postamoo.dependencies import get_current_user
+
+prometheus_client = pytest.importorskip('prometheus_client')
+
+
+def _get_sample(name: str, **labels: str) -> float:
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.mark.anyio
+async def test_requests_are_recorded_per_route(
+    test_client: httpx.AsyncClient,
+    create_test_post: models.Post,
+    query_counter: list[str],
+) -> None:
+    labels = {'method': 'GET', 'route': '/posts/{post_id}/comments/'}
+    request_count = _get_sample(
+        'postamoo_http_request_duration_seconds_count',
+        status_code='200',
+        **labels,
+    )
+    query_count = _get_sample('postamoo_http_request_db_queries_sum', **labels)
+
+    response = await test_client.get(f'/posts/{create_test_post.id}/comments/')
+    assert response.status_code == 200
+    assert _get_sample(
+        'postamoo_http_request_db_queries_sum', **labels
+    ) == query_count + len(query_counter)
+    response = await test_client.get('/posts/1000000/comments/')
+    assert response.status_code == 404
+
+    assert (
+        _get_sample(
+            'postamoo_http_request_duration_seconds_count',
+            status_code='200',
+            **labels,
+        )
+        == request_count + 1
+    )
+    assert (
+        _get_sample(
+            'postamoo_http_request_duration_seconds_count',
+            status_code='404',
+            **labels,
+        )
+        >= 1
+    )
+
+    response = await test_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'] == (
+        prometheus_client.CONTENT_TYPE_LATEST
+    )
+    assert 'postamoo_db_pool_connections{state="in_use"}' in response.text
+    assert 'postamoo_db_pool_checkout_duration_seconds_count' in (
+        response.text
+    )
+
+
+@pytest.mark.anyio
+async def test_auth_provider_requests_are_timed(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+) -> None:
+    labels = {'method': 'GET', 'path': '/users/me/', 'status_code': '200'}
+    request_count = _get_sample(
+        'postamoo_auth_provider_request_duration_seconds_count', **labels
+    )
+
+    def handle_request(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={'username': 'johndoe'})
+
+    async with httpx.AsyncClient(
+        transport=httpx.MockTransport(handle_request)
+    ) as client:
+        await get_current_user(
+            access_token='token', db=test_db_session, client=client
+        )
+
+    assert (
+        _get_sample(
+            'postamoo_auth_provider_request_duration_seconds_count', **labels
+        )
+        == request_count + 1
+    )
@@ -0,0 +1,377 @@
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, schemas, crud
+from postamoo.main import app
+from postamoo.dependencies import get_current_user
+
+pytestmark = pytest.mark.anyio
+
+
+async def _create_posts_with_comments(
+    db: AsyncSession,
+    author_id: int,
+    count: int,
+) -> None:
+    for i in range(count):
+        db_post = await crud.create_post(
+            db=db,
+            post=schemas.PostCreate(title=f'Test Post {i}'),
+            author_id=author_id,
+        )
+        for j in range(2):
+            await crud.create_comment(
+                db=db,
+                comment=schemas.CommentCreate(content=f'Comment {j}'),
+                post_id=db_post.id,
+                author_id=author_id,
+            )
+
+
+async def test_read_posts_query_count_is_constant(
+    test_client: httpx.AsyncClient,
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    query_counter: list[str],
+) -> None:
+    await _create_posts_with_comments(test_db_session, create_test_user.id, 1)
+    test_db_session.expunge_all()
+    query_counter.clear()
+    response = await test_client.get('/posts/')
+    assert response.status_code == 200
+    queries_for_one_post = len(query_counter)
+
+    await _create_posts_with_comments(test_db_session, create_test_user.id, 9)
+    test_db_session.expunge_all()
+    query_counter.clear()
+    response = await test_client.get('/posts/')
+    assert response.status_code == 200
+    assert len(response.json()['items']) == 10
+    assert all(len(post['comments']) == 2 for post in response.json()['items'])
+    assert len(query_counter) == queries_for_one_post
+
+
+async def test_read_posts_rejects_invalid_cursor(
+    test_client: httpx.AsyncClient,
+) -> None:
+    response = await test_client.get(
+        '/posts/', params={'cursor': 'not-a-cursor'}
+    )
+    assert response.status_code == 400
+    forged_cursor = crud._encode_cursor(datetime.now(timezone.utc), 2**31)
+    response = await test_client.get(
+        '/posts/', params={'cursor': forged_cursor}
+    )
+    assert response.status_code == 400
+
+
+async def test_search_posts(
+    test_client: httpx.AsyncClient,
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+) -> None:
+    for title, text_content in [
+        (
+            'Gardening notes',
+            'Tomatoes need sun & water, 2 < 3 tomatoes.',
+        ),
+        ('Tomatoes', 'A post about tomatoes.'),
+        ('Cooking', 'Nothing relevant here.'),
+    ]:
+        await crud.create_post(
+            db=test_db_session,
+            post=schemas.PostCreate(title=title, text_content=text_content),
+            author_id=create_test_user.id,
+        )
+
+    response = await test_client.get(
+        '/posts/search/', params={'q': 'tomatoes', 'limit': 1}
+    )
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page['items']) == 1
+    # A title hit is weighted above any number of body hits.
+    assert first_page['items'][0]['post']['title'] == 'Tomatoes'
+    assert '<mark>tomatoes</mark>' in first_page['items'][0]['snippet']
+
+    response = await test_client.get(
+        '/posts/search/',
+        params={
+            'q': 'tomatoes',
+            'limit': 1,
+            'cursor': first_page['next_cursor'],
+        },
+    )
+    second_page = response.json()
+    assert [item['post']['title'] for item in second_page['items']] == [
+        'Gardening notes'
+    ]
+    assert second_page['next_cursor'] is None
+    snippet = second_page['items'][0]['snippet']
+    assert 'sun &amp; water, 2 &lt; 3' in snippet
+    assert '<mark>Tomatoes</mark>' in snippet
+
+
+async def test_search_posts_rejects_invalid_cursor(
+    test_client: httpx.AsyncClient,
+) -> None:
+    response = await test_client.get(
+        '/posts/search/', params={'q': 'tomatoes', 'cursor': 'WzEsIDJd'}
+    )
+    assert response.status_code == 200
+    response = await test_client.get(
+        '/posts/search/', params={'q': 'tomatoes', 'cursor': 'bad'}
+    )
+    assert response.status_code == 400
+    response = await test_client.get(
+        '/posts/search/',
+        params={'q': 'tomatoes', 'cursor': crud._encode_search_cursor(1, -1)},
+    )
+    assert response.status_code == 400
+
+
+async def test_read_post_is_cached_with_etag(
+    test_client: httpx.AsyncClient,
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    create_test_post: models.Post,
+    query_counter: list[str],
+) -> None:
+    response = await test_client.get(f'/posts/{create_test_post.id}/')
+    assert response.status_code == 200
+    etag = response.headers['etag']
+    assert response.json()['comment_count'] == 0
+
+    query_counter.clear()
+    response = await test_client.get(
+        f'/posts/{create_test_post.id}/', headers={'if-none-match': etag}
+    )
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+    assert query_counter == []
+
+    await crud.create_comment(
+        db=test_db_session,
+        comment=schemas.CommentCreate(content='Invalidates the post.'),
+        post_id=create_test_post.id,
+        author_id=create_test_user.id,
+    )
+    response = await test_client.get(
+        f'/posts/{create_test_post.id}/', headers={'if-none-match': etag}
+    )
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
+    assert response.json()['comment_count'] == 1
+
+
+async def test_read_post_comments_cache_is_invalidated(
+    test_client: httpx.AsyncClient,
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    create_test_comment: models.Comment,
+    query_counter: list[str],
+) -> None:
+    url = f'/posts/{create_test_comment.post_id}/comments/'
+    response = await test_client.get(url)
+    assert [comment['id'] for comment in response.json()] == [
+        create_test_comment.id
+    ]
+    query_counter.clear()
+    response = await test_client.get(url)
+    assert response.status_code == 200
+    assert query_counter == []
+
+    await crud.delete_comment_by_id(
+        db=test_db_session,
+        comment_id=create_test_comment.id,
+        current_user_id=create_test_user.id,
+    )
+    response = await test_client.get(url)
+    assert response.json() == []
+
+    await crud.delete_post_by_id(
+        db=test_db_session,
+        post_id=create_test_comment.post_id,
+        current_user_id=create_test_user.id,
+    )
+    response = await test_client.get(url)
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('url', ['/posts/99999999999/', '/posts/0/comments/'])
+async def test_read_post_with_out_of_range_id(
+    test_client: httpx.AsyncClient,
+    url: str,
+) -> None:
+    response = await test_client.get(url)
+    assert response.status_code == 422
+
+
+async def test_read_posts_batch(
+    test_client: httpx.AsyncClient,
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    query_counter: list[str],
+) -> None:
+    await _create_posts_with_comments(test_db_session, create_test_user.id, 3)
+    db_posts, _ = await crud.get_posts(test_db_session)
+    post_ids = [db_post.id for db_post in db_posts]
+    test_db_session.expunge_all()
+
+    query_counter.clear()
+    response = await test_client.post(
+        '/posts/batch/',
+        json={
+            'ids': [post_ids[2], 1_000_000, post_ids[0], post_ids[2], 2**31]
+        },
+    )
+    assert response.status_code == 200
+    assert [post['id'] for post in response.json()['items']] == [
+        post_ids[2],
+        post_ids[0],
+    ]
+    assert response.json()['missing_ids'] == [1_000_000, 2**31]
+    # One IN query for the posts plus one per eager loaded collection.
+    assert len(query_counter) == 3
+
+
+async def test_read_posts_batch_is_bounded(
+    test_client: httpx.AsyncClient,
+) -> None:
+    response = await test_client.post(
+        '/posts/batch/', json={'ids': list(range(1, 1000))}
+    )
+    assert response.status_code == 422
+
+
+async def test_create_comments_batch(
+    test_client: httpx.AsyncClient,
+    create_test_user: models.UserProfile,
+    create_test_post: models.Post,
+) -> None:
+    app.dependency_overrides[get_current_user] = lambda: (
+        schemas.UserProfile.model_validate(create_test_user)
+    )
+    response = await test_client.post(
+        '/comments/batch/',
+        json={
+            'comments': [
+                {'post_id': create_test_post.id, 'content': 'Imported'},
+                {'post_id': 1_000_000, 'content': 'Orphan'},
+                {'post_id': 2**31, 'content': 'Out of range'},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    first_result, second_result, third_result = response.json()['results']
+    assert first_result['status_code'] == 201
+    assert first_result['comment']['content'] == 'Imported'
+    assert first_result['comment']['author_id'] == create_test_user.id
+    assert second_result == {
+        'post_id': 1_000_000,
+        'status_code': 404,
+        'comment': None,
+        'detail': 'Post not found.',
+    }
+    assert third_result['status_code'] == 404
+
+
+async def test_read_posts_expands_authors_without_n_plus_one(
+    test_client: httpx.AsyncClient,
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    query_counter: list[str],
+) -> None:
+    other_user = await crud.create_user_profile(
+        db=test_db_session,
+        user_profile=schemas.UserProfileCreate(
+            username='janedoe', display_name='Jane Doe'
+        ),
+    )
+    await _create_posts_with_comments(test_db_session, create_test_user.id, 1)
+    test_db_session.expunge_all()
+    query_counter.clear()
+    await test_client.get('/posts/', params={'expand': 'author'})
+    queries_for_one_author = len(query_counter)
+
+    await _create_posts_with_comments(test_db_session, other_user.id, 4)
+    test_db_session.expunge_all()
+    query_counter.clear()
+    response = await test_client.get('/posts/', params={'expand': 'author'})
+    assert len(query_counter) == queries_for_one_author
+    posts = response.json()['items']
+    assert [post['author']['username'] for post in posts] == [
+        'janedoe'
+    ] * 4 + ['johndoe']
+    assert all(
+        comment['author']['id'] == post['author_id']
+        for post in posts
+        for comment in post['comments']
+    )
+
+    response = await test_client.get('/posts/')
+    assert all(post['author'] is None for post in response.json()['items'])
+
+
+async def test_read_post_comments_expands_authors(
+    test_client: httpx.AsyncClient,
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    create_test_comment: models.Comment,
+) -> None:
+    url = f'/posts/{create_test_comment.post_id}/comments/'
+    response = await test_client.get(url, params={'expand': 'author'})
+    assert response.json()[0]['author'] == {
+        'id': create_test_user.id,
+        'username': 'johndoe',
+        'display_name': 'John Doe',
+        'avatar': None,
+    }
+    test_db_session.expunge_all()
+    response = await test_client.get(url)
+    assert response.json()[0]['author'] is None
+
+    response = await test_client.get(url, params={'expand': 'everything'})
+    assert response.status_code == 422
+
+
+async def test_read_posts_with_comments_preview(
+    test_client: httpx.AsyncClient,
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    query_counter: list[str],
+) -> None:
+    await _create_posts_with_comments(test_db_session, create_test_user.id, 2)
+    db_posts, _ = await crud.get_posts(test_db_session)
+    for i in range(3):
+        await crud.create_comment(
+            db=test_db_session,
+            comment=schemas.CommentCreate(content=f'Late comment {i}'),
+            post_id=db_posts[0].id,
+            author_id=create_test_user.id,
+        )
+    test_db_session.expunge_all()
+
+    query_counter.clear()
+    response = await test_client.get(
+        '/posts/', params={'comments_preview': 2, 'expand': 'author'}
+    )
+    assert response.status_code == 200
+    latest_post, earliest_post = response.json()['items']
+    assert latest_post['comment_count'] == 5
+    assert [comment['content'] for comment in latest_post['comments']] == [
+        'Late comment 1',
+        'Late comment 2',
+    ]
+    assert latest_post['comments'][0]['author']['username'] == 'johndoe'
+    assert earliest_post['comment_count'] == 2
+    assert len(earliest_post['comments']) == 2
+    # Posts, media, post authors, then one query for every preview and
+    # one for their authors.
+    assert len(query_counter) == 5
+
+    response = await test_client.get('/posts/', params={'comments_preview': 0})
+    assert all(post['comments'] == [] for post in response.json()['items'])
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from datetime import datetime
+
+import httpx
+import pytest
+
+from postamoo import models, querylog
+
+
+def test_redact_parameters() -> None:
+    assert querylog.redact_parameters(
+        (7, 'secret title', None, True, datetime(2024, 1, 1), [b'x'])
+    ) == [7, '<str>', None, True, '<datetime>', ['<bytes>']]
+    assert querylog.redact_parameters({'username': 'johndoe'}) == {
+        'username': '<str>'
+    }
+
+
+@pytest.mark.anyio
+async def test_slow_query_is_logged_with_plan(
+    test_client: httpx.AsyncClient,
+    create_test_post: models.Post,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(querylog, 'SLOW_QUERY_THRESHOLD', 0)
+    querylog._explained_statements.clear()
+    with caplog.at_level(logging.WARNING, logger='postamoo.querylog'):
+        response = await test_client.get(
+            f'/posts/{create_test_post.id}/comments/'
+        )
+        assert response.status_code == 200
+        await asyncio.gather(*querylog._pending_explains)
+
+    [message] = [
+        record.getMessage()
+        for record in caplog.records
+        if 'FROM comments' in record.getMessage()
+    ]
+    assert 'in /posts/{post_id}/comments/ from crud.get_post_comments' in (
+        message
+    )
+    assert f'Parameters: [{create_test_post.id}]' in message
+    assert 'Scan' in message
+    assert 'unavailable' not in message
+
+
+@pytest.mark.anyio
+async def test_slow_query_log_hides_parameter_values(
+    test_client: httpx.AsyncClient,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    monkeypatch.setattr(querylog, 'SLOW_QUERY_THRESHOLD', 0)
+    querylog._explained_statements.clear()
+    with caplog.at_level(logging.WARNING, logger='postamoo.querylog'):
+        response = await test_client.get(
+            '/posts/search/', params={'q': 'secretword'}
+        )
+        assert response.status_code == 200
+        await asyncio.gather(*querylog._pending_explains)
+
+    messages = [
+        record.getMessage()
+        for record in caplog.records
+        if 'FROM posts' in record.getMessage()
+    ]
+    assert messages
+    assert all('Scan' in message for message in messages)
+    assert not any('secretword' in message for message in messages)
+
+
+@pytest.mark.anyio
+async def test_query_budget_fails_loudly(
+    test_client: httpx.AsyncClient,
+    create_test_post: models.Post,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(querylog, 'QUERY_BUDGET', 1)
+    with pytest.raises(querylog.QueryBudgetExceeded, match='/posts/'):
+        await test_client.get(f'/posts/{create_test_post.id}/')
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+from fastapi import HTTPException
+
+from postamoo import security
+
+jwt = pytest.importorskip('jwt')
+rsa = pytest.importorskip('cryptography.hazmat.primitives.asymmetric.rsa')
+serialization = pytest.importorskip(
+    'cryptography.hazmat.primitives.serialization'
+)
+
+
+@pytest.fixture(scope='module')
+def rsa_private_key() -> Any:
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture(scope='function', autouse=True)
+def local_auth_config(
+    monkeypatch: pytest.MonkeyPatch,
+    rsa_private_key: Any,
+) -> None:
+    public_key = (
+        rsa_private_key.public_key()
+        .public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode()
+    )
+    monkeypatch.setattr(security, 'AUTH_TOKEN_KEY', public_key)
+    monkeypatch.setattr(security, 'AUTH_TOKEN_ALGORITHMS', 'RS256')
+    monkeypatch.setattr(security, 'AUTH_TOKEN_AUDIENCE', 'postamoo')
+    monkeypatch.setattr(security, 'AUTH_TOKEN_ISSUER', None)
+    monkeypatch.setattr(security, 'AUTH_TOKEN_USERNAME_CLAIM', 'sub')
+
+
+def _create_token(private_key: Any, **claims: Any) -> str:
+    payload = {
+        'sub': 'johndoe',
+        'aud': 'postamoo',
+        'exp': datetime.now(timezone.utc) + timedelta(minutes=5),
+        **claims,
+    }
+    return jwt.encode(payload, private_key, algorithm='RS256')
+
+
+def test_verify_access_token(rsa_private_key: Any) -> None:
+    access_token = _create_token(rsa_private_key)
+    assert security.verify_access_token(access_token) == 'johndoe'
+
+
+def test_verify_access_token_rejects_expired_token(
+    rsa_private_key: Any,
+) -> None:
+    access_token = _create_token(
+        rsa_private_key,
+        exp=datetime.now(timezone.utc) - timedelta(minutes=1),
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        security.verify_access_token(access_token)
+    assert exc_info.value.status_code == 401
+    assert exc_info.value.detail == 'Access token has expired.'
+
+
+def test_verify_access_token_rejects_wrong_audience(
+    rsa_private_key: Any,
+) -> None:
+    access_token = _create_token(rsa_private_key, aud='another-service')
+    with pytest.raises(HTTPException) as exc_info:
+        security.verify_access_token(access_token)
+    assert exc_info.value.status_code == 401
+
+
+def test_verify_access_token_rejects_foreign_key() -> None:
+    foreign_key = rsa.generate_private_key(
+        public_exponent=65537, key_size=2048
+    )
+    access_token = _create_token(foreign_key)
+    with pytest.raises(HTTPException) as exc_info:
+        security.verify_access_token(access_token)
+    assert exc_info.value.detail == 'Invalid access token.'
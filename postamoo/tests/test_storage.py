@@ -0,0 +1,113 @@
+import io
+import os
+import time
+import pathlib
+
+import pytest
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, schemas, crud, storage, jobs
+
+pytestmark = pytest.mark.anyio
+
+
+async def _create_post_with_media(
+    db: AsyncSession,
+    author_id: int,
+    content: bytes,
+) -> models.Post:
+    post_data = schemas.PostCreate(
+        title='Test Post',
+        media_files=[UploadFile(file=io.BytesIO(content), filename='a.PNG')],
+    )
+    return await crud.create_post(db=db, post=post_data, author_id=author_id)
+
+
+async def test_content_addressed_media_is_deduplicated(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    media_storage_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(storage, 'MEDIA_STORAGE_MODE', 'content')
+    first_post = await _create_post_with_media(
+        test_db_session, create_test_user.id, b'same meme'
+    )
+    second_post = await _create_post_with_media(
+        test_db_session, create_test_user.id, b'same meme'
+    )
+    filename = first_post.media_files[0]
+    assert second_post.media_files == [filename]
+    assert filename.endswith('.png')
+    assert [path.name for path in media_storage_path.rglob('*.*')] == [
+        pathlib.PurePath(filename).name
+    ]
+
+    db_media_blob = await test_db_session.get(models.MediaBlob, filename)
+    assert db_media_blob.ref_count == 2
+
+    await crud.delete_post_by_id(
+        db=test_db_session,
+        post_id=first_post.id,
+        current_user_id=create_test_user.id,
+    )
+    await jobs.run_pending_jobs(test_db_session)
+    assert (media_storage_path / filename).exists()
+
+    await crud.delete_post_by_id(
+        db=test_db_session,
+        post_id=second_post.id,
+        current_user_id=create_test_user.id,
+    )
+    assert (media_storage_path / filename).exists()
+    assert await jobs.run_pending_jobs(test_db_session) == 1
+    assert not (media_storage_path / filename).exists()
+    test_db_session.expunge_all()
+    assert await test_db_session.get(models.MediaBlob, filename) is None
+
+
+async def test_sweep_orphaned_media(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    media_storage_path: pathlib.Path,
+) -> None:
+    db_post = await _create_post_with_media(
+        test_db_session, create_test_user.id, b'kept'
+    )
+    referenced_path = media_storage_path / db_post.media_files[0]
+    orphaned_path = media_storage_path / '0123456789abcde.png'
+    orphaned_variant_path = (
+        media_storage_path / '0123456789abcde.thumbnail.jpg'
+    )
+    partial_path = media_storage_path / f'{"0" * 32}.part'
+    recent_path = media_storage_path / 'edcba9876543210.png'
+    foreign_paths = [
+        media_storage_path / '.gitkeep',
+        media_storage_path / 'notes.txt',
+        media_storage_path / 'notes.thumbnail.jpg',
+    ]
+    for path in (orphaned_path, orphaned_variant_path, partial_path):
+        path.write_bytes(b'stray')
+    recent_path.write_bytes(b'still uploading')
+    old_mtime = time.time() - 2 * 86400
+    for path in (
+        referenced_path,
+        orphaned_path,
+        orphaned_variant_path,
+        partial_path,
+        *foreign_paths,
+    ):
+        path.touch()
+        os.utime(path, (old_mtime, old_mtime))
+
+    removed_count = await storage.sweep_orphaned_media(
+        test_db_session, grace_period=86400
+    )
+    assert removed_count == 2
+    assert referenced_path.exists()
+    assert recent_path.exists()
+    assert not orphaned_path.exists()
+    assert not orphaned_variant_path.exists()
+    assert not partial_path.exists()
+    assert all(path.exists() for path in foreign_paths)
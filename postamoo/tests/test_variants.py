@@ -0,0 +1,143 @@
+import io
+import asyncio
+import pathlib
+
+import pytest
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, schemas, crud, storage, variants
+from postamoo.cache import CachedResponse, response_cache
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture(scope='function')
+def image_file(media_storage_path: pathlib.Path) -> str:
+    Image.new('RGBA', (1600, 900), (255, 0, 0, 128)).save(
+        media_storage_path / 'abcdef.png'
+    )
+    return 'abcdef.png'
+
+
+def test_generate_media_variants(
+    media_storage_path: pathlib.Path,
+    image_file: str,
+) -> None:
+    variants.generate_media_variants(storage.get_media_path(image_file))
+
+    with Image.open(media_storage_path / 'abcdef.thumbnail.jpg') as image:
+        assert image.format == 'JPEG'
+        assert image.size == (320, 180)
+    with Image.open(media_storage_path / 'abcdef.medium.jpg') as image:
+        assert image.size == (1280, 720)
+    with Image.open(media_storage_path / 'abcdef.webp.webp') as image:
+        assert image.format == 'WEBP'
+    assert not list(media_storage_path.glob('*.part'))
+
+
+def test_media_variants_fall_back_to_original(image_file: str) -> None:
+    assert storage.get_media_variants(image_file, False) == {
+        'original': image_file,
+        'thumbnail': image_file,
+        'medium': image_file,
+        'webp': image_file,
+    }
+    assert storage.get_media_variants(image_file, True) == {
+        'original': image_file,
+        'thumbnail': 'abcdef.thumbnail.jpg',
+        'medium': 'abcdef.medium.jpg',
+        'webp': 'abcdef.webp.webp',
+    }
+
+
+def test_remove_media_files_removes_variants(
+    media_storage_path: pathlib.Path,
+    image_file: str,
+) -> None:
+    variants.generate_media_variants(storage.get_media_path(image_file))
+    storage.remove_media_files([image_file])
+    assert list(media_storage_path.iterdir()) == []
+
+
+def test_post_schema_includes_media_variants(image_file: str) -> None:
+    post = schemas.Post(
+        id=1,
+        title='Test Post',
+        media_files=[image_file, 'clip.mp4'],
+        created_at='2024-01-01T00:00:00Z',
+        author_id=1,
+        media=[
+            schemas.Media(
+                filename=image_file,
+                mime_type='image/png',
+                byte_size=1,
+                variants_ready=True,
+            ),
+            schemas.Media(
+                filename='clip.mp4', mime_type='video/mp4', byte_size=1
+            ),
+        ],
+    )
+    assert post.model_dump()['media_variants'] == [
+        storage.get_media_variants(image_file, True),
+        storage.get_media_variants('clip.mp4', False),
+    ]
+
+
+@pytest.mark.anyio
+async def test_schedule_media_variants_on_process_pool(
+    media_storage_path: pathlib.Path,
+    image_file: str,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    recorded_filenames = []
+
+    async def record_media_variants(filename: str) -> None:
+        recorded_filenames.append(filename)
+
+    monkeypatch.setattr(
+        variants, '_record_media_variants', record_media_variants
+    )
+    variants.start_variant_pool()
+    try:
+        variants.schedule_media_variants([image_file, 'clip.mp4'])
+        assert len(variants._pending_futures) == 1
+        while variants._pending_futures:
+            await asyncio.gather(*variants._pending_futures)
+    finally:
+        variants.stop_variant_pool()
+    assert (media_storage_path / 'abcdef.thumbnail.jpg').exists()
+    assert recorded_filenames == [image_file]
+
+
+@pytest.mark.anyio
+async def test_mark_media_variants_ready(
+    test_db_session: AsyncSession,
+    create_test_user: models.UserProfile,
+    media_storage_path: pathlib.Path,
+) -> None:
+    image_content = io.BytesIO()
+    Image.new('RGB', (300, 200), 'blue').save(image_content, 'PNG')
+    db_post = await crud.create_post(
+        db=test_db_session,
+        post=schemas.PostCreate(
+            title='Photo',
+            media_files=[UploadFile(file=image_content, filename='photo.png')],
+        ),
+        author_id=create_test_user.id,
+    )
+    post_id, filename = db_post.id, db_post.media_files[0]
+    cache_key = ('post', post_id, False)
+    response_cache.set(
+        cache_key, CachedResponse(b'{}', '"a"'), response_cache.generation
+    )
+
+    await variants.mark_media_variants_ready(test_db_session, filename)
+    assert response_cache.get(cache_key) is None
+    test_db_session.expunge_all()
+    post = schemas.Post.model_validate(
+        await crud.get_post_by_id(test_db_session, post_id)
+    )
+    assert post.media[0].variants_ready
+    assert post.media_variants == [storage.get_media_variants(filename, True)]
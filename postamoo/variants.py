@@ -0,0 +1,136 @@
+import os
+import asyncio
+import logging
+import functools
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from postamoo import models, storage, invalidation
+from postamoo.database import SessionLocal
+from postamoo.config import (
+    MEDIA_VARIANT_WORKERS,
+    MEDIA_THUMBNAIL_SIZE,
+    MEDIA_MEDIUM_SIZE,
+    MEDIA_VARIANT_QUALITY,
+)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+_VARIANT_SPECS = {
+    'thumbnail': (MEDIA_THUMBNAIL_SIZE, 'JPEG'),
+    'medium': (MEDIA_MEDIUM_SIZE, 'JPEG'),
+    'webp': (MEDIA_MEDIUM_SIZE, 'WEBP'),
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending_futures: set[asyncio.Future] = set()
+
+
+def generate_media_variants(file_path: str) -> None:
+    directory, filename = os.path.split(file_path)
+    with Image.open(file_path) as original_image:
+        image = ImageOps.exif_transpose(original_image)
+        for variant, (max_size, image_format) in _VARIANT_SPECS.items():
+            variant_path = os.path.join(
+                directory, storage.get_variant_filename(filename, variant)
+            )
+            if os.path.exists(variant_path):
+                continue
+
+            variant_image = image.copy()
+            variant_image.thumbnail((max_size, max_size))
+            if variant_image.mode not in ('RGB', 'L'):
+                variant_image = variant_image.convert('RGB')
+            temp_variant_path = f'{variant_path}.part'
+            variant_image.save(
+                temp_variant_path,
+                format=image_format,
+                quality=MEDIA_VARIANT_QUALITY,
+            )
+            os.replace(temp_variant_path, variant_path)
+
+
+def start_variant_pool() -> None:
+    global _executor
+    if Image is None:
+        logger.warning('Pillow is not installed; media variants are disabled.')
+    elif MEDIA_VARIANT_WORKERS > 0:
+        # Forking a process that already runs an event loop and threads is
+        # unsafe, so workers start from a clean interpreter.
+        _executor = ProcessPoolExecutor(
+            max_workers=MEDIA_VARIANT_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+
+
+def stop_variant_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def mark_media_variants_ready(db: AsyncSession, filename: str) -> None:
+    # Content-addressed files can back the media of several posts.
+    post_ids = list(
+        await db.scalars(
+            update(models.Media)
+            .where(models.Media.filename == filename)
+            .values(variants_ready=True)
+            .returning(models.Media.post_id)
+            .execution_options(synchronize_session=False)
+        )
+    )
+    await invalidation.notify_post_responses(db, *post_ids)
+    await db.commit()
+    invalidation.invalidate_post_responses(*post_ids)
+
+
+async def _record_media_variants(filename: str) -> None:
+    try:
+        async with SessionLocal() as db:
+            await mark_media_variants_ready(db, filename)
+    except Exception:
+        logger.exception('Failed to record media variants of %s.', filename)
+
+
+def _handle_variants_done(filename: str, future: Future) -> None:
+    _pending_futures.discard(future)
+    if future.cancelled():
+        return
+    elif future.exception() is not None:
+        logger.warning(
+            'Failed to generate media variants: %r', future.exception()
+        )
+        return
+    task = asyncio.create_task(_record_media_variants(filename))
+    _pending_futures.add(task)
+    task.add_done_callback(_pending_futures.discard)
+
+
+def schedule_media_variants(filenames: list[str]) -> None:
+    if _executor is None:
+        return
+    loop = asyncio.get_running_loop()
+    for filename in filenames:
+        if not storage.is_image(filename):
+            continue
+        future = loop.run_in_executor(
+            _executor,
+            generate_media_variants,
+            storage.get_media_path(filename),
+        )
+        # Keeps the future alive until it completes, as nothing awaits it.
+        _pending_futures.add(future)
+        future.add_done_callback(
+            functools.partial(_handle_variants_done, filename)
+        )